@@ -0,0 +1,177 @@
+"""
+時間帯別稼働推移 一括計算（複数月）
+==================================
+ディレクトリまたは glob で指定した月別の元データブックを、プロセスプールで並列に集計します。
+月ごとの結果ブック（calculate_timezone_usage と同じ形式）と、全月の集計値をまとめた
+サマリーブックを出力します。1ファイルが失敗してもバッチは止めず、
+ファイルごとの処理時間と失敗内容を報告します。
+
+使い方:
+    python batch_timezone_usage.py <ディレクトリ または glob> [--workers N]
+                                   [--output-dir 出力先] [--summary サマリーファイル]
+
+例:
+    python batch_timezone_usage.py 元データ --workers 4
+    python batch_timezone_usage.py "元データ/2025-*.xlsx" --output-dir 結果
+
+出力:
+    <元ファイル名>-結果.xlsx（月ごと）
+    時間帯別稼働推移-月別サマリー.xlsx（全手術・予定手術のみ・処理状況の3シート）
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import openpyxl
+
+import calculate_timezone_usage
+
+RESULT_SUFFIX = "-結果"
+SUMMARY_FILE = "時間帯別稼働推移-月別サマリー.xlsx"
+
+
+def find_inputs(source):
+    """ディレクトリなら直下の *.xlsx、それ以外は glob として元データブックを列挙する
+
+    結果ブック（*-結果.xlsx）と Excel のロックファイル（~$*）は除外する。
+    """
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "*.xlsx"))
+    else:
+        paths = glob.glob(source)
+    inputs = []
+    for path in paths:
+        name = os.path.basename(path)
+        stem = os.path.splitext(name)[0]
+        if name.startswith("~$") or stem.endswith(RESULT_SUFFIX) or name == SUMMARY_FILE:
+            continue
+        inputs.append(path)
+    return sorted(inputs)
+
+
+def output_path(input_file, output_dir=None):
+    """元データブックに対応する結果ブックのパス"""
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(output_dir or os.path.dirname(input_file), f"{stem}{RESULT_SUFFIX}.xlsx")
+
+
+def process_one(input_file, output_file):
+    """1ファイルを集計する（ワーカープロセスで実行）
+
+    例外はトレースバック文字列として返し、他のファイルの処理は続ける。
+    """
+    started = time.perf_counter()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            result = calculate_timezone_usage.run(input_file, output_file)
+        error = None
+    except Exception:
+        result = None
+        error = traceback.format_exc()
+    return {
+        "input": input_file,
+        "output": output_file,
+        "result": result,
+        "error": error,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def write_summary(path, outcomes):
+    """全月の Row2（全手術）・Row3（予定手術のみ）と処理状況をサマリーブックに書き出す"""
+    labels = next((o["result"]["snapshot_labels"] for o in outcomes if o["result"]), [])
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws_all = wb.create_sheet("全手術")
+    ws_sched = wb.create_sheet("予定手術のみ")
+    for ws in (ws_all, ws_sched):
+        ws.append(["ファイル", "対象日数"] + labels)
+    for o in outcomes:
+        if o["result"] is None:
+            continue
+        name = os.path.basename(o["input"])
+        ws_all.append([name, o["result"]["num_days"]] + o["result"]["all"])
+        ws_sched.append([name, o["result"]["num_days"]] + o["result"]["sched"])
+
+    ws_status = wb.create_sheet("処理状況")
+    ws_status.append(["ファイル", "結果ファイル", "状態", "処理時間(秒)", "件数", "対象日数", "エラー"])
+    for o in outcomes:
+        result = o["result"]
+        ws_status.append([
+            os.path.basename(o["input"]),
+            os.path.basename(o["output"]) if result else "",
+            "OK" if result else "NG",
+            round(o["seconds"], 2),
+            result["case_count"] if result else None,
+            result["num_days"] if result else None,
+            o["error"].strip().splitlines()[-1] if o["error"] else "",
+        ])
+    wb.save(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="月別の元データブックを一括で集計します")
+    parser.add_argument("source", help="元データブックのディレクトリ、または glob（例: \"元データ/*.xlsx\"）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="並列プロセス数（省略時はCPU数）")
+    parser.add_argument("--output-dir", default=None,
+                        help="結果ブックの出力先（省略時は元データと同じフォルダ）")
+    parser.add_argument("--summary", default=None,
+                        help=f"サマリーブックのパス（省略時は出力先の {SUMMARY_FILE}）")
+    args = parser.parse_args(argv)
+
+    inputs = find_inputs(args.source)
+    if not inputs:
+        print(f"対象ファイルがありません: {args.source}")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = args.summary or os.path.join(
+        args.output_dir or os.path.dirname(inputs[0]) or ".", SUMMARY_FILE)
+
+    print(f"対象ファイル: {len(inputs)} 件（並列数: {args.workers or os.cpu_count()}）")
+    started = time.perf_counter()
+    outcomes = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(process_one, path, output_path(path, args.output_dir)): path
+                   for path in inputs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                outcome = future.result()
+            except Exception:
+                # ワーカープロセス自体が異常終了した場合
+                outcome = {"input": path, "output": output_path(path, args.output_dir),
+                           "result": None, "error": traceback.format_exc(), "seconds": 0.0}
+            outcomes.append(outcome)
+            name = os.path.basename(path)
+            if outcome["error"]:
+                print(f"  NG  {name}  {outcome['seconds']:.2f}秒  "
+                      f"{outcome['error'].strip().splitlines()[-1]}")
+            else:
+                print(f"  OK  {name}  {outcome['seconds']:.2f}秒  → {os.path.basename(outcome['output'])}")
+
+    outcomes.sort(key=lambda o: o["input"])
+    write_summary(summary_path, outcomes)
+
+    failed = [o for o in outcomes if o["error"]]
+    print(f"\n完了: {len(outcomes) - len(failed)}/{len(outcomes)} 件成功, "
+          f"経過 {time.perf_counter() - started:.2f}秒")
+    print(f"サマリー: {summary_path}")
+    for o in failed:
+        print(f"\n--- 失敗: {o['input']} ---\n{o['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+スケーリング・ベンチマーク
+==========================
+合成データ（synthetic_data）で 1か月・1年・10年 × 30室 の元データブックを作り、
+集計スクリプトと試行スクリプトの処理時間・スループット・ピークメモリを計測します。
+
+- 計測は1回ずつ新しいプロセスで行い、ピークメモリはそのプロセスの最大常駐メモリ（RSS）
+- calculate_timezone_usage は工程別（読込・計算・検証・保存）の時間も記録する
+- 各スクリプトは解析キャッシュなし（初回）で計測し、calculate_timezone_usage のみ
+  キャッシュあり（2回目）も計測する
+- 結果を JSON に保存し、--compare で前回の結果との比を表示して性能低下を確認できる
+
+使い方:
+    python bench_scaling.py [--sizes 1month,1year,10years] [--rooms 30]
+                            [--scripts calculate_timezone_usage,trial_hogy]
+                            [--save 結果.json] [--compare 前回.json]
+
+合成データは bench_data/ に保存し、同じ条件なら再利用します。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import time
+
+import synthetic_data
+from profiling import peak_rss_mb
+from source_data import CACHE_DIR_NAME
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "bench_data")
+INPUT_NAME = "時間帯別稼働推移元データ.xlsx"
+OUTPUT_NAME = "時間帯別稼働推移-結果.xlsx"
+
+# 規模名 → 暦日数
+SIZES = {"1month": 30, "1year": 365, "10years": 3650}
+SCRIPTS = [
+    "calculate_timezone_usage",
+    "trial_hogy",
+    "trial_3min_sampling",
+    "trial_utilization",
+    "trial_estimate_other",
+]
+PHASES = ["load", "compute", "verification", "save"]
+
+
+# --- 子プロセス側（1スクリプトを1回実行して計測値をJSONで出力）---
+
+def run_child(script, workdir, cached):
+    """workdir の元データで script を実行する（標準出力は捨てる）"""
+    os.chdir(workdir)
+    input_file = os.path.join(workdir, INPUT_NAME)
+    if not cached:
+        shutil.rmtree(os.path.join(workdir, CACHE_DIR_NAME), ignore_errors=True)
+
+    timings = {}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if script == "calculate_timezone_usage":
+            import calculate_timezone_usage
+            calculate_timezone_usage.run(input_file, os.path.join(workdir, OUTPUT_NAME), timings=timings)
+        elif script == "trial_utilization":
+            import trial_utilization
+            trial_utilization.INPUT_FILE = input_file
+            trial_utilization.main()
+        else:
+            # 試行スクリプトはカレントフォルダの元データを読むトップレベルのスクリプト
+            runpy.run_path(os.path.join(SCRIPT_DIR, f"{script}.py"), run_name="__main__")
+    seconds = time.perf_counter() - started
+    print(json.dumps({"seconds": seconds, "phases": timings, "peak_rss_mb": peak_rss_mb()}))
+
+
+# --- 親プロセス側 ---
+
+def prepare_data(size, num_rooms, seed):
+    """規模ごとの合成データを用意し (作業フォルダ, 手術件数, 生成秒) を返す（既にあれば再利用）"""
+    workdir = os.path.join(DATA_DIR, f"{size}-{num_rooms}rooms-seed{seed}")
+    meta_path = os.path.join(workdir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return workdir, meta["cases"], None
+
+    os.makedirs(workdir, exist_ok=True)
+    started = time.perf_counter()
+    cases = synthetic_data.generate_workbook(
+        os.path.join(workdir, INPUT_NAME), SIZES[size], num_rooms, seed=seed)
+    seconds = time.perf_counter() - started
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"days": SIZES[size], "rooms": num_rooms, "seed": seed, "cases": cases}, f)
+    return workdir, cases, seconds
+
+
+def measure(script, workdir, cached, timeout):
+    """子プロセスで1回計測する: {"seconds", "phases", "peak_rss_mb"} または {"error"}"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", script, workdir]
+    if cached:
+        cmd.append("--cached")
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timeout ({timeout}秒)"}
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"終了コード {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def format_row(r):
+    if "error" in r:
+        return f"  {r['script']:<26s} {r['mode']:<6s}  失敗: {r['error']}"
+    phases = " ".join(f"{p}={r['phases'][p]:.2f}" for p in PHASES if p in r["phases"])
+    rss = f"{r['peak_rss_mb']:8.1f}MB" if r["peak_rss_mb"] is not None else "       -  "
+    return (f"  {r['script']:<26s} {r['mode']:<6s} {r['seconds']:8.2f}秒 "
+            f"{r['cases_per_sec']:10.0f}件/秒 {rss}  {phases}")
+
+
+def compare(results, previous_path):
+    """前回の結果と (規模, スクリプト, 方式) ごとに時間・メモリの比を表示する"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["size"], r["script"], r["mode"]): r
+                    for r in json.load(f)["results"] if "error" not in r}
+    print(f"\n=== 前回比（{previous_path}、1.00超は今回が遅い・大きい）===")
+    for r in results:
+        old = previous.get((r["size"], r["script"], r["mode"]))
+        if old is None or "error" in r:
+            continue
+        time_ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        line = f"  {r['size']:<8s} {r['script']:<26s} {r['mode']:<6s} 時間 {time_ratio:5.2f}倍"
+        if r["peak_rss_mb"] and old.get("peak_rss_mb"):
+            line += f"  メモリ {r['peak_rss_mb'] / old['peak_rss_mb']:5.2f}倍"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成データで処理時間・スループット・ピークメモリを計測します")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"計測する規模（{', '.join(SIZES)}）")
+    parser.add_argument("--rooms", type=int, default=30, help="手術室数（既定: 30）")
+    parser.add_argument("--seed", type=int, default=1, help="合成データの乱数シード（既定: 1）")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help="計測するスクリプト（カンマ区切り）")
+    parser.add_argument("--timeout", type=float, default=1800, help="1回の計測の制限時間（秒）")
+    parser.add_argument("--save", default=None, help="結果を保存するJSONのパス")
+    parser.add_argument("--compare", default=None, help="比較する前回結果のJSONのパス")
+    parser.add_argument("--child", nargs=2, metavar=("SCRIPT", "WORKDIR"), help=argparse.SUPPRESS)
+    parser.add_argument("--cached", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.cached)
+        return
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    scripts = [s for s in args.scripts.split(",") if s]
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"不明な規模: {name}")
+    for name in scripts:
+        if name not in SCRIPTS:
+            parser.error(f"不明なスクリプト: {name}")
+
+    results = []
+    for size in sizes:
+        workdir, cases, gen_seconds = prepare_data(size, args.rooms, args.seed)
+        generated = f"生成 {gen_seconds:.1f}秒" if gen_seconds is not None else "既存データ"
+        print(f"\n=== {size}: {SIZES[size]}日 × {args.rooms}室, {cases}件（{generated}）===")
+
+        runs = [(script, False) for script in scripts]
+        if "calculate_timezone_usage" in scripts:
+            runs.insert(1, ("calculate_timezone_usage", True))
+        for script, cached in runs:
+            r = measure(script, workdir, cached, args.timeout)
+            r.update({"size": size, "days": SIZES[size], "rooms": args.rooms, "cases": cases,
+                      "script": script, "mode": "cached" if cached else "cold"})
+            if "error" not in r:
+                r["cases_per_sec"] = cases / r["seconds"] if r["seconds"] else 0.0
+            results.append(r)
+            print(format_row(r))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "results": results,
+            }, f, ensure_ascii=False, indent=1)
+        print(f"\n保存: {args.save}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
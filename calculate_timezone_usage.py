@@ -7,19 +7,73 @@
 変更点（v4.0）:
 - 計測区間方式（±14/+15分）→ 1分サンプリング + 30分平均方式
 - 01Bの使用は01Aとしてカウント（01Bウェイト=0の場合、01Aに統合）
+- 定義シートの「部屋グループ」欄で、任意の部屋の組（構成部屋・ウェイト・同時使用の上限）を指定できる
 - 全室ウェイト1.0（定義シートから読み込み）
 
 使い方:
-    python calculate_timezone_usage.py
+    python calculate_timezone_usage.py [--input 元データ.xlsx] [--output 結果.xlsx]
+                                       [--grid 8:00-20:00/30/30] [--output-mode patch|openpyxl]
+    python calculate_timezone_usage.py --config 集計構成例.json [--only v4.0,HOGY]
+    （どちらも --profile [レポート.json] で工程別の時間・回数・ピークメモリを出力、
+      --room-breakdown で部屋別内訳シートと CSV を追加、--engine epoch で日付をまたぐ手術も数える）
+    python calculate_timezone_usage.py --watch [秒] [--config ...]
+    python calculate_timezone_usage.py --input 手術実績.csv [--import-config 取り込み設定.json]
+    python calculate_timezone_usage.py --stream [--config ...]
+
+時間グリッド（スナップショット時刻・間隔・集計区間）は既定で 8:00〜20:00 の30分毎・+0〜+29分。
+定義シートの「時間グリッド」欄、または --grid（開始-終了/間隔/窓長[/基準]）で変更できる（--grid 優先）。
+
+--config には名前付きの集計構成を複数書いた JSON を指定する（書式は load_config() を参照）。
+元データは1回だけ読み込み、同じ占有キューブから構成ごとに計算して、構成ごとの結果ブックに保存する。
+
+集計エンジン（--engine、構成ファイルの engine）:
+  cube  日ごとの占有キューブ（既定、v4.0 と同じ結果）。麻酔終了が入室より前の時刻の手術は数えない
+  epoch 全期間を1本の通し分軸に並べる（occupancy.EpochOccupancy）。0:00 をまたぐ手術（23:10〜翌1:30 など）を
+        翌日分も数え、サンプリング範囲外の使用も切り捨てない。日をまたがないデータでは cube と同じ結果
+
+部屋別内訳（--room-breakdown、構成の room_breakdown）は、合計と同じ日別の部屋別タイムラインから
+部屋 × 時刻・部屋 × 日 の値を集約し、結果ブックの「部屋別内訳」シートと
+<結果ブック名>-部屋別内訳.csv に書き出す（書式は room_breakdown を参照）。
+
+watch モード（--watch）は元データブックの保存を監視し、保存されるたびに結果ブックを書き直す。
+手術実施管理番号で前回との差分をとり、変わった日だけ日別の値を計算し直す（incremental を参照）。
+全セル照合も計算し直した日だけ行う。Ctrl+C で終了。
+
+--input に CSV/TSV（.csv/.tsv/.txt）を指定すると、元データシートに貼り付けずに直接読み込む
+（文字コードの判定・列の対応・定義の読み先は csv_source と --import-config を参照）。
+結果ブックは定義を読むブック（既定: CSV と同じフォルダの元データブック）をひな形にして書き込む。
+
+--stream は手術実施日の昇順に並んだ元データを1日分ずつ流し込み、日別の値を区分ごとの合計・曜日別の合計に
+畳み込んでから手術を捨てる（streaming を参照）。手術記録の一覧を作らないので、メモリは期間の長さによらず
+1日分の手術に比例する（結果ブックに書く日別の値は除く）。結果は通常の集計と同じ。
+ただし xlsx の元データでは、openpyxl が読み取り専用でも共有文字列表（sharedStrings: 部屋名・区分などの
+文字列）を全体で読み込むため、その分のメモリは期間に比例して残る。メモリを期間によらず抑えるには
+元データを CSV/TSV で渡す。日付順に並んでいない元データはエラーで止まるので、--stream を付けずに集計する。
 
 入力: 時間帯別稼働推移元データ.xlsx（同一フォルダに配置）
 出力: 時間帯別稼働推移-結果.xlsx（同一フォルダに生成）
 """
 
+import argparse
+import json
 import openpyxl
-import datetime as dt
 import os
 import sys
+import time
+import traceback
+from collections import namedtuple
+
+import cross_check
+import csv_source
+from incremental import DayCache
+from streaming import SectionTotals, UnsortedInputError, day_chunks
+from occupancy import DayTimeline, EpochOccupancy, OccupancyCube, TimeGrid, crosses_midnight, unit_names
+import profiling
+from profiling import Profiler
+import room_breakdown
+from source_data import RoomGroup, load_source, stream_source
+from xlsx_patch import patch_workbook
+import verification_sheet
 
 # ========== 設定 ==========
 if getattr(sys, 'frozen', False):
@@ -29,354 +83,512 @@ else:
 INPUT_FILE = os.path.join(SCRIPT_DIR, "時間帯別稼働推移元データ.xlsx")
 OUTPUT_FILE = os.path.join(SCRIPT_DIR, "時間帯別稼働推移-結果.xlsx")
 
+RESULT_SHEET = "計算結果"
+
+# 出力方式
+#   "patch":    xlsx 内の計算結果シートXMLのセルと検証シートのパートだけを書き換える
+#               （グラフ表示シートのグラフなど、openpyxl が扱えない部分もそのまま残る）
+#   "openpyxl": openpyxl でブック全体を読み込み・保存し直す（従来方式）
+OUTPUT_MODE = "patch"
+
+# 既定の時間グリッド: スナップショット 8:00〜20:00 の30分毎（25個）、
+# 各スナップショットの +0〜+29分 を1分毎にサンプリング（サンプリング範囲 8:00〜20:29）
+SNAPSHOT_GRID = TimeGrid.minutes(8 * 60, 20 * 60, 30, 30)
+
+# 計算結果シートの行: 全体集計と曜日別集計の (全手術行, 予定手術のみ行)。時刻見出しは全手術行の1行上
+OVERALL_ROWS = (2, 3)
+WEEKDAY_ROWS = {
+    "月曜日": (7, 8),
+    "火曜日": (12, 13),
+    "水曜日": (17, 18),
+    "木曜日": (22, 23),
+    "金曜日": (27, 28),
+    "土曜日": (32, 33),
+}
+RESULT_COLUMNS = 25  # 計算結果シートの時刻列の数（B〜Z列）
+
+# 予定手術として数える実施申込区分
+SCHED_CATEGORIES = ("定時",)
+
+DEFAULT_CONFIG_NAME = "v4.0"
+
+# 集計エンジン: 名前 → 占有の保持クラス（build(cases, 開始分, 終了分) で構築する）
+ENGINES = {"cube": OccupancyCube, "epoch": EpochOccupancy}
+ENGINE = "cube"
+
+# watch モードで元データブックの更新を確認する間隔（秒）
+WATCH_INTERVAL = 2.0
+
+# 1つの集計構成。None の項目は定義シート（なければ既定値）の設定を使う
+#   grid: TimeGrid、room_groups: [RoomGroup, ...]、exclude_weekdays: 除外曜日の集合、
+#   weekday_rows: {曜日: (全手術行, 予定手術のみ行)}、room_breakdown: 部屋別内訳シート・CSV も出力するか
+RunConfig = namedtuple(
+    "RunConfig",
+    "name output grid sched_categories room_groups exclude_weekdays weekday_rows room_breakdown",
+    defaults=(None, SCHED_CATEGORIES, None, None, None, False),
+)
+
+
+def run(input_file, output_file, output_mode=OUTPUT_MODE, timings=None, grid=None, profiler=None,
+        room_breakdown=False, engine=ENGINE, csv_import=None, stream=False):
+    """1つの元データブックを集計して結果ブックを保存し、集計値を返す
+
+    戻り値: {"all": Row2, "sched": Row3, "weekday": {曜日: (全手術, 予定のみ, 対象日数)},
+             "snapshot_labels": 時刻ラベル, "num_days": 対象日数, "case_count": 全手術件数}
+    timings に dict を渡すと、工程ごとの経過秒
+    （"load", "compute", "verification", "save"）を書き込む。
+    grid（occupancy.TimeGrid）を省略すると、定義シートの「時間グリッド」欄（なければ SNAPSHOT_GRID）を使う。
+    profiler（profiling.Profiler）を渡すと、細かい工程（"load.parse_source" など）ごとに記録する。
+    room_breakdown=True なら部屋別内訳シートと CSV も出力する。engine は ENGINES の名前。
+    input_file が CSV/TSV なら csv_import（csv_source.CsvImport）の設定で読み込む。
+    stream=True なら日付順の元データを1日分ずつ流し込み、手術記録を保持せずに集計する。
+    """
+    config = RunConfig(DEFAULT_CONFIG_NAME, output_file, grid, room_breakdown=room_breakdown)
+    return run_configs(input_file, [config], output_mode, timings, profiler, engine,
+                       csv_import=csv_import, stream=stream)[config.name]
+
+
+def resolve_config(config, definition):
+    """構成の未指定（None）の項目を定義シートの設定・既定値で埋める"""
+    return config._replace(
+        grid=config.grid or TimeGrid.from_settings(definition.grid_settings, SNAPSHOT_GRID),
+        room_groups=definition.room_groups if config.room_groups is None else config.room_groups,
+        exclude_weekdays=(definition.exclude_weekdays if config.exclude_weekdays is None
+                          else config.exclude_weekdays),
+        weekday_rows=WEEKDAY_ROWS if config.weekday_rows is None else config.weekday_rows,
+    )
+
 
-def to_minutes(t):
-    """時刻を分に変換（time, timedelta, str対応）"""
-    if isinstance(t, dt.time):
-        return t.hour * 60 + t.minute
-    elif isinstance(t, dt.timedelta):
-        return int(t.total_seconds()) // 60
-    elif isinstance(t, str):
-        parts = t.split(":")
-        return int(parts[0]) * 60 + int(parts[1])
+def open_input(input_file, csv_import=None, stream=False):
+    """元データ（元データブック or CSV/TSV）を開く: (Definition, 手術, 結果ブックのひな形)
+
+    手術は CaseTable（キャッシュあり）、stream=True なら Case を1件ずつ返すイテレータ。
+    CSV/TSV は csv_import（省略時は既定の設定）で読み、その workbook をひな形にする。
+    """
+    if not csv_source.is_csv(input_file):
+        definition, cases = stream_source(input_file) if stream else load_source(input_file)
+        return definition, cases, input_file
+    csv_import = csv_import or csv_source.default_import(input_file)
+    print(f"CSV 取り込み: 定義={'取り込み設定' if csv_import.definition is not None else csv_import.workbook}"
+          f"、結果のひな形={csv_import.workbook}")
+    if stream:
+        definition, cases = csv_source.stream_csv(input_file, csv_import)
     else:
-        return t.hour * 60 + t.minute
-
-
-def main():
-    print(f"入力ファイル読み込み: {INPUT_FILE}")
-    wb = openpyxl.load_workbook(INPUT_FILE)
-
-    # --- 定義シートから設定読み込み ---
-    ws_def = wb["定義"]
-
-    # 対象手術室とウェイト（全行読み込み）
-    room_weight_raw = {}
-    for row in ws_def.iter_rows(min_row=2, max_row=20, min_col=1, max_col=2, values_only=True):
-        if row[0] is not None and row[1] is not None:
-            try:
-                room_weight_raw[str(row[0])] = float(row[1])
-            except (ValueError, TypeError):
-                break
-
-    # 01B統合ロジック: ウェイト0の部屋を特定し、統合先を決定
-    # 01Bウェイト=0 → 01Bの手術データを01Aに統合
-    merge_map = {}  # {統合元部屋名: 統合先部屋名}
-    room_weight = {}  # 実際に集計に使うウェイト（ウェイト>0の部屋のみ）
-
-    for room_name, weight in room_weight_raw.items():
-        if weight == 0:
-            # ウェイト0の部屋 → 統合先を探す
-            # 01B → 01A のように、末尾アルファベット違いの部屋を探す
-            base = room_name[:-1] if room_name[-1].isalpha() else None
-            if base:
-                for candidate, cw in room_weight_raw.items():
-                    if candidate != room_name and candidate.startswith(base) and cw > 0:
-                        merge_map[room_name] = candidate
-                        break
-            if room_name not in merge_map:
-                print(f"警告: ウェイト0の部屋 '{room_name}' の統合先が見つかりません。無視します。")
-        else:
-            room_weight[room_name] = weight
+        definition, cases = csv_source.load_csv(input_file, csv_import)
+    return definition, cases, csv_import.workbook
+
+
+def resolve_configs(configs, definition):
+    """全構成を定義シートの設定で埋め、(構成のリスト, 全構成の集計対象の部屋, 全構成のサンプリング範囲 (開始分, 終了分)) を返す"""
+    configs = [resolve_config(config, definition) for config in configs]
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"集計構成の名前が重複しています: {names}")
+    rooms = set()
+    for config in configs:
+        rooms |= definition.counted_rooms(config.room_groups)
+    spans = [config.grid.span_minutes() for config in configs]
+    return configs, rooms, (min(lo for lo, _ in spans), max(hi for _, hi in spans))
+
+
+def run_configs(input_file, configs, output_mode=OUTPUT_MODE, timings=None, profiler=None, engine=ENGINE,
+                day_cache=None, csv_import=None, stream=False):
+    """元データを1回だけ読み込み、同じ占有キューブで複数の集計構成を計算して構成ごとに保存する
+
+    configs: [RunConfig, ...]（構成名は重複不可）
+    戻り値: {構成名: run() と同じ集計値}。timings は全構成の合計秒。
+    day_cache（incremental.DayCache）を渡すと、前回の読み込みから変わった日だけ日別の値を計算し直す。
+    input_file が CSV/TSV なら csv_import（csv_source.CsvImport、省略時は既定の設定）で読み込み、
+    その workbook を結果ブックのひな形にする。
+    stream=True なら日付順の元データを1日分ずつ流し込んで集計する（stream_configs を参照）。
+    """
+    timings = {} if timings is None else timings
+    profiler = profiler or Profiler(__name__, enabled=False)
+    clock = [time.perf_counter()]
+
+    def lap(phase, step):
+        """工程の区切り: timings[phase] に加算し、profiler には "phase.step" として記録する"""
+        now = time.perf_counter()
+        timings[phase] = timings.get(phase, 0.0) + now - clock[0]
+        profiler.lap(f"{phase}.{step}")
+        clock[0] = time.perf_counter()
+
+    print(f"入力ファイル読み込み: {input_file}")
+    if stream:
+        if day_cache is not None:
+            raise ValueError("日付順の流し込み集計では差分再計算（day_cache）は使えません")
+        return stream_configs(input_file, configs, output_mode, lap, engine, csv_import)
+
+    # --- 定義シート・元データ読み込み（読み取り専用ストリーミング、時刻は分に変換済み）---
+    definition, table, template_file = open_input(input_file, csv_import)
+    lap("load", "parse_source")
+
+    for room_name in definition.unmerged:
+        print(f"警告: ウェイト0の部屋 '{room_name}' の統合先が見つかりません。無視します。")
+    print(f"対象手術室: {definition.room_weight}")
+
+    records = list(table.cases())
+    print(f"総レコード数: {len(records)}")
+    lap("load", "records")
 
-    print(f"対象手術室: {room_weight}")
-    if merge_map:
-        print(f"部屋統合: {merge_map}")
+    configs, rooms, (start_min, end_min) = resolve_configs(configs, definition)
+    lap("load", "definition")
+
+    if day_cache is not None:
+        diff = day_cache.update(definition, records, ENGINES[engine].overnight)
+        if diff is None:
+            print("差分再計算: 全日を計算します")
+        else:
+            added, removed, modified, _ = diff
+            print(f"差分再計算: 追加 {added} 件・削除 {removed} 件・変更 {modified} 件 → "
+                  f"計算し直す日 {len(day_cache.changed)} 日")
+        lap("load", "diff")
+
+    print_overnight(sum(1 for r in records if r.room in rooms and crosses_midnight(r.start, r.end)), engine)
+
+    # --- 占有キューブ（日 × 部屋 × 分 全構成のサンプリング範囲 × 区分）を1回だけ構築し、全構成で共有 ---
+    # （epoch では全期間の通し分軸の部屋別区間。サンプリング範囲で切り捨てない）
+    cube = ENGINES[engine].build(
+        ((r.date, r.weekday, r.room, r.category, r.start, r.end)
+         for r in records if r.room in rooms),
+        start_min, end_min,
+    )
+    lap("compute", "cube")
+
+    results = {}
+    for config in configs:
+        if len(configs) > 1:
+            print(f"\n========== 集計構成: {config.name} ==========")
+        results[config.name] = run_config(config, definition, records, cube,
+                                          template_file, output_mode, lap, day_cache)
+    return results
+
+
+def stream_configs(input_file, configs, output_mode, lap, engine=ENGINE, csv_import=None):
+    """手術実施日の昇順に並んだ元データを1日分ずつ流し込み、手術記録を保持せずに全構成を集計する（--stream）
+
+    各日の手術だけを占有キューブに入れ、その日の全構成・全区分の値を求めて SectionTotals に畳み込み、
+    全セル照合もその日の分を行ってから使用区間を捨てる（OccupancyCube.release）。
+    手術のメモリは1日分（epoch では前日から日付をまたぐ分も）で、全期間で残るのは日付・曜日・区分別件数と
+    結果ブックに書く日別の値だけ。結果は run_configs と同じ。
+    """
+    definition, cases, template_file = open_input(input_file, csv_import, stream=True)
+    lap("load", "open")
+
+    for room_name in definition.unmerged:
+        print(f"警告: ウェイト0の部屋 '{room_name}' の統合先が見つかりません。無視します。")
+    print(f"対象手術室: {definition.room_weight}")
+
+    configs, rooms, (start_min, end_min) = resolve_configs(configs, definition)
+    room_weight = definition.room_weight
+    cube = ENGINES[engine](start_min, end_min)
+    # 構成ごとの途中経過: 区分ごとの畳み込み先・除外後レコード数・全セル照合（区分ごとの最大値）
+    states = {}
+    for config in configs:
+        specs = cross_check.unit_specs(room_weight, config.room_groups)
+        states[config.name] = {
+            "totals": new_totals(config, definition),
+            "rooms": definition.counted_rooms(config.room_groups),
+            "filtered": 0,
+            "cells": 0,
+            "max": [(0.0, "", "", "")] * len(config_sections(config)),
+            "capacity": sum(weight * min(cap, len(members)) for _, members, weight, cap in specs),
+        }
+    lap("load", "definition")
+
+    def finish_day(di, day_cases, spill):
+        """1日分（日idx di）の全構成・全区分の値を畳み込み、照合してから使用区間を捨てる"""
+        day = cube.days[di]
+        weekday = cube.day_weekday[di]
+        for config in configs:
+            state = states[config.name]
+            check_cases = [case for case in spill + day_cases if case.room in state["rooms"]]
+            for index, (key, label, categories) in enumerate(config_sections(config)):
+                if not cube.counts_day(di, categories, state["rooms"]):
+                    continue
+                section_totals = state["totals"][key]
+                values, unit_values = day_values(cube, di, room_weight, config, categories,
+                                                 section_totals.units is not None)
+                section_totals.add(di, day, weekday, values, unit_values)
+                lap("compute", "stream")
+                if weekday in config.exclude_weekdays:
+                    continue
+                # 全セル照合（この日・この区分だけ）。最大値は区分ごとに日の順で持ち、最後に区分の順で選ぶ
+                checked = cross_check.verify(
+                    [(label, accept_categories(categories), {0: values})], check_cases,
+                    room_weight, config.room_groups, config.grid, [day],
+                    lambda _, __, c=categories: day_values(cube, di, room_weight, config, c, True)[1],
+                    cube.overnight, config.exclude_weekdays, day_weekdays=[weekday])
+                state["cells"] += checked["cells"]
+                if checked["max"][0] > state["max"][index][0]:
+                    state["max"][index] = checked["max"]
+                lap("verification", "cross_check")
+        cube.release(di)
+
+    record_count = overnight_count = 0
+    spill = []  # 前日の手術のうち0:00をまたぐもの（epoch の照合用）
+    done = 0    # 集計を終えた日の数（cube.days[:done]）
+    for day, day_cases in day_chunks(cases):
+        # 前日から0:00をまたぐ分だけの日（この日より前で手術がない日）を先に集計する
+        for di in range(done, len(cube.days)):
+            if cube.days[di] != day:
+                finish_day(di, [], spill)
+                spill = []
+                done = di + 1
+        record_count += len(day_cases)
+        for case in day_cases:
+            if case.room in rooms:
+                cube.add(case.date, case.weekday, case.room, case.category, case.start, case.end)
+                if crosses_midnight(case.start, case.end):
+                    overnight_count += 1
+        lap("load", "stream")
+        for config in configs:
+            states[config.name]["filtered"] += sum(1 for case in day_cases
+                                                   if case.weekday not in config.exclude_weekdays)
+        # 集計対象の部屋の手術がない日はキューブに日がない（run_configs と同じ）
+        di = cube.day_index(day)
+        if di is not None:
+            finish_day(di, day_cases, spill)
+            done = di + 1
+        spill = [case for case in day_cases if crosses_midnight(case.start, case.end)] if cube.overnight else []
+    for di in range(done, len(cube.days)):
+        finish_day(di, [], spill)
+        spill = []
+
+    print(f"総レコード数: {record_count}")
+    print_overnight(overnight_count, engine)
+
+    results = {}
+    for config in configs:
+        if len(configs) > 1:
+            print(f"\n========== 集計構成: {config.name} ==========")
+        state = states[config.name]
+        print_config(config, state["filtered"])
+        max_cell = (0.0, "", "", "")
+        for section_max in state["max"]:
+            if section_max[0] > max_cell[0]:
+                max_cell = section_max
+        checked = {"cells": state["cells"], "max": max_cell, "capacity": state["capacity"]}
+        results[config.name] = report_config(config, cube, state["rooms"], state["totals"],
+                                             lambda c=checked: (c, None), template_file, output_mode, lap)
+    return results
+
+
+def config_sections(config):
+    """集計する区分: [(キー, 照合・表示の区分名, 区分のリスト（None は全区分）), ...]
+
+    集計パス・検証シート・全セル照合・部屋別内訳で同じ順（全手術、予定手術、臨時、緊急）。
+    """
+    sched_categories = list(config.sched_categories)
+    return [("all", "合計", None), ("sched", "+".join(sched_categories), sched_categories),
+            ("urgent", "臨時", ["臨時"]), ("emerg", "緊急", ["緊急"])]
+
+
+def accept_categories(categories):
+    """全セル照合の区分のフィルタ（Case → bool）"""
+    if categories is None:
+        return lambda r: True
+    categories = set(categories)
+    return lambda r: r.category in categories
+
+
+def day_values(cube, di, room_weight, config, categories=None, with_units=False):
+    """1日分・選択区分のスナップショット値（丸めなし）と、with_units なら部屋別の値（なければ None）"""
+    unit_intervals, unit_weight = cube.unit_intervals(di, room_weight, categories, config.room_groups)
+    timeline = DayTimeline(unit_intervals, unit_weight)
+    unit_values = config.grid.unit_averages(timeline, unit_weight) if with_units else None
+    return config.grid.averages(timeline), unit_values
+
+
+def new_totals(config, definition):
+    """区分ごとの日別値の畳み込み先: {キー: streaming.SectionTotals}"""
+    units = unit_names(definition.room_weight, config.room_groups) if config.room_breakdown else None
+    num_snaps = len(config.grid.points())
+    return {key: SectionTotals(num_snaps, config.exclude_weekdays, units) for key, _, _ in config_sections(config)}
+
+
+def print_config(config, filtered_count):
+    """集計構成の設定と除外後レコード数を表示する"""
+    # 部屋グループ: 構成部屋の使用区間の和集合（同時使用は上限まで）を1単位として数える
+    # （グループ欄がなければ、ウェイト0の部屋（01B）をウェイト>0の部屋（01A）に統合するグループ）
+    for group in config.room_groups:
+        print(f"部屋グループ: {group.name} = {'+'.join(group.members)}"
+              f"（ウェイト{group.weight}、同時使用の上限{group.cap}室）")
 
     # 除外曜日
-    exclude_weekdays = set()
-    r = 14
-    while True:
-        r += 1
-        v = ws_def.cell(row=r, column=1).value
-        if v is None or v == "":
-            break
-        exclude_weekdays.add(str(v))
-    print(f"除外曜日: {exclude_weekdays}")
-
-    # --- 元データ読み込み ---
-    ws_data = wb["時間帯別稼働推移元データ"]
-    records = []
-    for row in ws_data.iter_rows(min_row=2, max_row=ws_data.max_row, values_only=True):
-        mgmt_no, op_date, weekday, room, start_time, end_time, category = row
-        if room is not None:
-            room_str = str(room)
-            # 部屋統合: 01B → 01A
-            if room_str in merge_map:
-                room_str = merge_map[room_str]
-            records.append({
-                "date": str(op_date) if op_date else "",
-                "weekday": str(weekday) if weekday else "",
-                "room": room_str,
-                "start": start_time,
-                "end": end_time,
-                "category": str(category) if category else "",
-            })
+    print(f"除外曜日: {config.exclude_weekdays}")
+    print(f"時間グリッド: {config.grid.describe()}")
+    print(f"除外後レコード数: {filtered_count}")
 
-    print(f"総レコード数: {len(records)}")
+
+def print_overnight(overnight_count, engine):
+    """日付をまたぐ手術の件数（数えないエンジンでは警告）を表示する"""
+    if overnight_count:
+        if ENGINES[engine].overnight:
+            print(f"日付をまたぐ手術: {overnight_count} 件（翌日分も数えます）")
+        else:
+            print(f"警告: 日付をまたぐ手術 {overnight_count} 件は集計に含まれません（--engine epoch で翌日分も数えます）")
+
+
+def run_config(config, definition, records, cube, template_file, output_mode, lap, day_cache=None):
+    """読み込み済みの元データ・占有キューブで1つの集計構成を計算し、config.output に保存する
+
+    結果ブックは template_file（元データブック、CSV 入力では定義を読むブック）をひな形にする。
+    """
+    room_weight = definition.room_weight
+    rooms = definition.counted_rooms(config.room_groups)
+    exclude_weekdays = config.exclude_weekdays
 
     # 除外曜日フィルタリング
-    records_filtered = [r for r in records if r["weekday"] not in exclude_weekdays]
-    print(f"除外後レコード数: {len(records_filtered)}")
-
-    # --- スナップショット時刻（8:00から30分おき、20:00まで = 25個）---
-    snapshot_times = []
-    for h in range(8, 20):
-        snapshot_times.append(dt.time(h, 0))
-        snapshot_times.append(dt.time(h, 30))
-    snapshot_times.append(dt.time(20, 0))
-
-    # --- 1分サンプリング + 30分平均集計関数 ---
-    def count_rooms_at_snapshots(data):
-        """
-        各スナップショット時刻の30分間（+0〜+29分）について、
-        1分毎のサンプリングで使用室数を計算し、30個の平均を日平均で算出。
+    print_config(config, sum(1 for r in records if r.weekday not in exclude_weekdays))
+    lap("compute", "filter")
+
+    # --- 区分フィルタごとの 日別×スナップショット 値（各日1回だけ計算）を日の順に畳み込む ---
+    # 区分ごとの集計パス（profiler の "compute.aggregate" の回数 = パス数）
+    # 部屋別内訳は同じパスで同じタイムラインから部屋別の値も取る
+    # day_cache があれば、変わっていない日は前回の値を使う
+    totals = new_totals(config, definition)
+    matrices = []
+    for key, _, categories in config_sections(config):
+        section_totals = totals[key]
+        with_units = section_totals.units is not None
+        matrix = {}
+        # 日はこの構成の集計対象の部屋に手術がある日（他の構成だけが数える部屋の手術の日は含めない）
+        for di in cube.select_days(categories, rooms=rooms):
+            cached = day_cache.get((config.name, key), cube.days[di], with_units) if day_cache else None
+            if cached is None:
+                cached = day_values(cube, di, room_weight, config, categories, with_units)
+                if day_cache is not None:
+                    day_cache.put((config.name, key), cube.days[di], *cached)
+            matrix[di] = cached[0]
+            section_totals.add(di, cube.days[di], cube.day_weekday[di], *cached)
+        matrices.append(matrix)
+        lap("compute", "aggregate")
+    if day_cache is not None:
+        print(f"日別の値: 計算 {day_cache.recomputed} 件・前回の値を使用 {day_cache.reused} 件（日 × 区分）")
+
+    def cross_check_all():
+        """全セル照合（全区分・全日・全スナップショットを区間演算の独立計算と突き合わせる）
+
+        戻り値: (cross_check.verify の結果, 照合した日idx の集合（None は全日）)
         """
-        days = {}
-        for r in data:
-            d = r["date"]
-            if d not in days:
-                days[d] = []
-            days[d].append(r)
-
-        num_days = len(days)
-        if num_days == 0:
-            return [0.0] * len(snapshot_times)
-
-        totals = [0.0] * len(snapshot_times)
-
-        for day_str, day_records in days.items():
-            for si, snap in enumerate(snapshot_times):
-                snap_min = to_minutes(snap)
-                # 30分間の1分サンプリング: snap_min + 0, +1, ..., +29
-                minute_sum = 0.0
-                for offset in range(30):
-                    sample_min = snap_min + offset
-                    # 各部屋の使用有無を判定
-                    room_used = set()
-                    for r in day_records:
-                        room = r["room"]
-                        if room not in room_weight:
-                            continue
-                        start_min = to_minutes(r["start"])
-                        end_min = to_minutes(r["end"])
-                        # 使用中判定: 入室時刻 ≤ sample_min ≤ 麻酔終了時刻
-                        if start_min <= sample_min <= end_min:
-                            room_used.add(room)
-                    # 使用室数 = 使用中の部屋のウェイト合計（各部屋上限1回）
-                    count = sum(room_weight[rm] for rm in room_used)
-                    minute_sum += count
-                # 30分間の平均
-                snapshot_avg = minute_sum / 30.0
-                totals[si] += snapshot_avg
-
-        averages = [round(t / num_days, 2) for t in totals]
-        return averages
+        sections = config_sections(config)
+
+        def main_units(index, di):
+            """不一致の部屋の特定用: 本計算と同じ単位別区間からの部屋別の値"""
+            return day_values(cube, di, room_weight, config, sections[index][2], True)[1]
+
+        check_sections = [
+            (label, accept_categories(categories),
+             {di: values for di, values in matrix.items() if cube.day_weekday[di] not in exclude_weekdays})
+            for (_, label, categories), matrix in zip(sections, matrices)
+        ]
+        # 差分再計算では計算し直した日だけ照合する（前回の値を使った日は前回照合済み）
+        check_days = None
+        if day_cache is not None and day_cache.changed is not None:
+            check_days = {di for di, d in enumerate(cube.days) if d in day_cache.changed}
+        checked = cross_check.verify(check_sections, [r for r in records if r.room in rooms],
+                                     room_weight, config.room_groups, config.grid, cube.days, main_units,
+                                     cube.overnight, exclude_weekdays, check_days, cube.day_weekday)
+        return checked, check_days
+
+    return report_config(config, cube, rooms, totals, cross_check_all, template_file, output_mode, lap)
+
+
+def report_config(config, cube, rooms, totals, cross_check_all, template_file, output_mode, lap):
+    """区分ごとに畳み込んだ日別値から計算結果・検証シート・部屋別内訳を作り、config.output に保存する
+
+    cube は日付・曜日・区分別件数だけを使う（使用区間は捨ててあってよい）。
+    件数は rooms（この構成の集計対象の部屋）の手術だけを数える。
+    cross_check_all() は全セル照合の (結果, 照合した日idx の集合 or None) を返す。
+    """
+    output_file = config.output
+    grid = config.grid
+    sched_categories = list(config.sched_categories)
+    all_totals, sched_totals, urgent_totals, emerg_totals = (totals[key] for key, _, _ in config_sections(config))
+
+    # --- スナップショット時刻（秒）と各時刻の集計区間（既定: 8:00から30分おき、20:00まで = 25個）---
+    snapshot_points = grid.points()
+    num_snaps = len(snapshot_points)
 
     # --- 全手術（定時・臨時・緊急）---
-    all_surgery = [r for r in records_filtered if r["room"] in room_weight]
-    print(f"\n全手術（対象室のみ）: {len(all_surgery)} 件")
-    all_results = count_rooms_at_snapshots(all_surgery)
+    all_days = all_totals.day_indices
+    print(f"\n全手術（対象室のみ）: {cube.case_count(all_days, rooms=rooms)} 件")
+    all_results = all_totals.mean()
 
-    # --- 予定手術のみ（定時のみ）---
-    scheduled_only = [r for r in records_filtered if r["room"] in room_weight and r["category"] == "定時"]
-    print(f"予定手術のみ: {len(scheduled_only)} 件")
-    sched_results = count_rooms_at_snapshots(scheduled_only)
+    # --- 予定手術のみ（既定: 定時のみ）---
+    sched_days = sched_totals.day_indices
+    print(f"予定手術のみ: {cube.case_count(sched_days, sched_categories, rooms)} 件")
+    sched_results = sched_totals.mean()
 
-    # --- 計算結果シートに書き込み ---
-    ws_result = wb["計算結果"]
+    # --- 計算結果シートの書き込み値 {(行, 列): 値}（保存は最後にまとめて行う）---
+    result_values = {}
 
     # 全体集計（Row2-3）
+    all_row, sched_row = OVERALL_ROWS
     for i, val in enumerate(all_results):
-        ws_result.cell(row=2, column=2 + i, value=val)
+        result_values[(all_row, 2 + i)] = val
 
     for i, val in enumerate(sched_results):
-        ws_result.cell(row=3, column=2 + i, value=val)
-
-    # --- 曜日別集計（Row5〜33）---
-    weekday_rows = {
-        "月曜日": {"all_row": 7,  "sched_row": 8},
-        "火曜日": {"all_row": 12, "sched_row": 13},
-        "水曜日": {"all_row": 17, "sched_row": 18},
-        "木曜日": {"all_row": 22, "sched_row": 23},
-        "金曜日": {"all_row": 27, "sched_row": 28},
-        "土曜日": {"all_row": 32, "sched_row": 33},
-    }
+        result_values[(sched_row, 2 + i)] = val
 
-    print("\n--- 曜日別集計 ---")
-    for weekday_name, rows in weekday_rows.items():
-        weekday_records = [r for r in records if r["weekday"] == weekday_name and r["room"] in room_weight]
-        weekday_scheduled = [r for r in weekday_records if r["category"] == "定時"]
+    # --- 曜日別集計（既定: Row5〜33）---
+    weekday_rows = config.weekday_rows
 
-        wd_all_results = count_rooms_at_snapshots(weekday_records)
-        wd_sched_results = count_rooms_at_snapshots(weekday_scheduled)
+    print("\n--- 曜日別集計 ---")
+    weekday_results = {}
+    for weekday_name, (all_row, sched_row) in weekday_rows.items():
+        wd_all_results, wd_num_days = all_totals.weekday_mean(weekday_name)
+        wd_sched_results, _ = sched_totals.weekday_mean(weekday_name)
 
         for i, val in enumerate(wd_all_results):
-            ws_result.cell(row=rows["all_row"], column=2 + i, value=val)
+            result_values[(all_row, 2 + i)] = val
         for i, val in enumerate(wd_sched_results):
-            ws_result.cell(row=rows["sched_row"], column=2 + i, value=val)
+            result_values[(sched_row, 2 + i)] = val
+
+        weekday_results[weekday_name] = (wd_all_results, wd_sched_results, wd_num_days)
+        print(f"  {weekday_name}: 全手術={wd_all_results}, 予定={wd_sched_results}, 対象日数={wd_num_days}")
 
-        # 対象日数を算出
-        wd_days = set(r["date"] for r in weekday_records)
-        print(f"  {weekday_name}: 全手術={wd_all_results}, 予定={wd_sched_results}, 対象日数={len(wd_days)}")
+    # 既定と異なる時刻の並びでは、時刻見出し（全手術行の1行上、Excelの時刻値）も書き換え、
+    # 使わない時刻列は空にする
+    if snapshot_points != SNAPSHOT_GRID.points():
+        for all_row, sched_row in [OVERALL_ROWS] + list(weekday_rows.values()):
+            for i in range(max(num_snaps, RESULT_COLUMNS)):
+                if i < num_snaps:
+                    result_values[(all_row - 1, 2 + i)] = snapshot_points[i] / 86400
+                else:
+                    for row in (all_row - 1, all_row, sched_row):
+                        result_values[(row, 2 + i)] = None
+
+    lap("compute", "result_rows")
 
     # --- 検証用シート（定時・臨時・緊急別の部屋数）---
-    def count_rooms_by_day(data):
-        """日別×スナップショット時刻の稼働室数（1分サンプリング30分平均）を返す: {date: [val, ...]}"""
-        days = {}
-        for r in data:
-            d = r["date"]
-            if d not in days:
-                days[d] = []
-            days[d].append(r)
-
-        result = {}
-        for day_str, day_records in sorted(days.items()):
-            counts = []
-            for si, snap in enumerate(snapshot_times):
-                snap_min = to_minutes(snap)
-                minute_sum = 0.0
-                for offset in range(30):
-                    sample_min = snap_min + offset
-                    room_used = set()
-                    for r in day_records:
-                        room = r["room"]
-                        if room not in room_weight:
-                            continue
-                        start_min = to_minutes(r["start"])
-                        end_min = to_minutes(r["end"])
-                        if start_min <= sample_min <= end_min:
-                            room_used.add(room)
-                    count = sum(room_weight[rm] for rm in room_used)
-                    minute_sum += count
-                snapshot_avg = round(minute_sum / 30.0, 4)
-                counts.append(snapshot_avg)
-            result[day_str] = counts
-        return result
-
-    # 区分別データ
-    sched_data = [r for r in records_filtered if r["room"] in room_weight and r["category"] == "定時"]
-    urgent_data = [r for r in records_filtered if r["room"] in room_weight and r["category"] == "臨時"]
-    emerg_data = [r for r in records_filtered if r["room"] in room_weight and r["category"] == "緊急"]
-
-    sched_by_day = count_rooms_by_day(sched_data)
-    urgent_by_day = count_rooms_by_day(urgent_data)
-    emerg_by_day = count_rooms_by_day(emerg_data)
-    all_by_day = count_rooms_by_day(all_surgery)
+    # 区分別件数
+    sched_count = cube.case_count(all_days, ["定時"], rooms)
+    urgent_count = cube.case_count(all_days, ["臨時"], rooms)
+    emerg_count = cube.case_count(all_days, ["緊急"], rooms)
+    all_count = cube.case_count(all_days, rooms=rooms)
+
+    # 除外曜日を除いた日別値（日付順、小数第4位）
+    sched_by_day = sched_totals.day_table()
+    urgent_by_day = urgent_totals.day_table()
+    emerg_by_day = emerg_totals.day_table()
+    all_by_day = all_totals.day_table()
 
     # 全日付の和集合（ソート済み）
     all_dates = sorted(set(list(sched_by_day.keys()) + list(urgent_by_day.keys()) +
                            list(emerg_by_day.keys()) + list(all_by_day.keys())))
 
-    # 既存シートがあれば削除して再作成
-    verify_sheet_name = "検証_定時臨時緊急別"
-    if verify_sheet_name in wb.sheetnames:
-        del wb[verify_sheet_name]
-    ws_verify = wb.create_sheet(verify_sheet_name)
-
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
-    header_font = Font(name="Meiryo UI", size=9, bold=True, color="FFFFFF")
-    header_fill = PatternFill("solid", fgColor="2980B9")
-    label_font = Font(name="Meiryo UI", size=10, bold=True)
-    data_font = Font(name="Meiryo UI", size=9)
-    thin_border = Border(
-        left=Side(style="thin"), right=Side(style="thin"),
-        top=Side(style="thin"), bottom=Side(style="thin"),
-    )
-
-    num_weekdays = len(all_dates)  # 平日日数
-
-    def write_section(ws, start_row, section_label, by_day_data, dates):
-        """1セクションを書き込み、最終行+1を返す"""
-        # セクションラベル
-        cell = ws.cell(row=start_row, column=1, value=section_label)
-        cell.font = label_font
-
-        # ヘッダ行
-        hr = start_row + 1
-        dark_fill = PatternFill("solid", fgColor="1A5276")
-
-        cell = ws.cell(row=hr, column=1, value="時間帯")
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal="center")
-
-        # B列: 全平日合計ヘッダ
-        cell = ws.cell(row=hr, column=2, value="全平日合計")
-        cell.font = header_font
-        cell.fill = dark_fill
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal="center")
-
-        # C列: 全平日平均ヘッダ
-        cell = ws.cell(row=hr, column=3, value="全平日平均")
-        cell.font = header_font
-        cell.fill = dark_fill
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal="center")
-
-        # D列以降: 日付ヘッダ
-        for di, d in enumerate(dates):
-            cell = ws.cell(row=hr, column=4 + di, value=d)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal="center")
-
-        # データ行
-        bold_font = Font(name="Meiryo UI", size=9, bold=True)
-        for si, snap in enumerate(snapshot_times):
-            r = hr + 1 + si
-            time_label = f"{snap.hour}:{snap.minute:02d}"
-            cell = ws.cell(row=r, column=1, value=time_label)
-            cell.font = data_font
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal="center")
-
-            # B列: 全平日合計
-            day_total = 0.0
-            for d in dates:
-                vals = by_day_data.get(d, [0.0] * len(snapshot_times))
-                day_total += vals[si] if si < len(vals) else 0.0
-            cell = ws.cell(row=r, column=2, value=day_total)
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.number_format = "0.0"
-
-            # C列: 全平日平均
-            avg = round(day_total / num_weekdays, 2) if num_weekdays > 0 else 0.0
-            cell = ws.cell(row=r, column=3, value=avg)
-            cell.font = bold_font
-            cell.border = thin_border
-            cell.number_format = "0.00"
-
-            # D列以降: 日別値
-            for di, d in enumerate(dates):
-                vals = by_day_data.get(d, [0.0] * len(snapshot_times))
-                val = vals[si] if si < len(vals) else 0.0
-                cell = ws.cell(row=r, column=4 + di, value=val)
-                cell.font = data_font
-                cell.border = thin_border
-                cell.number_format = "0.00"
-
-        return hr + 1 + len(snapshot_times) + 1  # 次セクション開始行（1行空け）
-
-    # 列幅設定
-    ws_verify.column_dimensions["A"].width = 10
-    ws_verify.column_dimensions["B"].width = 14
-    ws_verify.column_dimensions["C"].width = 14
-    for di in range(len(all_dates)):
-        col_letter = openpyxl.utils.get_column_letter(4 + di)
-        ws_verify.column_dimensions[col_letter].width = 12
-
-    # 4セクション書き込み
-    current_row = 1
-    current_row = write_section(ws_verify, current_row, "【定時のみ】", sched_by_day, all_dates)
-    current_row = write_section(ws_verify, current_row, "【臨時のみ】", urgent_by_day, all_dates)
-    current_row = write_section(ws_verify, current_row, "【緊急のみ】", emerg_by_day, all_dates)
-    current_row = write_section(ws_verify, current_row, "【合計（検証用）】", all_by_day, all_dates)
+    # 4セクション（検証シートのレイアウトは verification_sheet で共通化）
+    verify_sections = [
+        ("【定時のみ】", sched_by_day),
+        ("【臨時のみ】", urgent_by_day),
+        ("【緊急のみ】", emerg_by_day),
+        ("【合計（検証用）】", all_by_day),
+    ]
+    snapshot_labels = grid.labels()
+    verify_sheet_name = verification_sheet.SHEET_NAME
+    lap("compute", "verification_tables")
 
     print(f"\n検証シート '{verify_sheet_name}' を作成しました")
 
@@ -384,11 +596,11 @@ def main():
     mismatch_count = 0
     total_cells = 0
     for di, d in enumerate(all_dates):
-        s_vals = sched_by_day.get(d, [0.0] * len(snapshot_times))
-        u_vals = urgent_by_day.get(d, [0.0] * len(snapshot_times))
-        e_vals = emerg_by_day.get(d, [0.0] * len(snapshot_times))
-        a_vals = all_by_day.get(d, [0.0] * len(snapshot_times))
-        for si in range(len(snapshot_times)):
+        s_vals = sched_by_day.get(d, [0.0] * num_snaps)
+        u_vals = urgent_by_day.get(d, [0.0] * num_snaps)
+        e_vals = emerg_by_day.get(d, [0.0] * num_snaps)
+        a_vals = all_by_day.get(d, [0.0] * num_snaps)
+        for si in range(num_snaps):
             total_cells += 1
             s = s_vals[si] if si < len(s_vals) else 0.0
             u = u_vals[si] if si < len(u_vals) else 0.0
@@ -406,118 +618,294 @@ def main():
 
     # 件数内訳
     print(f"\n2. 件数内訳:")
-    print(f"   定時: {len(sched_data)} 件")
-    print(f"   臨時: {len(urgent_data)} 件")
-    print(f"   緊急: {len(emerg_data)} 件")
-    print(f"   合計: {len(sched_data) + len(urgent_data) + len(emerg_data)} 件 "
-          f"(全手術={len(all_surgery)} 件)")
-
-    non_scheduled = len(urgent_data) + len(emerg_data)
-    total = len(all_surgery)
+    print(f"   定時: {sched_count} 件")
+    print(f"   臨時: {urgent_count} 件")
+    print(f"   緊急: {emerg_count} 件")
+    print(f"   合計: {sched_count + urgent_count + emerg_count} 件 "
+          f"(全手術={all_count} 件)")
+
+    non_scheduled = urgent_count + emerg_count
+    total = all_count
     ratio = non_scheduled / total * 100 if total > 0 else 0
     print(f"\n3. 臨時+緊急が全体に占める割合: {non_scheduled}/{total} = {ratio:.1f}%")
-
-    # --- サンプリング検証（20か所） ---
-    import random
-    random.seed(42)
-
-    category_map = {
-        "定時": sched_by_day,
-        "臨時": urgent_by_day,
-        "緊急": emerg_by_day,
-        "合計": all_by_day,
-    }
-    category_filter = {
-        "定時": lambda r: r["category"] == "定時",
-        "臨時": lambda r: r["category"] == "臨時",
-        "緊急": lambda r: r["category"] == "緊急",
-        "合計": lambda r: True,
-    }
-
-    sample_dates = random.sample(all_dates, min(5, len(all_dates)))
-    am_indices = [i for i, s in enumerate(snapshot_times) if s.hour < 12]
-    pm_indices = [i for i, s in enumerate(snapshot_times) if 12 <= s.hour < 20]
-    categories = ["定時", "臨時", "緊急", "合計"]
-
-    samples = []
-    for d in sample_dates:
-        am_picks = random.sample(am_indices, min(2, len(am_indices)))
-        pm_picks = random.sample(pm_indices, min(2, len(pm_indices)))
-        for si in am_picks + pm_picks:
-            cat = random.choice(categories)
-            samples.append((d, si, cat))
-
-    samples = samples[:20]
-
-    print(f"\n=== サンプリング検証（{len(samples)}か所） ===")
-    ok_count = 0
-    for idx, (d, si, cat) in enumerate(samples):
-        snap = snapshot_times[si]
-        snap_min = to_minutes(snap)
-        time_str = f"{snap.hour}:{snap.minute:02d}"
-
-        # 検証シートの値
-        by_day = category_map[cat]
-        sheet_val = by_day.get(d, [0.0] * len(snapshot_times))[si]
-
-        # 元データから手計算（1分サンプリング30分平均）
-        cat_filter = category_filter[cat]
-        day_records = [r for r in records_filtered
-                       if r["date"] == d and r["room"] in room_weight and cat_filter(r)]
-        minute_sum = 0.0
-        for offset in range(30):
-            sample_min = snap_min + offset
-            room_used = set()
-            for r in day_records:
-                start_min = to_minutes(r["start"])
-                end_min = to_minutes(r["end"])
-                if start_min <= sample_min <= end_min:
-                    room_used.add(r["room"])
-            minute_sum += sum(room_weight[rm] for rm in room_used)
-        calc_val = round(minute_sum / 30.0, 4)
-
-        match = abs(sheet_val - calc_val) < 0.01
-        status = "OK" if match else "NG"
-        if match:
-            ok_count += 1
-
-        date_short = d.replace("2025/", "") if "2025/" in d else d
-        print(f"#{idx+1:2d}  {date_short} {time_str} {cat:4s}  "
-              f"検証シート={sheet_val:.4f}  手計算={calc_val:.4f}  {status}")
-
-        if not match:
-            print(f"     *** 不一致!")
-
-    print(f"\n結果: {ok_count}/{len(samples)} 一致"
-          f"（{ok_count/len(samples)*100:.0f}%）")
-
-    # --- 最大値チェック ---
-    weight_sum = sum(room_weight.values())
-    max_val = 0.0
-    max_info = ""
-    over_count = 0
-    for d in all_dates:
-        for cat_name, by_day in [("定時", sched_by_day), ("臨時", urgent_by_day),
-                                  ("緊急", emerg_by_day), ("合計", all_by_day)]:
-            vals = by_day.get(d, [0.0] * len(snapshot_times))
-            for si, v in enumerate(vals):
-                if v > max_val:
-                    max_val = v
-                    snap = snapshot_times[si]
-                    max_info = f"{d} {snap.hour}:{snap.minute:02d} {cat_name}"
-                if v > weight_sum + 0.01:
-                    over_count += 1
+    lap("verification", "category_sum")
+
+    # --- 全セル照合（全区分・全日・全スナップショットを区間演算の独立計算と突き合わせる）---
+    # 合わないセルや上限（ウェイト合計）を超えるセルがあれば、日付・時刻・区分・部屋を示して停止する
+    checked, check_days = cross_check_all()
+    print(f"\n=== 全セル照合（区間演算による独立計算） ===")
+    scope = "対象日" if check_days is None else f"計算し直した{len(check_days)}日"
+    print(f"照合セル数: {checked['cells']}（{len(totals)}区分 × {scope} × {num_snaps}時刻）  全セル一致 OK")
+    lap("verification", "cross_check")
+
+    # --- 最大値チェック（照合と同じ走査で求めた値。上限超過は照合で停止する）---
+    max_val, max_date, max_label, max_section = checked["max"]
     print(f"\n=== 最大値チェック ===")
-    print(f"ウェイト合計(上限): {weight_sum}")
-    print(f"全セル最大値: {max_val:.4f} ({max_info})")
-    print(f"上限超過セル数: {over_count}")
+    print(f"ウェイト合計(上限): {checked['capacity']}")
+    print(f"{'全セル' if check_days is None else '照合したセルの'}最大値: "
+          f"{max_val:.4f} ({max_date} {max_label} {max_section})")
+    print(f"上限超過セル数: 0")
+
+    # --- 部屋別内訳（部屋 × 時刻・部屋 × 日、集計パスで足し込んでおいた部屋別の値から作るだけ）---
+    breakdown_sections = []
+    if config.room_breakdown:
+        unit_list = all_totals.units
+        sched_label = "+".join(sched_categories)
+        for section_label, section_totals in [("【全手術】", all_totals),
+                                              (f"【予定手術（{sched_label}）】", sched_totals),
+                                              ("【臨時のみ】", urgent_totals),
+                                              ("【緊急のみ】", emerg_totals)]:
+            breakdown_sections.append((section_label, section_totals.unit_snapshot_table(),
+                                       section_totals.unit_day_table()))
+        print(f"\n部屋別内訳: {len(unit_list)}単位 × {len(breakdown_sections)}セクション")
+        lap("compute", "room_breakdown")
 
     # --- 別名保存 ---
-    wb.save(OUTPUT_FILE)
-    print(f"\n計算完了: {OUTPUT_FILE}")
+    verify_cells = verification_sheet.cells(verify_sections, all_dates, snapshot_labels)
+    verify_widths = verification_sheet.column_widths(len(all_dates))
+    new_sheets = {verify_sheet_name: (verify_cells, verify_widths, verification_sheet.STYLES)}
+    if breakdown_sections:
+        new_sheets[room_breakdown.SHEET_NAME] = (
+            room_breakdown.cells(breakdown_sections, unit_list, snapshot_labels),
+            room_breakdown.column_widths(max(num_snaps, len(unit_list))),
+            verification_sheet.STYLES,
+        )
+    if output_mode == "patch":
+        # 計算結果シートのセルと追加シートのパートだけを書き換え、他のパートはそのままコピー
+        patch_workbook(
+            template_file, output_file,
+            cell_values={RESULT_SHEET: result_values},
+            new_sheets=new_sheets,
+        )
+    else:
+        wb = openpyxl.load_workbook(template_file)
+        ws_result = wb[RESULT_SHEET]
+        for (row, col), val in result_values.items():
+            ws_result.cell(row=row, column=col, value=val)
+        # 既存シートがあれば削除して再作成（書式は検証シートと共通の名前付きスタイル）
+        for sheet_name, (sheet_cells, widths, _) in new_sheets.items():
+            if sheet_name in wb.sheetnames:
+                del wb[sheet_name]
+            verification_sheet.write_to_worksheet(wb.create_sheet(sheet_name), sheet_cells, widths)
+        wb.save(output_file)
+    if breakdown_sections:
+        csv_file = f"{os.path.splitext(output_file)[0]}-部屋別内訳.csv"
+        room_breakdown.write_csv(csv_file, breakdown_sections, unit_list, snapshot_labels)
+        print(f"部屋別内訳CSV: {csv_file}")
+    lap("save", output_mode)
+    print(f"\n計算完了: {output_file}")
     print(f"  全手術:   {all_results}")
     print(f"  予定のみ: {sched_results}")
 
+    return {
+        "all": all_results,
+        "sched": sched_results,
+        "weekday": weekday_results,
+        "snapshot_labels": snapshot_labels,
+        "num_days": len(all_days),
+        "case_count": all_count,
+    }
+
+
+def file_state(path):
+    """更新の検出用: (更新時刻, サイズ)。保存の途中などでファイルがなければ None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(input_file, configs, output_mode=OUTPUT_MODE, engine=ENGINE, interval=WATCH_INTERVAL, csv_import=None):
+    """元データブックの保存を監視し、保存されるたびに変わった日だけ計算し直して結果ブックを書き直す
+
+    Ctrl+C で終了する。計算・保存に失敗しても監視は続け、次の保存で全日を計算し直す。
+    """
+    day_cache = DayCache()
+    handled = None  # 最後に処理したファイルの状態（失敗した状態も同じ保存では繰り返さない）
+    print(f"監視開始: {input_file}（{interval:g}秒ごとに確認、終了は Ctrl+C）")
+    try:
+        while True:
+            state = file_state(input_file)
+            if state is not None and state != handled:
+                # 保存の途中を読まないよう、1回分待って変わっていないことを確かめる
+                time.sleep(interval)
+                if file_state(input_file) != state:
+                    continue
+                started = time.perf_counter()
+                try:
+                    run_configs(input_file, configs, output_mode, engine=engine, day_cache=day_cache,
+                                csv_import=csv_import)
+                except Exception:
+                    day_cache.reset()
+                    print(f"\nエラー: {traceback.format_exc().strip().splitlines()[-1]}")
+                    print("次の保存を待ちます（次回は全日を計算し直します）")
+                else:
+                    print(f"\n更新完了: {time.perf_counter() - started:.2f}秒（{time.strftime('%H:%M:%S')}）")
+                handled = state
+                print(f"監視中: {input_file}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n監視を終了しました")
+
+
+CONFIG_KEYS = {"name", "description", "output", "grid", "sched_categories",
+               "room_groups", "exclude_weekdays", "weekday_rows", "room_breakdown"}
+
+
+def load_config(path):
+    """集計構成ファイル（JSON）を読み込み (設定, [RunConfig, ...]) を返す
+
+    {
+      "input": "時間帯別稼働推移元データ.xlsx",     … 省略可（--input が優先）
+      "output_mode": "patch",                      … 省略可
+      "engine": "cube",                            … 省略可（--engine が優先）
+      "configurations": [
+        {"name": "v4.0", "output": "結果-v4.0.xlsx", "grid": "8:00-20:00/30/30"},
+        {"name": "HOGY", "grid": "9:00-16:30/30/30",
+         "room_groups": [{"name": "01", "members": ["01A", "01B"], "weight": 0.5, "cap": 2}]},
+        ...
+      ]
+    }
+    構成の項目: name（必須）, description, output（省略時は 時間帯別稼働推移-結果-<name>.xlsx）,
+    grid, sched_categories（予定手術とする区分、既定 ["定時"]）, room_groups, exclude_weekdays,
+    weekday_rows（{"月曜日": [全手術行, 予定のみ行], ...}）, room_breakdown（true で部屋別内訳シート・CSV も出力）。
+    省略した項目は定義シートの設定・既定値。
+    相対パスは構成ファイルのフォルダから解決する。
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p):
+        return p if os.path.isabs(p) else os.path.join(base_dir, p)
+
+    configs = []
+    for item in data.get("configurations", []):
+        unknown = set(item) - CONFIG_KEYS
+        if "name" not in item or unknown:
+            raise ValueError(f"集計構成の項目が不正です（name が必須、不明な項目: {sorted(unknown)}）: {item}")
+        name = str(item["name"])
+        output = item.get("output") or f"{os.path.splitext(os.path.basename(OUTPUT_FILE))[0]}-{name}.xlsx"
+        room_groups = item.get("room_groups")
+        if room_groups is not None:
+            room_groups = [RoomGroup(g["name"], tuple(g["members"]), float(g.get("weight", 1.0)),
+                                     int(g.get("cap", 1))) for g in room_groups]
+        weekday_rows = item.get("weekday_rows")
+        if weekday_rows is not None:
+            weekday_rows = {wd: tuple(rows) for wd, rows in weekday_rows.items()}
+        exclude_weekdays = item.get("exclude_weekdays")
+        configs.append(RunConfig(
+            name,
+            resolve(output),
+            TimeGrid.parse(item["grid"]) if item.get("grid") else None,
+            tuple(item.get("sched_categories", SCHED_CATEGORIES)),
+            room_groups,
+            set(exclude_weekdays) if exclude_weekdays is not None else None,
+            weekday_rows,
+            bool(item.get("room_breakdown", False)),
+        ))
+    if not configs:
+        raise ValueError(f"集計構成ファイルに configurations がありません: {path}")
+
+    settings = {"output_mode": data.get("output_mode", OUTPUT_MODE), "engine": data.get("engine", ENGINE)}
+    if settings["engine"] not in ENGINES:
+        raise ValueError(f"engine は {', '.join(ENGINES)} のいずれかです: {settings['engine']}")
+    if data.get("input"):
+        settings["input"] = resolve(data["input"])
+    return settings, configs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="時間帯別稼働推移を計算します")
+    parser.add_argument("--input", default=None, help=f"元データブック（既定: {os.path.basename(INPUT_FILE)}）")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help=f"結果ブック（既定: {os.path.basename(OUTPUT_FILE)}、--config では構成ごとの output）")
+    parser.add_argument("--grid", default=None,
+                        help="時間グリッド 開始-終了/間隔/窓長[/基準]（例: 8:00-20:00/30/30、"
+                             "9:00-16:57/3/3、間隔・窓長の 20s は秒）。省略時は定義シートまたは既定値")
+    parser.add_argument("--output-mode", choices=("patch", "openpyxl"), default=None,
+                        help=f"出力方式（既定: {OUTPUT_MODE}）")
+    parser.add_argument("--engine", choices=tuple(ENGINES), default=None,
+                        help=f"集計エンジン（既定: {ENGINE}。epoch は日付をまたぐ手術も翌日分まで数える）")
+    parser.add_argument("--config", default=None, help="名前付き集計構成を複数書いた JSON ファイル")
+    parser.add_argument("--only", default=None, help="--config の構成のうち計算するもの（名前、カンマ区切り）")
+    parser.add_argument("--room-breakdown", action="store_true",
+                        help="部屋別内訳（部屋 × 時刻・部屋 × 日）のシートと CSV も出力する（--config では全構成）")
+    parser.add_argument("--profile", nargs="?", default=None,
+                        const=os.path.join(SCRIPT_DIR, profiling.default_path(__file__)),
+                        help="工程別の時間・回数・ピークメモリを記録し、JSON（省略時は "
+                             f"{profiling.default_path(__file__)}）と要約を出力する")
+    parser.add_argument("--watch", nargs="?", type=float, default=None, const=WATCH_INTERVAL,
+                        help=f"元データブックの保存を監視し、変わった日だけ計算し直して結果を書き直す"
+                             f"（確認の間隔（秒）、既定: {WATCH_INTERVAL:g}）")
+    parser.add_argument("--import-config", default=None,
+                        help="--input が CSV/TSV のときの取り込み設定（JSON: 文字コード・区切り文字・列の対応・定義の読み先）")
+    parser.add_argument("--stream", action="store_true",
+                        help="手術実施日の昇順に並んだ元データを1日分ずつ流し込み、手術記録を保持せずに集計する"
+                             "（メモリは1日分の手術に比例。結果は同じ。xlsx は共有文字列表を全体で読み込むため、"
+                             "メモリを期間によらず抑えるには CSV/TSV を使う）")
+    args = parser.parse_args(argv)
+    csv_import = None
+    if args.import_config:
+        try:
+            csv_import = csv_source.load_import_config(args.import_config)
+        except (OSError, ValueError, TypeError) as e:
+            parser.error(f"取り込み設定を読み込めません: {e}")
+    if args.watch is not None and args.profile is not None:
+        parser.error("--profile は --watch と同時に指定できません")
+    if args.watch is not None and args.stream:
+        parser.error("--stream は --watch と同時に指定できません（watch は日別の値を覚えておく差分再計算です）")
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch の間隔は正の秒数です")
+    profiler = Profiler("calculate_timezone_usage", enabled=args.profile is not None)
+
+    if args.config:
+        if args.grid:
+            parser.error("--grid は --config と同時に指定できません（構成ごとの grid を使います）")
+        try:
+            settings, configs = load_config(args.config)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f"集計構成ファイルを読み込めません: {e}")
+        if args.only:
+            names = [v.strip() for v in args.only.split(",") if v.strip()]
+            unknown = [n for n in names if n not in {c.name for c in configs}]
+            if unknown:
+                parser.error(f"集計構成ファイルにない構成: {unknown}")
+            configs = [c for c in configs if c.name in names]
+        if args.room_breakdown:
+            configs = [c._replace(room_breakdown=True) for c in configs]
+        input_file = args.input or settings.get("input", INPUT_FILE)
+        if args.watch is not None:
+            watch(input_file, configs, args.output_mode or settings["output_mode"],
+                  args.engine or settings["engine"], args.watch, csv_import)
+            return
+        try:
+            run_configs(input_file, configs, args.output_mode or settings["output_mode"], profiler=profiler,
+                        engine=args.engine or settings["engine"], csv_import=csv_import, stream=args.stream)
+        except UnsortedInputError as e:
+            parser.error(f"{e}（並べ替えるか、--stream を付けずに実行してください）")
+        profiler.finish(args.profile)
+        return
+
+    grid = None
+    if args.grid:
+        try:
+            grid = TimeGrid.parse(args.grid)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.watch is not None:
+        config = RunConfig(DEFAULT_CONFIG_NAME, args.output, grid, room_breakdown=args.room_breakdown)
+        watch(args.input or INPUT_FILE, [config], args.output_mode or OUTPUT_MODE, args.engine or ENGINE, args.watch,
+              csv_import)
+        return
+    try:
+        run(args.input or INPUT_FILE, args.output, args.output_mode or OUTPUT_MODE, grid=grid, profiler=profiler,
+            room_breakdown=args.room_breakdown, engine=args.engine or ENGINE, csv_import=csv_import, stream=args.stream)
+    except UnsortedInputError as e:
+        parser.error(f"{e}（並べ替えるか、--stream を付けずに実行してください）")
+    profiler.finish(args.profile)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,204 @@
+"""
+全セル照合（区間演算による独立計算）
+====================================
+本計算（占有キューブ → 1分単位の累積和 DayTimeline → TimeGrid の窓平均）とは別の方法で、
+全区分・全日・全スナップショットの値を計算し直して突き合わせます。
+
+- 元データの手術（Case）から直接、部屋ごとの和集合区間を作り（キューブのビット列は使わない）
+- 数える単位（部屋・部屋グループ）ごとに同時使用数の変化点を秒単位で求め、
+  min(使用中の構成部屋数, 上限) × ウェイト の階段関数を全単位で足し合わせる
+- 階段関数の積分（累積）を変化点で持ち、各窓の平均を 積分の差 / 窓の秒数 で求める
+  （1日分の全窓を1回の走査で計算する。1分毎・1秒毎のサンプリングはしない）
+
+日付をまたぐ手術を翌日分も数える集計（occupancy.EpochOccupancy）では overnight=True とし、
+前日の手術のうち0:00をまたぐものも、その日の -1440分 からの区間として加える。
+
+1つでも値が合わない、または上限（ウェイト合計）を超えるセルがあれば、
+日付・時刻・区分と、値が合わない部屋を示して VerificationError を送出します。
+"""
+
+from bisect import bisect_right
+
+from occupancy import DAY_MINUTES, crosses_midnight, day_ordinal
+
+# 本計算との許容差（どちらも丸め前の値を比べるので浮動小数の誤差だけを許す）
+TOLERANCE = 1e-9
+
+# エラーメッセージに載せる不一致セルの最大数
+MAX_REPORTED = 10
+
+
+class VerificationError(Exception):
+    """本計算と独立計算の値が合わない、または値が上限を超えるセルがある"""
+
+
+def unit_specs(room_weight, groups):
+    """数える単位: [(単位名, 構成部屋のタプル, ウェイト, 同時使用の上限), ...]（ウェイト0は除く）"""
+    grouped = {room for group in groups for room in group.members}
+    specs = [(room, (room,), weight, 1) for room, weight in room_weight.items()
+             if weight and room not in grouped]
+    specs.extend((group.name, tuple(group.members), group.weight, group.cap)
+                 for group in groups if group.weight)
+    return specs
+
+
+def room_seconds(cases, overnight=False):
+    """(手術, ずらす分) の列から部屋ごとの使用区間（秒の半開区間 [開始, 終了)、和集合）を返す
+
+    手術の時刻は分で、入室の分の0秒から麻酔終了の分の59秒までを使用中とする（両端含む）。
+    overnight=True なら麻酔終了が入室より前の時刻の手術は翌日の麻酔終了までとする。
+    """
+    by_room = {}
+    for case, shift in cases:
+        end = case.end + DAY_MINUTES if overnight and crosses_midnight(case.start, case.end) else case.end
+        if case.start <= end:
+            by_room.setdefault(case.room, []).append(((case.start + shift) * 60, (end + shift + 1) * 60))
+    merged = {}
+    for room, spans in by_room.items():
+        out = []
+        for start, end in sorted(spans):
+            if out and start <= out[-1][1]:
+                out[-1][1] = max(out[-1][1], end)
+            else:
+                out.append([start, end])
+        merged[room] = out
+    return merged
+
+
+def step_function(rooms, specs):
+    """単位ごとの min(使用中の構成部屋数, 上限) × ウェイト を足した階段関数の変化点
+
+    戻り値: {単位名: {時刻(秒): 値の増減}}（単位ごとに分けて持ち、合計は呼び出し側で足す）
+    """
+    steps = {}
+    for name, members, weight, cap in specs:
+        events = {}
+        for room in members:
+            for start, end in rooms.get(room, ()):
+                events[start] = events.get(start, 0) + 1
+                events[end] = events.get(end, 0) - 1
+        unit_steps = {}
+        depth = level = 0
+        for t in sorted(events):
+            depth += events[t]
+            new_level = min(depth, cap)
+            if new_level != level:
+                unit_steps[t] = (new_level - level) * weight
+                level = new_level
+        steps[name] = unit_steps
+    return steps
+
+
+def window_averages(step_deltas, windows):
+    """階段関数（{時刻: 増減}）の各窓 [開始秒, 終了秒]（両端含む）の平均値"""
+    times = sorted(step_deltas)
+    # integral[i] = 0秒〜times[i] の積分、values[i] = times[i] 以降（次の変化点まで）の値
+    integral = []
+    values = []
+    area = value = 0.0
+    prev = 0
+    for t in times:
+        area += value * (t - prev)
+        value += step_deltas[t]
+        integral.append(area)
+        values.append(value)
+        prev = t
+
+    def integral_until(t):
+        i = bisect_right(times, t) - 1
+        if i < 0:
+            return 0.0
+        return integral[i] + values[i] * (t - times[i])
+
+    return [(integral_until(hi + 1) - integral_until(lo)) / (hi - lo + 1) for lo, hi in windows]
+
+
+def verify(sections, cases, room_weight, groups, grid, days, main_units=None, overnight=False,
+           exclude_weekdays=(), only_days=None, day_weekdays=None):
+    """全セクション・全日・全スナップショットを独立計算と照合する
+
+    sections: [(区分名, 区分のフィルタ（Case → bool）, {日idx: [本計算の値, ...]}), ...]
+    cases: 照合対象の手術（対象外の部屋は除いておく）。除外曜日の日は照合しないが、
+        overnight=True のときは除外曜日の手術が翌日にまたぐ分も数える
+    days: 日idx → 日付 のリスト（OccupancyCube.days）
+    main_units: (セクションの番号, 日idx) → {部屋: [本計算の値, ...]}。不一致のとき部屋を特定するのに使う
+    overnight: 日付をまたぐ手術を翌日分も数える（前日の手術も照合に加える）
+    only_days: 日idx の集合を渡すと、その日だけ照合する（watch モードで計算し直した日）
+    day_weekdays: 日idx → 曜日 のリスト（OccupancyCube.day_weekday）。overnight=True のとき、
+        前日から0:00をまたぐ分だけの日（その日の手術がない日）も本計算にあるべき日として照合する
+    戻り値: {"cells": 照合セル数, "max": (最大値, 日付, 時刻, 区分), "capacity": 上限}
+    不一致・上限超過があれば VerificationError。
+    """
+    specs = unit_specs(room_weight, groups)
+    capacity = sum(weight * min(cap, len(members)) for _, members, weight, cap in specs)
+    windows = grid.windows()
+    labels = grid.labels()
+    day_index = {d: di for di, d in enumerate(days)}
+
+    cases_by_day = {}
+    excluded_days = set()
+    for case in cases:
+        cases_by_day.setdefault(case.date, []).append(case)
+        if case.weekday in exclude_weekdays:
+            excluded_days.add(case.date)
+    # 日付をまたぐ手術: {日付: [前日の手術のうち0:00をまたぐもの]}
+    spill_by_day = {}
+    if overnight:
+        date_of = {day_ordinal(d): d for d in days}
+        for d, day_cases in cases_by_day.items():
+            next_day = date_of.get(day_ordinal(d) + 1)
+            if next_day is not None:
+                spill_by_day[next_day] = [c for c in day_cases if crosses_midnight(c.start, c.end)]
+
+    cells = 0
+    max_cell = (0.0, "", "", "")
+    errors = []
+    for index, (section, accept, matrix) in enumerate(sections):
+        expected_days = {day_index[d] for d, day_cases in cases_by_day.items()
+                         if d in day_index and d not in excluded_days and any(accept(c) for c in day_cases)}
+        if day_weekdays is not None:
+            expected_days.update(day_index[d] for d, spill in spill_by_day.items()
+                                 if d not in cases_by_day and day_weekdays[day_index[d]] not in exclude_weekdays
+                                 and any(accept(c) for c in spill))
+        if only_days is not None:
+            expected_days &= only_days
+        for di in sorted(expected_days - set(matrix), key=lambda i: days[i]):
+            errors.append(f"{days[di]} {section}: 本計算に日がありません")
+
+        for di, main_values in matrix.items():
+            if only_days is not None and di not in only_days:
+                continue
+            day_cases = [(c, 0) for c in cases_by_day.get(days[di], ()) if accept(c)]
+            day_cases.extend((c, -DAY_MINUTES) for c in spill_by_day.get(days[di], ()) if accept(c))
+            steps = step_function(room_seconds(day_cases, overnight), specs)
+            total = {}
+            for unit_steps in steps.values():
+                for t, delta in unit_steps.items():
+                    total[t] = total.get(t, 0.0) + delta
+            check_values = window_averages(total, windows)
+
+            bad = []
+            for si, (main, check) in enumerate(zip(main_values, check_values)):
+                cells += 1
+                if main > max_cell[0]:
+                    max_cell = (main, days[di], labels[si], section)
+                if abs(main - check) > TOLERANCE or main > capacity + TOLERANCE or main < -TOLERANCE:
+                    bad.append((si, main, check))
+            if not bad:
+                continue
+
+            # 不一致の部屋を特定する（本計算の部屋別の値と、独立計算の部屋別の値を比べる）
+            unit_main = main_units(index, di) if main_units else {}
+            unit_check = {name: window_averages(unit_steps, windows) for name, unit_steps in steps.items()}
+            for si, main, check in bad:
+                rooms = [name for name, vals in unit_check.items()
+                         if abs(unit_main.get(name, [0.0] * len(windows))[si] - vals[si]) > TOLERANCE]
+                detail = f" 部屋={','.join(rooms)}" if rooms else ""
+                errors.append(f"{days[di]} {labels[si]} {section}{detail}: "
+                              f"本計算={main:.6f} 照合={check:.6f} 上限={capacity}")
+
+    if errors:
+        shown = "\n  ".join(errors[:MAX_REPORTED])
+        more = f"\n  ほか {len(errors) - MAX_REPORTED} 件" if len(errors) > MAX_REPORTED else ""
+        raise VerificationError(f"全セル照合で {len(errors)} 件の不一致があります:\n  {shown}{more}")
+    return {"cells": cells, "max": max_cell, "capacity": capacity}
@@ -0,0 +1,281 @@
+"""
+CSV/TSV 元データ読み込み
+========================
+病院情報システムから書き出した手術記録の CSV/TSV を、元データシートに貼り付けずに直接読み込みます。
+1行ずつ読みながら source_data.CaseTable の列（コード化した日付・部屋・区分と分の時刻）に追加するので、
+xlsx の解析を通さず、読み込み時のメモリも列の配列の分だけで済みます。
+
+- 文字コード: "auto" なら UTF-8（BOM 付き・なし）か CP932（Shift_JIS の Windows 拡張）を判定する
+- 区切り文字: "auto" なら拡張子 .tsv はタブ、それ以外は1行目のタブとカンマの数で決める
+- 列の対応: 元データシートと同じ7項目を、CSV の見出し名または列番号（1始まり）で指定する。
+  手術実施管理番号・曜日の列はなくてもよい（曜日は手術実施日から求める）
+- 手術実施日は "2025/04/01"・"2025-04-01"・"20250401" を元データシートと同じ "2025/04/01" にそろえる。
+  入室時刻・麻酔終了時刻は "8:30"・"08:30:00"・"2025/04/01 8:30" を受け付ける（空欄は時刻なし）
+- 定義（対象手術室・ウェイト・除外曜日・時間グリッド・部屋グループ）は、取り込み設定の definition か、
+  なければ workbook（既定: CSV と同じフォルダの 時間帯別稼働推移元データ.xlsx）の定義シートから読む。
+  workbook は計算結果シート・グラフ表示シートを書き込む結果ブックのひな形にもなる
+- 解析結果は source_data と同じキャッシュに、CSV・取り込み設定・定義のブックの内容ハッシュをキーに保存する
+- stream_csv() は CaseTable を作らず、Case を1件ずつ渡す（日付順の流し込み集計用、キャッシュなし）
+
+取り込み設定ファイル（JSON、すべて省略可）:
+    {
+      "workbook": "時間帯別稼働推移元データ.xlsx",
+      "encoding": "auto",
+      "delimiter": "auto",
+      "columns": {"手術実施管理番号": "実施番号", "手術実施日": "実施日", "曜日": null,
+                  "実施手術室名": "手術室", "入室時刻": "入室", "麻酔終了時刻": "麻酔終了",
+                  "実施申込区分": "申込区分"},
+      "definition": {"rooms": {"01A": 1.0, "01B": 0, "02": 1.0}, "exclude_weekdays": ["土曜日", "日曜日"],
+                     "grid": {"開始": "8:00", "終了": "20:00", "間隔": 30, "窓長": 30},
+                     "room_groups": [{"name": "01", "members": ["01A", "01B"], "weight": 1.0, "cap": 1}]}
+    }
+columns で null にした項目、省略した項目は元データシートと同じ見出し名で探す（なければ空欄扱い）。
+"""
+
+import codecs
+import csv
+import datetime as dt
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import openpyxl
+
+from source_data import (DEFINITION_SHEET, MISSING_INTERVAL, Case, CaseTable, Definition, RoomGroup,
+                         file_digest, load_cached, read_definition, to_minutes)
+
+CSV_EXTENSIONS = (".csv", ".tsv", ".txt")
+
+# 定義シートを読む既定のブック（CSV と同じフォルダ）
+DEFAULT_WORKBOOK = "時間帯別稼働推移元データ.xlsx"
+
+# 元データシートの7項目（見出し名）。この順で CaseTable.append に渡す
+FIELDS = ("手術実施管理番号", "手術実施日", "曜日", "実施手術室名", "入室時刻", "麻酔終了時刻", "実施申込区分")
+OPTIONAL_FIELDS = ("手術実施管理番号", "曜日")
+
+WEEKDAY_NAMES = ("月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日")
+
+# 文字コード判定で一度に読むバイト数
+DETECT_CHUNK = 1 << 16
+
+# 取り込み設定。columns: {項目: 見出し名 or 列番号(1始まり)}、definition: 定義の dict（None なら workbook の定義シート）
+CsvImport = namedtuple("CsvImport", "workbook encoding delimiter columns definition",
+                       defaults=("auto", "auto", None, None))
+
+IMPORT_KEYS = {"workbook", "encoding", "delimiter", "columns", "definition", "description"}
+
+
+def is_csv(path):
+    """CSV/TSV として読むファイルか（拡張子で判断）"""
+    return os.path.splitext(path)[1].lower() in CSV_EXTENSIONS
+
+
+def default_import(path):
+    """取り込み設定を指定しないときの設定（定義は CSV と同じフォルダの元データブックの定義シート）"""
+    return CsvImport(os.path.join(os.path.dirname(os.path.abspath(path)), DEFAULT_WORKBOOK))
+
+
+def load_import_config(path):
+    """取り込み設定ファイル（JSON）を読み込む。workbook の相対パスは設定ファイルのフォルダから解決する"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    unknown = set(data) - IMPORT_KEYS
+    if unknown:
+        raise ValueError(f"取り込み設定に不明な項目があります: {sorted(unknown)}")
+    unknown = set(data.get("columns") or {}) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"取り込み設定の columns に不明な項目があります: {sorted(unknown)}（項目: {', '.join(FIELDS)}）")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    workbook = data.get("workbook") or DEFAULT_WORKBOOK
+    return CsvImport(
+        workbook if os.path.isabs(workbook) else os.path.join(base_dir, workbook),
+        data.get("encoding", "auto"),
+        data.get("delimiter", "auto"),
+        data.get("columns"),
+        data.get("definition"),
+    )
+
+
+def detect_encoding(path):
+    """UTF-8（BOM 付きは utf-8-sig）か CP932 かを判定する
+
+    先頭から読み、最初に ASCII 以外のバイトを含むかたまりが UTF-8 として読めれば UTF-8、
+    読めなければ CP932 とする（全体が ASCII なら UTF-8）。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        chunk = f.read(DETECT_CHUNK)
+        if chunk.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        while chunk:
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                return "cp932"
+            if not chunk.isascii():
+                return "utf-8"
+            chunk = f.read(DETECT_CHUNK)
+    return "utf-8"
+
+
+def detect_delimiter(path, first_line):
+    """区切り文字: .tsv はタブ、それ以外は1行目にタブがカンマより多ければタブ"""
+    if os.path.splitext(path)[1].lower() == ".tsv":
+        return "\t"
+    return "\t" if first_line.count("\t") > first_line.count(",") else ","
+
+
+def column_indexes(header, columns):
+    """各項目の列の位置（0始まり、ない任意項目は None）を FIELDS の順に返す"""
+    columns = columns or {}
+    names = [str(h).strip() for h in header]
+    indexes = []
+    for field in FIELDS:
+        spec = columns.get(field)
+        if isinstance(spec, int):
+            if spec < 1:
+                raise ValueError(f"取り込み設定の '{field}' の列番号は1以上にしてください: {spec}")
+            indexes.append(spec - 1)
+            continue
+        name = field if spec is None else str(spec).strip()
+        if name in names:
+            indexes.append(names.index(name))
+        elif field in OPTIONAL_FIELDS and spec is None:
+            indexes.append(None)
+        else:
+            raise ValueError(f"CSV に '{field}' の列（見出し '{name}'）がありません。見出し: {names}")
+    return indexes
+
+
+def parse_date(text):
+    """手術実施日を (元データシートと同じ "YYYY/MM/DD", 曜日) にする。解釈できなければ (そのまま, "")"""
+    value = text.split(" ")[0].replace("-", "/").replace(".", "/")
+    try:
+        if "/" in value:
+            y, m, d = (int(p) for p in value.split("/"))
+        elif len(value) == 8 and value.isdigit():
+            y, m, d = int(value[:4]), int(value[4:6]), int(value[6:])
+        else:
+            return text, ""
+        day = dt.date(y, m, d)
+    except ValueError:
+        return text, ""
+    return f"{day.year:04d}/{day.month:02d}/{day.day:02d}", WEEKDAY_NAMES[day.weekday()]
+
+
+def parse_clock(text):
+    """入室時刻・麻酔終了時刻を分にする（日付付きなら時刻の部分だけ見る）。空欄は None"""
+    if not text:
+        return None
+    return to_minutes(text.split(" ")[-1])
+
+
+def definition_from_dict(data):
+    """取り込み設定の definition（dict）から Definition を作る"""
+    room_weight_raw = {str(room): float(weight) for room, weight in (data.get("rooms") or {}).items()}
+    if not room_weight_raw:
+        raise ValueError("取り込み設定の definition に rooms（手術室: ウェイト）がありません")
+    room_groups = [RoomGroup(str(g["name"]), tuple(g["members"]), float(g.get("weight", 1.0)), int(g.get("cap", 1)))
+                   for g in data.get("room_groups") or ()]
+    return Definition(room_weight_raw, set(data.get("exclude_weekdays") or ()),
+                      dict(data.get("grid") or {}), room_groups)
+
+
+def read_import_definition(csv_import):
+    """取り込み設定の definition、なければ workbook の定義シートから Definition を読む"""
+    if csv_import.definition is not None:
+        return definition_from_dict(csv_import.definition)
+    wb = openpyxl.load_workbook(csv_import.workbook, read_only=True)
+    try:
+        return read_definition(wb[DEFINITION_SHEET].iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def iter_csv(path, csv_import):
+    """CSV/TSV を1行ずつ読み、Case の項目の並び（時刻は分）を1件ずつ返す
+
+    実施手術室名が空欄の行は読み飛ばす（元データシートと同じ）。
+    日付・時刻の文字列は種類が少ないので、一度解釈したものは覚えておいて使い回す。
+    """
+    encoding = detect_encoding(path) if csv_import.encoding == "auto" else csv_import.encoding
+    dates = {}
+    clocks = {}
+
+    def clock(text):
+        if text not in clocks:
+            clocks[text] = parse_clock(text)
+        return clocks[text]
+
+    with open(path, newline="", encoding=encoding) as f:
+        delimiter = csv_import.delimiter
+        if delimiter == "auto":
+            delimiter = detect_delimiter(path, f.readline())
+            f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        i_no, i_date, i_weekday, i_room, i_start, i_end, i_category = column_indexes(header, csv_import.columns)
+        last = max(i for i in (i_no, i_date, i_weekday, i_room, i_start, i_end, i_category) if i is not None)
+        for row in reader:
+            if len(row) <= last:
+                row = row + [""] * (last + 1 - len(row))
+            room = row[i_room].strip()
+            if not room:
+                continue
+            date_text = row[i_date].strip()
+            parsed = dates.get(date_text)
+            if parsed is None:
+                parsed = dates[date_text] = parse_date(date_text)
+            weekday = row[i_weekday].strip() if i_weekday is not None else parsed[1]
+            try:
+                start, end = clock(row[i_start].strip()), clock(row[i_end].strip())
+            except (ValueError, IndexError):
+                raise ValueError(f"{os.path.basename(path)} の {reader.line_num}行目: 時刻を解釈できません: "
+                                 f"{row[i_start]!r}, {row[i_end]!r}") from None
+            if start is None or end is None:
+                start, end = MISSING_INTERVAL
+            yield (
+                row[i_no].strip() if i_no is not None else "",
+                parsed[0],
+                weekday,
+                room,
+                start,
+                end,
+                row[i_category].strip(),
+            )
+
+
+def parse_csv(path, csv_import):
+    """CSV/TSV を1行ずつ読み、(Definition, CaseTable) を返す"""
+    definition = read_import_definition(csv_import)
+    table = CaseTable()
+    for fields in iter_csv(path, csv_import):
+        table.append(*fields)
+    return definition, table
+
+
+def stream_csv(path, csv_import=None):
+    """CSV/TSV の (Definition, Case を1件ずつ返すイテレータ)（日付順の流し込み集計用、キャッシュは使わない）"""
+    csv_import = csv_import or default_import(path)
+    return read_import_definition(csv_import), (Case(*fields) for fields in iter_csv(path, csv_import))
+
+
+def import_digest(path, csv_import):
+    """キャッシュのキー: CSV・取り込み設定・（定義を読む）ブックの内容ハッシュ"""
+    h = hashlib.sha256()
+    h.update(file_digest(path).encode())
+    h.update(repr(csv_import._replace(workbook=None)).encode())
+    if csv_import.definition is None:
+        h.update(file_digest(csv_import.workbook).encode())
+    return h.hexdigest()
+
+
+def load_csv(path, csv_import=None, use_cache=True):
+    """CSV/TSV から (Definition, CaseTable) を読み込む（csv_import を省略すると default_import(path)）"""
+    csv_import = csv_import or default_import(path)
+    if not use_cache:
+        return parse_csv(path, csv_import)
+    return load_cached(path, import_digest(path, csv_import), lambda p: parse_csv(p, csv_import))
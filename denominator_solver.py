@@ -0,0 +1,236 @@
+"""
+分母・使用合計の逆算ソルバー
+============================
+他ソフトが出した分母（例: 28,980）を「部屋数 × 評価点数 × 日数」に分解し、
+分解ごとに評価点の間隔（step）と開始時刻の全候補について使用合計を計算して、
+分母・使用合計（・稼働率）が一致または近い集計条件を列挙します。
+trial_estimate_other.py で手作業で行っていた因数分解と仮説計算を1コマンドにしたものです。
+
+- 部屋数は自由な値ではなく、部屋集合 × 対の部屋の扱い（merge）ごとに parameter_sweep.build_units の
+  単位から決まる値だけを使う: weight = 単位のウェイト合計、rooms = 数える単位の数
+  （例: 01A/01B を weighted で数えると weight 9・rooms 10、merged なら どちらも 9）
+- 部屋集合は --room-set で指定する。auto は「全部屋」「対の部屋を除く」「全部屋から1室除く」（各部屋）
+- 評価点数 n・step・開始時刻が決まると終了時刻は 開始 + n×step − 1 に決まる
+- 使用合計は parameter_sweep と同じ方法（和集合区間の評価点数え上げ）で計算する
+- 使用合計は元データの対象日で数える。--days に元データと異なる日数を指定した場合は
+  「他ソフトが数えた日数が違う」という仮説として分母だけに反映する
+
+使い方:
+    python denominator_solver.py --denom 28980 --usage 19347 [--rate 66.76]
+        [--room-set auto] [--room-count weight,rooms] [--days 20] [--step 1,3,5,10,15,30]
+        [--start 8:00-9:30] [--offset bin] [--merge weighted,merged,separate,01A_only] [--category all,定時]
+        [--denom-tolerance 0] [--usage-tolerance 0.5] [--top 30]
+"""
+
+import argparse
+import math
+import multiprocessing
+
+import parameter_sweep
+from parameter_sweep import format_time, parse_offset, parse_time
+
+DAY_END = 24 * 60 - 1
+ROOM_COUNT_RULES = ("weight", "rooms")
+
+
+def parse_range(text, parse=int):
+    """"1-20" / "8:00-9:30"（両端含む、1刻み）または "9,10" のカンマ区切り"""
+    values = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            values.extend(range(parse(lo), parse(hi) + 1))
+        else:
+            values.append(parse(part))
+    return sorted(set(values))
+
+
+def candidate_room_sets(room_weight, pairs, names):
+    """--room-set の指定を [(名前, (部屋, ...)), ...] にする（"auto" は全部屋・対の部屋を除く・1室除く）"""
+    expanded = []
+    for name in names:
+        if name != "auto":
+            expanded.append(name)
+            continue
+        paired = {room for pair in pairs for room in pair}
+        rooms = parameter_sweep.all_rooms(room_weight, pairs)
+        expanded.append("all")
+        if paired:
+            expanded.append("-" + "+".join(room for room in rooms if room in paired))
+        expanded.extend(f"-{room}" for room in rooms if room_weight.get(room) or room in paired)
+    return parameter_sweep.parse_room_sets(list(dict.fromkeys(expanded)), room_weight, pairs)
+
+
+def room_counts(room_sets, merges, pairs, room_weight, rules=ROOM_COUNT_RULES):
+    """部屋集合 × merge ごとに、数える単位から決まる部屋数を返す
+
+    戻り値: [(部屋集合名, 部屋集合, merge, 数え方, 部屋数), ...]
+    数え方 weight = 単位のウェイト合計、rooms = ウェイト > 0 の単位の数（同じ部屋数なら1つにまとめる）
+    数える単位がまったく同じになる組（-01B の merged と 01A_only など）は最初の組だけを残す。
+    """
+    counts = []
+    seen = set()
+    for room_set_name, room_set in room_sets:
+        for merge in merges:
+            units = [unit for unit in parameter_sweep.build_units(room_set, merge, pairs, room_weight)
+                     if unit[0] > 0]
+            key = tuple(sorted(units))
+            if not units or key in seen:
+                continue
+            seen.add(key)
+            by_count = {}
+            for rule in rules:
+                rooms = sum(weight for weight, _ in units) if rule == "weight" else len(units)
+                if rooms > 0:
+                    by_count.setdefault(rooms, []).append(rule)
+            for rooms, names in by_count.items():
+                counts.append((room_set_name, room_set, merge, "/".join(names), rooms))
+    return counts
+
+
+def decompositions(target_denom, counts, days_list, tolerance=0):
+    """|部屋数 × 評価点数 × 日数 − 目標分母| ≤ tolerance となる分解
+
+    counts: room_counts() の結果
+    戻り値: [(部屋集合名, 部屋集合, merge, 数え方, 部屋数, 評価点数, 日数, 分母), ...]
+    """
+    found = []
+    for days in days_list:
+        for room_set_name, room_set, merge, rule, rooms in counts:
+            per_point = rooms * days
+            if per_point <= 0:
+                continue
+            # 部屋数はウェイト合計（小数）のこともあるので、丸め誤差を見込んで点数の範囲を決める
+            lo = max(1, math.ceil((target_denom - tolerance) / per_point - 1e-9))
+            hi = math.floor((target_denom + tolerance) / per_point + 1e-9)
+            for points in range(lo, hi + 1):
+                found.append((room_set_name, room_set, merge, rule, rooms, points, days,
+                              rooms * points * days))
+    return found
+
+
+def solve(days, room_weight, pairs, decomps, steps, starts, offsets, categories, workers=None):
+    """分解ごとの時間条件を、その分解の部屋集合・merge だけで評価し、分母・使用合計・稼働率付きの結果行を返す"""
+    # 使用合計は日数によらないので、(部屋集合, merge) ごとに時間条件の重複を除いて1回だけ評価する
+    timing = {}
+    for room_set_name, room_set, merge, rule, rooms, points, num_days, denom in decomps:
+        combo = timing.setdefault((room_set_name, room_set, merge), {})
+        for step in steps:
+            for start in starts:
+                end = start + points * step - 1
+                if end <= DAY_END:
+                    for offset in offsets:
+                        combo[(start, end, step, offset)] = None
+    tasks = []
+    for category in categories:
+        for (room_set_name, room_set, merge), combo in timing.items():
+            tasks.extend(parameter_sweep.make_tasks(category, room_set_name, room_set, merge, pairs,
+                                                    room_weight, len(days), list(combo), ["weight"]))
+    by_timing = {}
+    for r in parameter_sweep.run_tasks(days, tasks, workers):
+        key = (r["room_set"], r["merge"], r["start"], r["end"], r["step"], r["offset"])
+        by_timing.setdefault(key, []).append(r)
+
+    results = []
+    for room_set_name, room_set, merge, rule, rooms, points, num_days, denom in decomps:
+        for step in steps:
+            for start in starts:
+                end = start + points * step - 1
+                for offset in offsets:
+                    for r in by_timing.get((room_set_name, merge, start, end, step, offset), ()):
+                        row = dict(r)
+                        row.update({"denominator": f"{rooms:g}室({rule})", "points": points,
+                                    "days": num_days, "denom": denom, "rate": r["usage"] / denom * 100})
+                        results.append(row)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="目標の分母・使用合計から集計条件を逆算します")
+    parser.add_argument("--input", default=parameter_sweep.INPUT_FILE, help="元データブック")
+    parser.add_argument("--denom", type=int, required=True, help="目標分母（例: 28980）")
+    parser.add_argument("--usage", type=float, default=None, help="目標使用合計（例: 19347）")
+    parser.add_argument("--rate", type=float, default=None, help="目標稼働率(%%)")
+    parser.add_argument("--room-set", default="auto",
+                        help="部屋集合 auto、all、02+03+...、または全部屋から除く -10（カンマ区切り）")
+    parser.add_argument("--room-count", default=",".join(ROOM_COUNT_RULES),
+                        help="部屋数の数え方 weight（ウェイト合計）/ rooms（単位の数）（カンマ区切り）")
+    parser.add_argument("--days", default=None, help="日数の候補（省略時は元データの対象日数）")
+    parser.add_argument("--step", default="1,3,5,10,15,30", help="評価点の間隔（分、カンマ区切り）")
+    parser.add_argument("--start", default="8:00-9:30", help="開始時刻の候補（1分刻みの範囲、またはカンマ区切り）")
+    parser.add_argument("--offset", default="bin", help="判定区間 bin または a:b（カンマ区切り）")
+    parser.add_argument("--merge", default=",".join(parameter_sweep.MERGE_MODES), help="対の部屋の扱い")
+    parser.add_argument("--category", default="all,定時", help="区分 all または 定時+臨時 など（カンマ区切り）")
+    parser.add_argument("--denom-tolerance", type=int, default=0, help="分母の許容差（既定: 0 = 完全一致のみ）")
+    parser.add_argument("--usage-tolerance", type=float, default=0.5, help="使用合計の許容差(%%)（既定: 0.5）")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（1で並列なし）")
+    parser.add_argument("--top", type=int, default=30, help="表示件数")
+    args = parser.parse_args(argv)
+
+    def split(text):
+        return [v.strip() for v in text.split(",") if v.strip()]
+
+    merges = split(args.merge)
+    for merge in merges:
+        if merge not in parameter_sweep.MERGE_MODES:
+            parser.error(f"不明な merge: {merge}（{', '.join(parameter_sweep.MERGE_MODES)}）")
+    rules = split(args.room_count)
+    for rule in rules:
+        if rule not in ROOM_COUNT_RULES:
+            parser.error(f"不明な部屋数の数え方: {rule}（{', '.join(ROOM_COUNT_RULES)}）")
+
+    definition, days = parameter_sweep.load_days(args.input)
+    room_weight = definition.room_weight_raw
+    pairs = [group.members for group in definition.room_groups]
+    days_list = parse_range(args.days) if args.days else [len(days)]
+    try:
+        room_sets = candidate_room_sets(room_weight, pairs, split(args.room_set))
+    except ValueError as e:
+        parser.error(str(e))
+
+    counts = room_counts(room_sets, merges, pairs, room_weight, rules)
+    decomps = decompositions(args.denom, counts, days_list, args.denom_tolerance)
+    print(f"入力ファイル: {args.input}")
+    print(f"対象日数（元データ）: {len(days)}")
+    print(f"部屋集合: {', '.join(name for name, _ in room_sets)}")
+    print(f"\n=== 分母 {args.denom:,} の分解（部屋数 × 評価点数 × 日数、許容差 {args.denom_tolerance}）===")
+    for room_set_name, _, merge, rule, rooms, points, num_days, denom in decomps:
+        print(f"  {room_set_name + '/' + merge:<20s} {rooms:5g}室 {'(' + rule + ')':<15s} × {points:5d}点 × {num_days:3d}日"
+              f" = {denom:,g}")
+    if not decomps:
+        print("  該当なし")
+        return
+
+    offsets = [parse_offset(v) for v in args.offset.split(",") if v.strip()]
+    results = solve(days, room_weight, pairs, decomps,
+                    parse_range(args.step), parse_range(args.start, parse_time), offsets,
+                    split(args.category), args.workers)
+    results = parameter_sweep.rank(results, args.rate, args.usage, args.denom)
+    print(f"\n評価した条件: {len(results)} 通り")
+
+    if args.usage is not None:
+        limit = abs(args.usage) * args.usage_tolerance / 100
+        matches = [r for r in results if abs(r["diff_usage"]) <= limit]
+        print(f"使用合計が目標 {args.usage:,.1f} の ±{args.usage_tolerance}% 以内: {len(matches)} 通り"
+              f"（完全一致 {sum(1 for r in matches if r['diff_usage'] == 0)} 通り）")
+        shown = matches[:args.top]
+    else:
+        shown = results[:args.top]
+
+    print(f"\n{'順位':>4s}  {'使用合計':>10s}  {'使用差':>8s}  {'分母':>8s}  {'稼働率':>8s}  条件")
+    print("-" * 110)
+    for i, r in enumerate(shown, 1):
+        diff_usage = f"{r['diff_usage']:+8.1f}" if r["diff_usage"] is not None else "       -"
+        mark = " ***" if r["diff_usage"] == 0 and r["diff_denom"] == 0 else ""
+        offset = "bin" if r["offset"] == "bin" else f"{r['offset'][0]:+d}/{r['offset'][1]:+d}"
+        print(f"{i:4d}  {r['usage']:10.1f}  {diff_usage}  {r['denom']:8,g}  {r['rate']:7.2f}%  "
+              f"{r['denominator']}×{r['points']}点×{r['days']}日 {r['category']}/{r['room_set']}/{r['merge']} "
+              f"{format_time(r['start'])}-{format_time(r['end'])} {r['step']}分 {offset}{mark}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,111 @@
+"""
+watch モードの差分再計算
+========================
+元データブックを保存し直すたびに全日を計算し直すと、履歴（日数）が長いほど待ち時間が伸びます。
+前回読み込んだ手術を手術実施管理番号ごとに覚えておき、新しい読み込み結果と比べて
+追加・削除・変更された手術の日付（変更前・変更後の両方）だけを「変わった日」とします。
+
+- 集計パスは日ごとのスナップショット値（と部屋別の値）を DayCache に預け、
+  変わっていない日は前回の値をそのまま使い、変わった日だけ占有タイムラインから計算し直す
+- 曜日別・全体の平均（日の値を足して割るだけ）と結果ブックの書き出しは毎回全体で行う
+- 定義シート（部屋・ウェイト・除外曜日・時間グリッド・部屋グループ）が変わったら全日を計算し直す
+- 日付をまたぐ手術を翌日分も数える集計（overnight=True）では、変わった日の翌日も計算し直す
+- 管理番号が空欄・重複の手術も、同じ管理番号の手術の組として比べるので取りこぼさない
+"""
+
+from occupancy import day_ordinal, next_day
+
+
+def cases_by_mgmt_no(records):
+    """手術を管理番号ごとにまとめる: {管理番号: (Case, ...)}（組の中は並べ替えて比べられるようにする）"""
+    groups = {}
+    for record in records:
+        groups.setdefault(record.mgmt_no, []).append(record)
+    return {mgmt_no: tuple(sorted(cases)) for mgmt_no, cases in groups.items()}
+
+
+def diff_cases(old, new):
+    """管理番号ごとの手術の組を比べる
+
+    戻り値: (追加件数, 削除件数, 変更件数, 変わった日付の集合)
+    変更は同じ管理番号の組の中身が変わったもので、変更前・変更後の日付をどちらも含める。
+    """
+    added = removed = modified = 0
+    dates = set()
+    for mgmt_no in old.keys() | new.keys():
+        before = old.get(mgmt_no, ())
+        after = new.get(mgmt_no, ())
+        if before == after:
+            continue
+        if not before:
+            added += len(after)
+        elif not after:
+            removed += len(before)
+        else:
+            modified += 1
+        dates.update(case.date for case in before)
+        dates.update(case.date for case in after)
+    return added, removed, modified, dates
+
+
+def definition_key(definition):
+    """定義シートの設定の比較用の値（変われば全日を計算し直す）"""
+    return repr((definition.room_weight_raw, sorted(definition.exclude_weekdays),
+                 sorted(definition.grid_settings.items()), definition.room_groups))
+
+
+class DayCache:
+    """集計構成・区分ごとの日別のスナップショット値を、元データの読み込みをまたいで覚えておく"""
+
+    def __init__(self):
+        self.values = {}       # {(構成名, セクション, 日付): ([val, ...], {部屋: [val, ...]} または None)}
+        self.changed = None    # 今回計算し直す日付の集合（None なら全日）
+        self.recomputed = 0    # 今回計算した（キャッシュになかった）日・区分の数
+        self.reused = 0        # 今回前回の値を使った日・区分の数
+        self._cases = None     # 前回の {管理番号: (Case, ...)}
+        self._definition = None
+
+    def update(self, definition, records, overnight=False):
+        """新しい読み込み結果を前回と比べ、計算し直す日（changed）を決める
+
+        戻り値: (追加件数, 削除件数, 変更件数, 変わった日付の集合)。初回・定義シートの変更時は None。
+        """
+        cases = cases_by_mgmt_no(records)
+        key = definition_key(definition)
+        diff = None
+        if self._cases is None or key != self._definition:
+            self.values.clear()
+            self.changed = None
+        else:
+            diff = diff_cases(self._cases, cases)
+            self.changed = set(diff[3])
+            if overnight and self.changed:
+                # 0:00 をまたぐ手術は翌日の値にも入るので、翌日も計算し直す
+                # （翌日に手術がなくても、またぐ分だけの日がある: occupancy.EpochOccupancy）
+                date_of = {day_ordinal(case.date): case.date for case in records}
+                self.changed.update(date_of.get(day_ordinal(d) + 1) or next_day(d) for d in diff[3])
+        self._cases = cases
+        self._definition = key
+        self.recomputed = self.reused = 0
+        return diff
+
+    def reset(self):
+        """覚えている値をすべて捨てる（計算・保存が途中で失敗したとき。次回は全日を計算する）"""
+        self.values.clear()
+        self.changed = None
+        self._cases = None
+        self._definition = None
+
+    def get(self, section, date, with_units=False):
+        """前回の値 (値, 部屋別の値) をそのまま使えればそれを、計算し直す日なら None を返す"""
+        if self.changed is None or date in self.changed:
+            return None
+        entry = self.values.get((*section, date))
+        if entry is None or (with_units and entry[1] is None):
+            return None
+        self.reused += 1
+        return entry
+
+    def put(self, section, date, values, units=None):
+        self.values[(*section, date)] = (values, units)
+        self.recomputed += 1
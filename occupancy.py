@@ -0,0 +1,748 @@
+"""
+手術室 占有タイムライン
+======================
+日別・部屋別の使用区間から1分単位のタイムラインを1回だけ構築し、
+任意の集計区間のウェイト付き使用室数合計を累積和からO(1)で返します。
+
+- 同一部屋で重なる手術は区間の和集合にまとめる（部屋ごとの上限1回）
+- 部屋グループ（01A+01B など）は構成部屋の区間を重ね合わせ、同時使用数が上限までの
+  区間（1室目・2室目…）に変換してからタイムラインに加える（1分毎の集合は作らない）
+- 差分配列で1分毎の使用室数（ウェイト合計）を求め、その累積和を保持する
+- 使用中判定は v4.0 と同じく「入室時刻 ≤ サンプル時刻 ≤ 麻酔終了時刻」（両端含む）
+- 評価時刻の並びと集計区間（開始・終了・間隔・窓長・窓の基準）は TimeGrid で指定する。
+  集計は累積和の引き算なので、間隔を1分・3分・秒単位に変えても出力数分の手間しか増えない
+"""
+
+import datetime as dt
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+DAY_MINUTES = 24 * 60
+DAY_SECONDS = DAY_MINUTES * 60
+WEEKDAY_NAMES = ("月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日")
+
+
+def merge_intervals(intervals):
+    """閉区間 (開始分, 終了分) のリストを和集合にし、昇順・重なりなしのリストで返す
+
+    開始 > 終了 の区間は v4.0 と同じくどの時刻にも該当しないため除外する。
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if start > end:
+            continue
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+class DayTimeline:
+    """1日分の部屋別使用区間と、ウェイト付き使用室数の累積和"""
+
+    __slots__ = ("room_intervals", "prefix")
+
+    def __init__(self, room_intervals, room_weight):
+        # 部屋ごとの和集合（同一分に複数手術があっても1室）
+        self.room_intervals = {room: merge_intervals(ivs) for room, ivs in room_intervals.items()}
+
+        # 差分配列 → 1分毎の使用室数 → 累積和
+        diff = [0.0] * (DAY_MINUTES + 1)
+        for room, ivs in self.room_intervals.items():
+            weight = room_weight.get(room, 0.0)
+            if not weight:
+                continue
+            for start, end in ivs:
+                start = max(start, 0)
+                end = min(end, DAY_MINUTES - 1)
+                if start > end:
+                    continue
+                diff[start] += weight
+                diff[end + 1] -= weight
+        occupancy = accumulate(diff[:DAY_MINUTES])
+        self.prefix = list(accumulate(occupancy, initial=0.0))
+
+    def window_sum(self, start, end):
+        """区間 [start, end]（両端含む、分）の1分毎使用室数の合計"""
+        start = max(start, 0)
+        end = min(end, DAY_MINUTES - 1)
+        if start > end:
+            return 0.0
+        return self.prefix[end + 1] - self.prefix[start]
+
+    def window_average(self, start, end):
+        """区間 [start, end] の1分サンプル平均使用室数"""
+        return self.window_sum(start, end) / (end - start + 1)
+
+    def seconds_before(self, second):
+        """0秒〜second-1秒 の1秒毎使用室数の合計（各分の使用室数はその分の60秒間一定）"""
+        minute, rest = divmod(min(max(second, 0), DAY_SECONDS), 60)
+        total = self.prefix[minute] * 60
+        if rest:
+            total += (self.prefix[minute + 1] - self.prefix[minute]) * rest
+        return total
+
+    def window_average_seconds(self, start, end):
+        """区間 [start, end]（両端含む、秒）の1秒サンプル平均使用室数
+
+        分の境界にそろった区間は window_average と同じ値（同じ計算）を返す。
+        """
+        if start % 60 == 0 and (end + 1) % 60 == 0:
+            return self.window_average(start // 60, end // 60)
+        return (self.seconds_before(end + 1) - self.seconds_before(start)) / (end - start + 1)
+
+
+class CoverageIndex:
+    """1部屋分の使用区間の和集合と、使用分数の累積
+
+    任意の区間 [lo, hi] のうち使用中の分数を二分探索で O(log n) で返す。
+    同じ部屋で重なる手術や、入替で同じ1分を共有する前後の手術も、和集合なので1回だけ数える。
+    """
+
+    __slots__ = ("starts", "ends", "cumulative")
+
+    def __init__(self, intervals):
+        merged = merge_intervals(intervals)
+        self.starts = [s for s, _ in merged]
+        self.ends = [e for _, e in merged]
+        # cumulative[i] = 先頭 i 個の和集合区間の分数合計
+        self.cumulative = list(accumulate((e - s + 1 for s, e in merged), initial=0))
+
+    def covered_until(self, t):
+        """t 分以前（t を含む）の使用分数"""
+        i = bisect_right(self.starts, t)
+        if i == 0:
+            return 0
+        return self.cumulative[i - 1] + min(self.ends[i - 1], t) - self.starts[i - 1] + 1
+
+    def covered_minutes(self, lo, hi):
+        """区間 [lo, hi]（両端含む）のうち使用中の分数"""
+        if lo > hi:
+            return 0
+        return self.covered_until(hi) - self.covered_until(lo - 1)
+
+    def covered_seconds(self, lo, hi):
+        """区間 [lo, hi]（両端含む、秒）のうち使用中の秒数（各分は60秒間使用中とみなす）"""
+        if lo > hi:
+            return 0
+        return self._covered_seconds_before(hi + 1) - self._covered_seconds_before(lo)
+
+    def _covered_seconds_before(self, second):
+        minute, rest = divmod(second, 60)
+        total = self.covered_until(minute - 1) * 60
+        if rest and self.covered_minutes(minute, minute):
+            total += rest
+        return total
+
+
+def parse_clock(value):
+    """時刻を0時からの秒に変換（"8:00" / "8:00:30" / time / 分の数値）"""
+    if isinstance(value, dt.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, (int, float)):
+        return int(round(value * 60))
+    parts = str(value).strip().split(":")
+    if len(parts) == 1:
+        return int(parts[0]) * 60
+    if len(parts) > 3:
+        raise ValueError(f"時刻の形式が不正です: {value}")
+    h, m, sec = (int(p) for p in parts + ["0"] * (3 - len(parts)))
+    return h * 3600 + m * 60 + sec
+
+
+def parse_duration(value):
+    """長さを秒に変換（"30" / "30分" / "30m" は分、"20秒" / "20s" は秒、time は時:分:秒）"""
+    if isinstance(value, dt.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, (int, float)):
+        return int(round(value * 60))
+    text = str(value).strip()
+    for suffix, unit in (("秒", 1), ("s", 1), ("分", 60), ("m", 60)):
+        if text.endswith(suffix):
+            return int(round(float(text[:-len(suffix)]) * unit))
+    return int(round(float(text) * 60))
+
+
+def format_clock(seconds):
+    """秒を "8:00"（秒があれば "8:00:30"）にする"""
+    h, rest = divmod(seconds, 3600)
+    m, sec = divmod(rest, 60)
+    return f"{h}:{m:02d}:{sec:02d}" if sec else f"{h}:{m:02d}"
+
+
+def format_duration(seconds):
+    """秒を "30分" / "20秒" にする"""
+    return f"{seconds // 60}分" if seconds % 60 == 0 else f"{seconds}秒"
+
+
+class TimeGrid:
+    """評価時刻の並びと、各評価時刻の集計区間（窓）
+
+    評価時刻は start, start+step, ... で end 以下のもの（end は最後の評価時刻になり得る上限）。
+    各評価時刻 t の窓は長さ window の閉区間で、anchor で t との位置関係を決める:
+      "start"  [t, t+window-1]（v4.0 のスナップショット: +0〜+29分）
+      "center" [t-window//2, t-window//2+window-1]
+      "end"    [t-window+1, t]
+      整数      [t+anchor, t+anchor+window-1]（秒、例: -14分なら -840）
+    値はすべて秒で保持する。分単位の設定は minutes() で作る。
+    """
+
+    ANCHORS = ("start", "center", "end")
+    ANCHOR_NAMES = {"開始": "start", "中央": "center", "終了": "end"}
+
+    def __init__(self, start, end, step, window, anchor="start"):
+        if step <= 0 or window <= 0:
+            raise ValueError(f"間隔と窓長は正の値にしてください（間隔={step}秒, 窓長={window}秒）")
+        if end < start:
+            raise ValueError(f"終了時刻が開始時刻より前です（{format_clock(start)}-{format_clock(end)}）")
+        if not isinstance(anchor, int) and anchor not in self.ANCHORS:
+            raise ValueError(f"窓の基準は {', '.join(self.ANCHORS)} または秒数です: {anchor}")
+        self.start = start
+        self.end = end
+        self.step = step
+        self.window = window
+        self.anchor = anchor
+
+    @classmethod
+    def minutes(cls, start, end, step, window, anchor="start"):
+        """分単位の設定から作る（anchor が整数なら分）"""
+        if isinstance(anchor, int):
+            anchor *= 60
+        return cls(start * 60, end * 60, step * 60, window * 60, anchor)
+
+    @classmethod
+    def parse(cls, spec):
+        """"開始-終了/間隔/窓長[/基準]" 形式の文字列から作る
+
+        例: "8:00-20:00/30/30"、"9:00-16:57/3/3"、"9:00-9:59/20s/20s/center"、"8:00-20:00/30/30/-14"
+        間隔・窓長は分（"20s" / "20秒" で秒）。基準は start / center / end（開始 / 中央 / 終了）
+        または窓の開始位置の分数。
+        """
+        parts = [p.strip() for p in spec.split("/")]
+        if len(parts) not in (3, 4) or "-" not in parts[0]:
+            raise ValueError(f"時間グリッドの形式が不正です（開始-終了/間隔/窓長[/基準]）: {spec}")
+        start, end = parts[0].split("-", 1)
+        anchor = parts[3] if len(parts) == 4 else "start"
+        return cls(parse_clock(start), parse_clock(end), parse_duration(parts[1]),
+                   parse_duration(parts[2]), cls.parse_anchor(anchor))
+
+    @classmethod
+    def parse_anchor(cls, value):
+        if isinstance(value, (int, float)):
+            return parse_duration(value)
+        text = str(value).strip()
+        text = cls.ANCHOR_NAMES.get(text, text)
+        if text in cls.ANCHORS:
+            return text
+        return parse_duration(text)
+
+    @classmethod
+    def from_settings(cls, settings, default):
+        """定義シートの {"開始", "終了", "間隔", "窓長", "基準"} で default の一部または全部を上書きする"""
+        if not settings:
+            return default
+        try:
+            return cls(
+                parse_clock(settings["開始"]) if "開始" in settings else default.start,
+                parse_clock(settings["終了"]) if "終了" in settings else default.end,
+                parse_duration(settings["間隔"]) if "間隔" in settings else default.step,
+                parse_duration(settings["窓長"]) if "窓長" in settings else default.window,
+                cls.parse_anchor(settings["基準"]) if "基準" in settings else default.anchor,
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"定義シートの時間グリッド設定が不正です: {settings} ({e})") from None
+
+    def points(self):
+        """評価時刻（秒）のリスト"""
+        return list(range(self.start, self.end + 1, self.step))
+
+    def offset(self):
+        """評価時刻から窓の開始までのずれ（秒）"""
+        if self.anchor == "start":
+            return 0
+        if self.anchor == "center":
+            return -(self.window // 2)
+        if self.anchor == "end":
+            return -(self.window - 1)
+        return self.anchor
+
+    def windows(self):
+        """各評価時刻の窓 (開始秒, 終了秒)（両端含む）"""
+        offset = self.offset()
+        return [(t + offset, t + offset + self.window - 1) for t in self.points()]
+
+    def is_minute_aligned(self):
+        """すべての窓が分の境界にそろっているか（分単位の集計で足りるか）"""
+        return self.start % 60 == 0 and self.step % 60 == 0 and self.window % 60 == 0 \
+            and self.offset() % 60 == 0
+
+    def minute_windows(self):
+        """各評価時刻の窓 (開始分, 終了分)（分単位のグリッドのみ）"""
+        if not self.is_minute_aligned():
+            raise ValueError(f"秒単位の時間グリッドは分単位の集計に使えません: {self.describe()}")
+        return [(lo // 60, (hi + 1) // 60 - 1) for lo, hi in self.windows()]
+
+    def span_minutes(self):
+        """全窓を含む分の範囲 (最初の分, 最後の分)（0:00〜23:59 に切り詰める）"""
+        windows = self.windows()
+        return max(windows[0][0] // 60, 0), min(windows[-1][1] // 60, DAY_MINUTES - 1)
+
+    def labels(self):
+        return [format_clock(t) for t in self.points()]
+
+    def averages(self, timeline):
+        """DayTimeline から各窓の平均使用室数を返す"""
+        return [timeline.window_average_seconds(lo, hi) for lo, hi in self.windows()]
+
+    def unit_averages(self, timeline, unit_weight):
+        """DayTimeline の単位（部屋・部屋グループ）ごとの各窓の平均使用室数: {単位名: [平均, ...]}
+
+        部屋グループの k 室目（(グループ名, k)）はグループ名にまとめる。
+        全単位の合計は averages() と同じ値（浮動小数の丸め誤差を除く）。
+        """
+        windows = self.windows()
+        result = {}
+        for unit, intervals in timeline.room_intervals.items():
+            weight = unit_weight.get(unit, 0.0)
+            if not weight or not intervals:
+                continue
+            coverage = CoverageIndex(intervals)
+            values = result.setdefault(unit_name(unit), [0.0] * len(windows))
+            for i, (lo, hi) in enumerate(windows):
+                values[i] += weight * coverage.covered_seconds(lo, hi) / (hi - lo + 1)
+        return result
+
+    def describe(self):
+        anchor = self.anchor if not isinstance(self.anchor, int) else format_duration(self.anchor)
+        return (f"{format_clock(self.start)}-{format_clock(self.end)} 間隔{format_duration(self.step)} "
+                f"窓長{format_duration(self.window)} 基準{anchor}（{len(self.points())}点）")
+
+
+def depth_levels(interval_lists, cap):
+    """複数部屋の区間リストを重ね、同時に k 室以上使用中の区間を k = 1〜cap について返す
+
+    各部屋の区間は部屋ごとに和集合にしてから重ねる（同じ部屋の重複は1室）。
+    levels[0] は構成部屋の和集合（どれかが使用中）、levels[k-1] は k 室以上使用中の区間。
+    """
+    events = {}
+    for intervals in interval_lists:
+        for start, end in merge_intervals(intervals):
+            events[start] = events.get(start, 0) + 1
+            events[end + 1] = events.get(end + 1, 0) - 1
+    levels = [[] for _ in range(cap)]
+    open_since = [None] * cap
+    depth = 0
+    for t in sorted(events):
+        new_depth = depth + events[t]
+        for k in range(min(depth, new_depth), min(max(depth, new_depth), cap)):
+            if new_depth > depth:
+                open_since[k] = t
+            else:
+                levels[k].append((open_since[k], t - 1))
+        depth = new_depth
+    return levels
+
+
+def group_intervals(room_intervals, room_weight, groups):
+    """部屋別の区間を、数える単位（部屋または部屋グループの k 室目）別の区間とウェイトに変換する
+
+    groups: [RoomGroup(name, members, weight, cap), ...]（source_data.Definition.room_groups）
+    グループの構成部屋は room_weight にあっても単独では数えない。
+    戻り値: ({単位: [(開始, 終了), ...]}, {単位: ウェイト})
+    """
+    grouped = {room for group in groups for room in group.members}
+    unit_intervals = {room: ivs for room, ivs in room_intervals.items() if room not in grouped}
+    unit_weight = {room: w for room, w in room_weight.items() if room not in grouped}
+    for group in groups:
+        members = [room_intervals[room] for room in group.members if room in room_intervals]
+        if group.cap == 1:
+            unit_intervals[group.name] = [iv for ivs in members for iv in ivs]
+            unit_weight[group.name] = group.weight
+            continue
+        for k, intervals in enumerate(depth_levels(members, group.cap), 1):
+            unit_intervals[(group.name, k)] = intervals
+            unit_weight[(group.name, k)] = group.weight
+    return unit_intervals, unit_weight
+
+
+def unit_name(unit):
+    """group_intervals の単位の表示名（部屋グループの k 室目はグループ名）"""
+    return unit[0] if isinstance(unit, tuple) else unit
+
+
+def unit_names(room_weight, groups):
+    """数える単位（ウェイト > 0 の部屋・部屋グループ）の表示名を定義順に返す
+
+    部屋グループは最初の構成部屋の位置に置く（room_weight にない構成部屋だけのグループは末尾）。
+    """
+    group_of = {room: group for group in groups for room in group.members}
+    names = {}
+    for room, weight in room_weight.items():
+        group = group_of.get(room)
+        if group is None:
+            if weight:
+                names[room] = None
+        elif group.weight:
+            names[group.name] = None
+    for group in groups:
+        if group.weight:
+            names[group.name] = None
+    return list(names)
+
+
+def group_usage(used_rooms, room_weight, groups):
+    """ある時刻に使用中の部屋の集合から、部屋グループを考慮した使用室数（ウェイト合計）を返す"""
+    grouped = {room for group in groups for room in group.members}
+    total = sum(room_weight.get(room, 0.0) for room in used_rooms if room not in grouped)
+    for group in groups:
+        in_use = sum(1 for room in group.members if room in used_rooms)
+        total += min(in_use, group.cap) * group.weight
+    return total
+
+
+def weight_capacity(room_weight, groups):
+    """全単位が使用中のときの使用室数（ウェイト合計の上限）"""
+    grouped = {room for group in groups for room in group.members}
+    return (sum(w for room, w in room_weight.items() if room not in grouped)
+            + sum(group.weight * min(group.cap, len(group.members)) for group in groups))
+
+
+def build_day_timelines(cases, room_weight):
+    """(日付, 部屋, 開始分, 終了分) の列から {日付: DayTimeline} を構築する
+
+    日付の並びは最初に出現した順（v4.0 の日別ループと同じ順序）を保つ。
+    """
+    by_day = {}
+    for day, room, start, end in cases:
+        by_day.setdefault(day, {}).setdefault(room, []).append((start, end))
+    return {day: DayTimeline(rooms, room_weight) for day, rooms in by_day.items()}
+
+
+def fractional_utilization(cases, grid, room_weight):
+    """使用分数ベースの日平均使用室数（grid の評価時刻ごと）
+
+    cases: (日付, 部屋, 開始分, 終了分) の列。日数は cases に現れる日付の数
+    room_weight: {部屋: ウェイト}。ここにない部屋は数えない
+    各部屋の窓内の使用時間 / 窓の長さ × ウェイト を合計し、日数で割る。使用時間は部屋ごとの
+    区間の和集合（CoverageIndex）から二分探索で求めるので、入替で同じ1分を共有する前後の手術や
+    重なる手術を二重に数えず、窓の長さを超えることもない。
+    """
+    by_day = {}
+    for day, room, start, end in cases:
+        rooms = by_day.setdefault(day, {})
+        if room in room_weight:
+            rooms.setdefault(room, []).append((start, end))
+
+    windows = grid.windows()
+    totals = [0.0] * len(windows)
+    for room_intervals in by_day.values():
+        coverage = {room: CoverageIndex(ivs) for room, ivs in room_intervals.items()}
+        for si, (lo, hi) in enumerate(windows):
+            length = hi - lo + 1
+            day_usage = 0.0
+            for room, cov in coverage.items():
+                day_usage += (cov.covered_seconds(lo, hi) / length) * room_weight[room]
+            totals[si] += day_usage
+    return [t / len(by_day) for t in totals] if by_day else totals
+
+
+def split_group_weights(room_weight, groups):
+    """部屋グループの構成部屋に、グループのウェイトを等分して割り当てる（01A+01B を各0.5 など）
+
+    グループに入っていない部屋は room_weight のウェイトのまま（ウェイト0の部屋は除く）。
+    """
+    grouped = {room for group in groups for room in group.members}
+    weights = {room: w for room, w in room_weight.items() if room not in grouped and w}
+    for group in groups:
+        for room in group.members:
+            weights[room] = group.weight / len(group.members)
+    return weights
+
+
+def mask_runs(mask):
+    """ビット列の連続した1の並びを (開始ビット, 終了ビット) のリストで昇順に返す"""
+    runs = []
+    while mask:
+        low = mask & -mask
+        start = low.bit_length() - 1
+        # 最下位の1の並びに low を足すと、並びが0になり直後のビットに繰り上がる
+        filled = mask + low
+        end = (filled & -filled).bit_length() - 2
+        runs.append((start, end))
+        mask &= filled
+    return runs
+
+
+class OccupancyCube:
+    """日 × 部屋 × 分（× 実施申込区分）の使用有無を保持する占有キューブ
+
+    (日, 部屋, 区分) ごとに、分軸 [start_min, end_min] の使用有無を
+    Python 整数のビット列（1分 = 1ビット）で保持する。750分でも1本100バイト程度のため、
+    複数年分でもメモリは有界。元データは build() で1回だけ走査し、以降の全集計は
+    日・区分の選択と、選択した区分の和集合から作る DayTimeline の区間集計で求める。
+    件数は (部屋, 区分) ごとに数えるので、日の選択と件数は部屋の選択（rooms）でも絞れる。
+    日付をまたぐ手術（麻酔終了 < 入室）は数えない（EpochOccupancy を参照）。
+    """
+
+    overnight = False  # 日付をまたぐ手術を翌日分も数えるか
+
+    def __init__(self, start_min, end_min):
+        self.start_min = start_min
+        self.end_min = end_min
+        self.days = []          # 日付（初出順）
+        self.day_weekday = []   # 各日の曜日
+        self.categories = []    # 実施申込区分（初出順）
+        self.masks = []         # 日ごとの {(部屋, 区分idx): ビット列}
+        self.case_counts = []   # 日ごとの {(部屋, 区分idx): 件数}
+        self._day_index = {}
+        self._category_index = {}
+
+    @classmethod
+    def build(cls, cases, start_min, end_min):
+        """(日付, 曜日, 部屋, 区分, 開始分, 終了分) の列から1パスで構築する"""
+        cube = cls(start_min, end_min)
+        for case in cases:
+            cube.add(*case)
+        return cube
+
+    def _day(self, day, weekday):
+        """日付の日idx を返す（初出の日付なら日を加える）"""
+        di = self._day_index.get(day)
+        if di is None:
+            di = self._day_index[day] = len(self.days)
+            self.days.append(day)
+            self.day_weekday.append(weekday)
+            self.masks.append({})
+            self.case_counts.append({})
+        return di
+
+    def day_index(self, day):
+        """日付の日idx（キューブにない日付なら None）"""
+        return self._day_index.get(day)
+
+    def _register(self, day, weekday, room, category):
+        """手術1件を日・部屋・区分の件数に数え、(日idx, 区分idx) を返す"""
+        di = self._day(day, weekday)
+        ci = self._category_index.get(category)
+        if ci is None:
+            ci = self._category_index[category] = len(self.categories)
+            self.categories.append(category)
+
+        counts = self.case_counts[di]
+        counts[room, ci] = counts.get((room, ci), 0) + 1
+        return di, ci
+
+    def add(self, day, weekday, room, category, start, end):
+        """手術1件を追加する（区間外・開始 > 終了 の手術も件数には数える）"""
+        di, ci = self._register(day, weekday, room, category)
+
+        start = max(start, self.start_min)
+        end = min(end, self.end_min)
+        if start > end:
+            return
+        bits = ((1 << (end - start + 1)) - 1) << (start - self.start_min)
+        day_masks = self.masks[di]
+        key = (room, ci)
+        day_masks[key] = day_masks.get(key, 0) | bits
+
+    def release(self, di):
+        """指定日の使用区間を捨てる（日付順に1日ずつ流し込む集計用。日付・曜日・件数は残す）"""
+        self.masks[di] = None
+
+    def _category_set(self, categories):
+        if categories is None:
+            return set(range(len(self.categories)))
+        return {self._category_index[c] for c in categories if c in self._category_index}
+
+    def _selector(self, categories, rooms):
+        """(部屋, 区分idx) が区分・部屋の選択（None は全部）に入るかの判定"""
+        cis = self._category_set(categories)
+        if rooms is None:
+            return lambda key: key[1] in cis
+        rooms = set(rooms)
+        return lambda key: key[1] in cis and key[0] in rooms
+
+    def _day_keys(self, di):
+        """指定日を集計の対象にする (部屋, 区分idx)（その日に手術がある部屋・区分）"""
+        return self.case_counts[di]
+
+    def counts_day(self, di, categories=None, rooms=None):
+        """指定日が区分・部屋の選択で集計の対象になるか（select_days の1日分）"""
+        selected = self._selector(categories, rooms)
+        return any(selected(key) for key in self._day_keys(di))
+
+    def select_days(self, categories=None, weekdays=None, exclude_weekdays=(), rooms=None):
+        """条件に合う手術（rooms を渡せばその部屋の手術）が1件以上ある日のインデックスを初出順で返す"""
+        selected = self._selector(categories, rooms)
+        days = []
+        for di, weekday in enumerate(self.day_weekday):
+            if weekdays is not None and weekday not in weekdays:
+                continue
+            if weekday in exclude_weekdays:
+                continue
+            if any(selected(key) for key in self._day_keys(di)):
+                days.append(di)
+        return days
+
+    def case_count(self, day_indices, categories=None, rooms=None):
+        """選択した日・区分（rooms を渡せばその部屋）の手術件数"""
+        selected = self._selector(categories, rooms)
+        return sum(n for di in day_indices for key, n in self.case_counts[di].items() if selected(key))
+
+    def room_masks(self, di, categories=None):
+        """指定日の部屋別ビット列（選択した区分の和集合）"""
+        cis = self._category_set(categories)
+        rooms = {}
+        for (room, ci), mask in self.masks[di].items():
+            if ci in cis:
+                rooms[room] = rooms.get(room, 0) | mask
+        return rooms
+
+    def unit_intervals(self, di, room_weight, categories=None, groups=()):
+        """指定日・選択区分の数える単位別の区間とウェイト（group_intervals と同じ形式）"""
+        room_intervals = {
+            room: [(self.start_min + s, self.start_min + e) for s, e in mask_runs(mask)]
+            for room, mask in self.room_masks(di, categories).items()
+        }
+        if groups:
+            return group_intervals(room_intervals, room_weight, groups)
+        return room_intervals, room_weight
+
+    def timeline(self, di, room_weight, categories=None, groups=()):
+        """指定日・選択区分の DayTimeline を返す（groups: 部屋グループは和集合・上限で数える）"""
+        return DayTimeline(*self.unit_intervals(di, room_weight, categories, groups))
+
+
+def day_ordinal(day):
+    """日付の文字列（"2025/09/01"、"2025-09-01"、"2025-09-01 00:00:00"）の通日（date.toordinal）"""
+    text = str(day).strip().split(" ")[0].replace("-", "/")
+    try:
+        y, m, d = (int(p) for p in text.split("/"))
+        return dt.date(y, m, d).toordinal()
+    except ValueError:
+        raise ValueError(f"日付を解釈できません: {day}") from None
+
+
+def next_day(day):
+    """日付の文字列（day_ordinal と同じ書式）の翌日を、同じ区切り・0埋め・時刻部分の文字列で返す"""
+    text = str(day).strip()
+    date_part, space, time_part = text.partition(" ")
+    sep = "-" if "-" in date_part else "/"
+    _, month, mday = date_part.split(sep)
+    width = 2 if len(month) == 2 and len(mday) == 2 else 1
+    following = dt.date.fromordinal(day_ordinal(day) + 1)
+    return (f"{following.year:04d}{sep}{following.month:0{width}d}{sep}{following.day:0{width}d}"
+            f"{space}{time_part}")
+
+
+def crosses_midnight(start, end):
+    """麻酔終了が入室より前の時刻（0:00 をまたいで翌日に終わる手術）か
+
+    時刻が空欄の手術（source_data.MISSING_INTERVAL、終了 = -1）はまたがない扱い。
+    """
+    return 0 <= end < start
+
+
+class EpochOccupancy(OccupancyCube):
+    """全期間を1本の通し分軸（通日 × 1440 + 分）に並べた部屋別の使用区間
+
+    OccupancyCube と同じ日・区分の選択と件数を持つが、使用区間は日ごとのビット列ではなく、
+    (部屋, 区分) ごとに全期間の通し分の区間リストで保持する。
+    - 麻酔終了が入室より前の時刻の手術は翌日に終わるものとし（23:10〜翌1:30 など）、
+      翌日の時間帯にも数える。サンプリング範囲外（20:29 以降など）の使用も切り捨てない
+    - 翌日に手術がなくても（土曜の緊急手術が日曜にまたぐなど）翌日を日に加え、またいだ手術の区分で
+      選択される日にする（件数はその手術の入室日に数える）。翌日の曜日は元データの曜日の書き方に合わせる
+    - 区分の選択ごとに、部屋の和集合と部屋グループの k 室目の区間を全期間で1回だけ作り、
+      各日の集計では二分探索でその日の 0:00〜23:59 の部分を切り出すだけにする
+    """
+
+    overnight = True
+
+    def __init__(self, start_min, end_min):
+        super().__init__(start_min, end_min)
+        self.day_origin = []    # 各日の 0:00 の通し分
+        self.spill_counts = []  # 日ごとの {(部屋, 区分idx): 前日から0:00をまたいだ手術の件数}
+        self.intervals = {}     # {(部屋, 区分idx): [(通し開始分, 通し終了分), ...]}
+        self._units = {}        # 区分の選択・部屋グループごとの全期間の単位別区間
+        self._weekday_names = {}  # {date.weekday(): 元データの曜日}（翌日だけの日の曜日に使う）
+
+    def _day(self, day, weekday):
+        di = super()._day(day, weekday)
+        if di == len(self.day_origin):
+            self.day_origin.append(day_ordinal(day) * DAY_MINUTES)
+            self.spill_counts.append({})
+        return di
+
+    def _day_keys(self, di):
+        """その日に手術がある部屋・区分と、前日から0:00をまたいだ手術の部屋・区分"""
+        return self.case_counts[di].keys() | self.spill_counts[di].keys()
+
+    def add(self, day, weekday, room, category, start, end):
+        """手術1件を追加する（開始 > 終了 の手術も件数には数える）"""
+        di, ci = self._register(day, weekday, room, category)
+        origin = self.day_origin[di]
+        if weekday:
+            if sum(self.case_counts[di].values()) == 1:
+                self.day_weekday[di] = weekday  # 前日からまたぐ分で先に加えた日は曜日を元データのものにする
+            self._weekday_names[(origin // DAY_MINUTES + 6) % 7] = weekday
+        if crosses_midnight(start, end):
+            end += DAY_MINUTES
+            self._spill(di, room, ci)
+        if start > end:
+            return
+        self.intervals.setdefault((room, ci), []).append((origin + start, origin + end))
+        self._units.clear()
+
+    def _spill(self, di, room, ci):
+        """0:00 をまたぐ手術の翌日を日に加え（なければ）、翌日の (部屋, 区分idx) のまたいだ件数に数える"""
+        weekday_index = (self.day_origin[di] // DAY_MINUTES + 7) % 7
+        weekday = self._weekday_names.get(weekday_index, WEEKDAY_NAMES[weekday_index])
+        counts = self.spill_counts[self._day(next_day(self.days[di]), weekday)]
+        counts[room, ci] = counts.get((room, ci), 0) + 1
+
+    def release(self, di):
+        """指定日までの使用区間を捨てる（日付順に1日ずつ流し込む集計用）。翌日にまたぐ区間は残す"""
+        next_origin = self.day_origin[di] + DAY_MINUTES
+        for key, intervals in list(self.intervals.items()):
+            kept = [iv for iv in intervals if iv[1] >= next_origin]
+            if kept:
+                self.intervals[key] = kept
+            else:
+                del self.intervals[key]
+        self._units.clear()
+
+    def continuous_units(self, room_weight, categories=None, groups=()):
+        """選択区分の全期間の単位別区間 ({単位: (開始のリスト, 終了のリスト)}, {単位: ウェイト})"""
+        cis = self._category_set(categories)
+        key = (tuple(sorted(cis)), tuple(room_weight.items()), tuple(groups))
+        cached = self._units.get(key)
+        if cached is not None:
+            return cached
+        room_intervals = {}
+        for (room, ci), intervals in self.intervals.items():
+            if ci in cis:
+                room_intervals.setdefault(room, []).extend(intervals)
+        room_intervals = {room: merge_intervals(ivs) for room, ivs in room_intervals.items()}
+        unit_weight = room_weight
+        if groups:
+            room_intervals, unit_weight = group_intervals(room_intervals, room_weight, groups)
+        units = {unit: ([s for s, _ in ivs], [e for _, e in ivs])
+                 for unit, ivs in ((unit, merge_intervals(ivs)) for unit, ivs in room_intervals.items())}
+        cached = self._units[key] = (units, unit_weight)
+        return cached
+
+    def unit_intervals(self, di, room_weight, categories=None, groups=()):
+        """指定日の 0:00〜23:59 に切り出した単位別の区間（その日の分）とウェイト"""
+        units, unit_weight = self.continuous_units(room_weight, categories, groups)
+        lo = self.day_origin[di]
+        hi = lo + DAY_MINUTES - 1
+        day_intervals = {}
+        for unit, (starts, ends) in units.items():
+            first = bisect_left(ends, lo)
+            last = bisect_right(starts, hi)
+            if first < last:
+                day_intervals[unit] = [(max(starts[i], lo) - lo, min(ends[i], hi) - lo)
+                                       for i in range(first, last)]
+        return day_intervals, unit_weight
@@ -0,0 +1,373 @@
+"""
+稼働率定義のパラメータ探索
+==========================
+他ソフト（HOGY社など）の稼働率・使用合計・分母を再現する集計条件を、
+パラメータ範囲の全組み合わせ（直積）でまとめて計算し、目標値に近い順に並べます。
+trial_utilization.py / trial_estimate_other.py で手書きしていた試行・仮説を、
+範囲の指定だけで数千通り探索するためのものです。
+
+集計方法（trial_estimate_other の仮説計算と同じ）:
+- 評価点: 開始時刻から step 分おき。評価区間 [m, m+step-1] が終了時刻までに収まる m
+- 判定区間: 評価点 m に対して [m+a, m+b]（offset 省略時は a=0, b=step-1 の区間そのもの）
+- 使用判定: 判定区間と手術 [入室, 麻酔終了] が重なれば使用中。同じ部屋は1回だけ数える
+- 対の部屋（定義シートの部屋グループの構成部屋。グループ欄がなければウェイト0の部屋と統合先、
+  01B/01A）の扱い（merge）。グループのウェイト・上限ではなく、ここで選ぶ扱いで数える:
+    weighted  = 各 1/構成部屋数（対なら各0.5）
+    merged    = どれかが使用中なら1室（1.0）
+    separate  = 各1.0
+    01A_only  = 先頭の部屋（統合先、01A）のみ1.0
+  それ以外の部屋は定義シートのウェイト
+- 分母: "weight" = 数える部屋のウェイト合計、整数 = その部屋数。× 評価点数 × 日数
+- 日数: 除外曜日を除き、定義シートの部屋の手術がある日（区分によらず共通）
+
+使い方:
+    python parameter_sweep.py --target-rate 66.76 --target-usage 19347 --target-denom 28980
+        --start 8:57,8:59,9:00 --end 16:59,17:02 --step 1,3,30
+        --offset bin,-14:15 --merge weighted,merged,separate,01A_only
+        --denominator weight,9,10 --category all,定時 [--room-set all,-10,02+03+05+06+07+08+09+10+01A+01B]
+        [--workers N] [--top 30] [--csv 結果.csv]
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from occupancy import merge_intervals
+from source_data import load_source
+
+if getattr(sys, 'frozen', False):
+    SCRIPT_DIR = os.path.dirname(sys.executable)
+else:
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(SCRIPT_DIR, "時間帯別稼働推移元データ.xlsx")
+
+MERGE_MODES = ("weighted", "merged", "separate", "01A_only")
+TASK_CHUNK = 2000  # 1タスクあたりの時間条件数
+
+RESULT_FIELDS = ["category", "room_set", "merge", "start", "end", "step", "offset", "denominator",
+                 "usage", "denom", "rate", "diff_rate", "diff_usage", "diff_denom", "distance"]
+
+
+# ========== 条件の解釈 ==========
+
+def parse_time(text):
+    """"9:00" または分（"540"）を分に変換"""
+    text = str(text).strip()
+    if ":" in text:
+        h, m = text.split(":")
+        return int(h) * 60 + int(m)
+    return int(text)
+
+
+def format_time(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def parse_offset(text):
+    """"bin"（評価区間そのもの）または "a:b" を返す"""
+    text = text.strip()
+    if text == "bin":
+        return "bin"
+    a, b = text.split(":")
+    return int(a), int(b)
+
+
+def window_offsets(offset, step):
+    return (0, step - 1) if offset == "bin" else offset
+
+
+def num_points(start, end, step):
+    """評価点の数（[m, m+step-1] が end までに収まる m = start, start+step, ...）"""
+    return max(0, (end - start + 1) // step)
+
+
+def build_units(room_set, merge, pairs, room_weight):
+    """数える単位 [(ウェイト, (部屋, ...)), ...]。複数部屋の単位はどれかの使用で1回
+
+    pairs: 部屋の組 [(先頭の部屋, 他の構成部屋, ...), ...]
+    """
+    paired = {room for pair in pairs for room in pair}
+    units = [(room_weight[room], (room,)) for room in room_set if room not in paired]
+    for pair in pairs:
+        primary = pair[0]
+        members = tuple(room for room in pair if room in room_set)
+        if not members:
+            continue
+        if merge == "weighted":
+            units.extend((1.0 / len(pair), (room,)) for room in members)
+        elif merge == "merged":
+            units.append((1.0, members))
+        elif merge == "separate":
+            units.extend((1.0, (room,)) for room in members)
+        elif merge == "01A_only":
+            if primary in room_set:
+                units.append((1.0, (primary,)))
+        else:
+            raise ValueError(f"不明な merge: {merge}")
+    return units
+
+
+def all_rooms(room_weight, pairs):
+    """定義シートの部屋（部屋グループの構成部屋を含む）を定義順に返す"""
+    paired = {room for pair in pairs for room in pair}
+    return tuple(room_weight) + tuple(sorted(paired - set(room_weight)))
+
+
+def parse_room_sets(names, room_weight, pairs):
+    """部屋集合の指定を [(名前, (部屋, ...)), ...] にする
+
+    "all" = 定義シートの全部屋、"02+03+..." = 列挙した部屋、"-10" / "-01A+01B" = 全部屋から除いた部屋。
+    定義シートにない部屋があれば ValueError。
+    """
+    rooms_all = all_rooms(room_weight, pairs)
+    room_sets = []
+    for name in names:
+        if name == "all":
+            rooms, listed = rooms_all, ()
+        elif name.startswith("-"):
+            listed = tuple(name[1:].split("+"))
+            rooms = tuple(room for room in rooms_all if room not in listed)
+        else:
+            rooms = listed = tuple(name.split("+"))
+        unknown = [room for room in listed if room not in rooms_all]
+        if unknown:
+            raise ValueError(f"定義シートにない部屋: {unknown}")
+        room_sets.append((name, rooms))
+    return room_sets
+
+
+# ========== 評価（ワーカープロセス）==========
+
+_DAYS = None  # {日付: [(部屋, 区分, 入室分, 麻酔終了分), ...]}
+
+
+def _init_worker(days):
+    global _DAYS
+    _DAYS = days
+
+
+def unit_day_intervals(days, units, categories):
+    """単位・日ごとの使用区間の和集合: [(ウェイト, [(開始, 終了), ...]), ...]"""
+    result = []
+    for weight, rooms in units:
+        for cases in days.values():
+            intervals = [(s, e) for room, category, s, e in cases
+                         if room in rooms and (categories is None or category in categories)]
+            merged = merge_intervals(intervals)
+            if merged:
+                result.append((weight, merged))
+    return result
+
+
+def count_usage(unit_days, length_cache, start, step, points, offset_a, offset_b):
+    """Σ ウェイト × (使用中と判定される評価点の数)
+
+    和集合区間 [s, e] が判定区間 [m+a, m+b] と重なる ⇔ s-b ≤ m ≤ e-a。
+    判定区間の長さ L = b-a ごとに [s, e+L] の和集合を1回だけ作り、-b ずらして評価点を数える。
+    """
+    length = offset_b - offset_a
+    dilated = length_cache.get(length)
+    if dilated is None:
+        dilated = length_cache[length] = [
+            (weight, merge_intervals([(s, e + length) for s, e in intervals]))
+            for weight, intervals in unit_days
+        ]
+    usage = 0.0
+    last_k = points - 1
+    for weight, intervals in dilated:
+        n = 0
+        for lo, hi in intervals:
+            # lo-b ≤ start + k*step ≤ hi-b を満たす k（0 ≤ k < points）
+            k_lo = max(0, -((start - (lo - offset_b)) // step))
+            k_hi = min(last_k, (hi - offset_b - start) // step)
+            if k_hi >= k_lo:
+                n += k_hi - k_lo + 1
+        if n:
+            usage += weight * n
+    return usage
+
+
+def evaluate_task(task):
+    """1つの (区分, 部屋集合, merge) について時間条件・分母の組み合わせを評価する"""
+    (category, room_set_name, room_set, merge, pairs, room_weight, num_days,
+     timing_list, denominators) = task
+    categories = None if category == "all" else set(category.split("+"))
+    units = build_units(room_set, merge, pairs, room_weight)
+    weight_sum = sum(weight for weight, _ in units)
+    unit_days = unit_day_intervals(_DAYS, units, categories)
+    length_cache = {}
+
+    rows = []
+    for start, end, step, offset in timing_list:
+        offset_a, offset_b = window_offsets(offset, step)
+        points = num_points(start, end, step)
+        usage = count_usage(unit_days, length_cache, start, step, points, offset_a, offset_b)
+        for denominator in denominators:
+            rooms = weight_sum if denominator == "weight" else denominator
+            denom = rooms * points * num_days
+            rate = usage / denom * 100 if denom > 0 else 0.0
+            rows.append((category, room_set_name, merge, start, end, step, offset, denominator,
+                         usage, denom, rate))
+    return rows
+
+
+# ========== 探索 ==========
+
+def load_days(input_file):
+    """除外曜日を除き、定義シートの部屋（部屋グループの構成部屋を含む）の手術を日別にまとめる"""
+    definition, table = load_source(input_file)
+    rooms = set(definition.room_weight_raw) | definition.counted_rooms()
+    days = {}
+    for r in table.cases():
+        if r.weekday in definition.exclude_weekdays or r.room not in rooms:
+            continue
+        days.setdefault(r.date, []).append((r.room, r.category, r.start, r.end))
+    return definition, days
+
+
+def evaluate(days, room_weight, pairs, timing, denominators, categories, room_sets, merges, workers=None):
+    """時間条件のリスト timing [(開始, 終了, step, offset), ...] を
+    区分 × 部屋集合 × merge の全組み合わせで評価し、結果行（dict）のリストを返す"""
+    tasks = []
+    for category, (room_set_name, room_set), merge in itertools.product(categories, room_sets, merges):
+        tasks.extend(make_tasks(category, room_set_name, room_set, merge, pairs, room_weight,
+                                len(days), timing, denominators))
+    return run_tasks(days, tasks, workers)
+
+
+def make_tasks(category, room_set_name, room_set, merge, pairs, room_weight, num_days, timing, denominators):
+    """1つの (区分, 部屋集合, merge) の時間条件を TASK_CHUNK 件ずつのタスクに分ける"""
+    timing = [t for t in timing if num_points(t[0], t[1], t[2]) > 0]
+    return [(category, room_set_name, room_set, merge, pairs, room_weight, num_days,
+             timing[i:i + TASK_CHUNK], denominators)
+            for i in range(0, len(timing), TASK_CHUNK)]
+
+
+def run_tasks(days, tasks, workers=None):
+    """タスクをプロセスプールで評価し、結果行（dict）のリストを返す（workers=1 なら並列なし）"""
+    if workers == 1:
+        _init_worker(days)
+        chunks = map(evaluate_task, tasks)
+        return [dict(zip(RESULT_FIELDS, row)) for rows in chunks for row in rows]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(days,)) as pool:
+        return [dict(zip(RESULT_FIELDS, row))
+                for rows in pool.map(evaluate_task, tasks) for row in rows]
+
+
+def sweep(days, room_weight, pairs, ranges, workers=None):
+    """ranges の全組み合わせを評価し、結果行（dict）のリストを返す
+
+    ranges: {"start": [分], "end": [分], "step": [分], "offset": ["bin" | (a, b)],
+             "merge": [...], "denominator": ["weight" | 部屋数], "category": ["all" | "定時+臨時"],
+             "room_set": [(名前, (部屋, ...))]}
+    """
+    timing = list(itertools.product(ranges["start"], ranges["end"], ranges["step"], ranges["offset"]))
+    return evaluate(days, room_weight, pairs, timing, ranges["denominator"],
+                    ranges["category"], ranges["room_set"], ranges["merge"], workers)
+
+
+def rank(results, target_rate=None, target_usage=None, target_denom=None):
+    """目標値との差を付けて近い順に並べる（距離 = 指定した目標ごとの相対差の合計）"""
+    for r in results:
+        r["diff_rate"] = r["rate"] - target_rate if target_rate is not None else None
+        r["diff_usage"] = r["usage"] - target_usage if target_usage is not None else None
+        r["diff_denom"] = r["denom"] - target_denom if target_denom is not None else None
+        distance = 0.0
+        for diff, target in ((r["diff_rate"], target_rate), (r["diff_usage"], target_usage),
+                             (r["diff_denom"], target_denom)):
+            if diff is not None:
+                distance += abs(diff) / abs(target) if target else abs(diff)
+        r["distance"] = distance
+    results.sort(key=lambda r: r["distance"])
+    return results
+
+
+def describe(r):
+    offset = "bin" if r["offset"] == "bin" else f"{r['offset'][0]:+d}/{r['offset'][1]:+d}"
+    return (f"{r['category']}/{r['room_set']}/{r['merge']} "
+            f"{format_time(r['start'])}-{format_time(r['end'])} {r['step']}分 {offset} 分母={r['denominator']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="稼働率の集計条件を範囲指定で総当たりし、目標値に近い順に並べます")
+    parser.add_argument("--input", default=INPUT_FILE, help="元データブック")
+    parser.add_argument("--target-rate", type=float, default=None, help="目標稼働率(%%)")
+    parser.add_argument("--target-usage", type=float, default=None, help="目標使用合計")
+    parser.add_argument("--target-denom", type=float, default=None, help="目標分母")
+    parser.add_argument("--start", default="9:00", help="開始時刻（カンマ区切り）")
+    parser.add_argument("--end", default="16:59", help="終了時刻（カンマ区切り、最終評価区間の終わり）")
+    parser.add_argument("--step", default="3", help="評価点の間隔（分、カンマ区切り）")
+    parser.add_argument("--offset", default="bin", help="判定区間 bin または a:b（カンマ区切り）")
+    parser.add_argument("--merge", default=",".join(MERGE_MODES), help="対の部屋の扱い（カンマ区切り）")
+    parser.add_argument("--denominator", default="weight", help="分母 weight または部屋数（カンマ区切り）")
+    parser.add_argument("--category", default="all", help="区分 all または 定時+臨時 など（カンマ区切り）")
+    parser.add_argument("--room-set", default="all",
+                        help="部屋集合 all、02+03+...、または全部屋から除く -10（カンマ区切り）")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時はCPU数、1で並列なし）")
+    parser.add_argument("--top", type=int, default=30, help="表示件数")
+    parser.add_argument("--csv", default=None, help="全結果を書き出すCSVのパス")
+    args = parser.parse_args(argv)
+
+    definition, days = load_days(args.input)
+    room_weight = definition.room_weight_raw
+    pairs = [group.members for group in definition.room_groups]
+
+    def split(text):
+        return [v.strip() for v in text.split(",") if v.strip()]
+
+    try:
+        room_sets = parse_room_sets(split(args.room_set), room_weight, pairs)
+    except ValueError as e:
+        parser.error(str(e))
+    merges = split(args.merge)
+    for merge in merges:
+        if merge not in MERGE_MODES:
+            parser.error(f"不明な merge: {merge}（{', '.join(MERGE_MODES)}）")
+
+    ranges = {
+        "start": [parse_time(v) for v in split(args.start)],
+        "end": [parse_time(v) for v in split(args.end)],
+        "step": [int(v) for v in split(args.step)],
+        "offset": [parse_offset(v) for v in split(args.offset)],
+        "merge": merges,
+        "denominator": [v if v == "weight" else int(v) for v in split(args.denominator)],
+        "category": split(args.category),
+        "room_set": room_sets,
+    }
+    total = 1
+    for values in ranges.values():
+        total *= len(values)
+    print(f"入力ファイル: {args.input}")
+    print(f"対象日数: {len(days)}, 対の部屋: {pairs}")
+    print(f"組み合わせ数: {total}")
+
+    results = rank(sweep(days, room_weight, pairs, ranges, args.workers),
+                   args.target_rate, args.target_usage, args.target_denom)
+
+    print(f"\n{'順位':>4s}  {'使用合計':>10s}  {'分母':>9s}  {'稼働率':>8s}  {'率差':>8s}  {'距離':>8s}  条件")
+    print("-" * 110)
+    for i, r in enumerate(results[:args.top], 1):
+        diff_rate = f"{r['diff_rate']:+7.2f}" if r["diff_rate"] is not None else "       -"
+        print(f"{i:4d}  {r['usage']:10.1f}  {r['denom']:9.1f}  {r['rate']:7.2f}%  {diff_rate}  "
+              f"{r['distance']:8.4f}  {describe(r)}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for r in results:
+                row = dict(r)
+                row["start"] = format_time(r["start"])
+                row["end"] = format_time(r["end"])
+                row["offset"] = "bin" if r["offset"] == "bin" else f"{r['offset'][0]}:{r['offset'][1]}"
+                writer.writerow(row)
+        print(f"\n全{len(results)}件を保存: {args.csv}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
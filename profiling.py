@@ -0,0 +1,153 @@
+"""
+工程別プロファイル
+==================
+集計スクリプトの工程ごとの経過時間・呼び出し回数・ピークメモリ（tracemalloc）を記録し、
+JSON レポートとコンソールの要約を出力します。--profile を付けたときだけ有効で、
+付けないときの Profiler は何もしません（計測のための負荷もかからない）。
+
+- 工程は lap(名前) で区切る。前回の lap からの経過時間をその工程に加算し、回数を1増やす
+- 名前は "load.parse_source" のように「大工程.小工程」とし、要約では大工程ごとの合計も出す
+- ピークメモリは tracemalloc で追跡した Python オブジェクトの最大量（工程ごとに最大値をリセット）。
+  tracemalloc の追跡中は処理が遅くなるため、時間は工程の比率を見る目安とする
+- 最大常駐メモリ（RSS）はプロセス全体の値（resource が使えない環境では記録しない）
+
+使い方（各スクリプト）:
+    python calculate_timezone_usage.py --profile [レポート.json]
+    python trial_hogy.py --profile [レポート.json]
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """このプロセスの最大常駐メモリ（MB）。resource が使えない環境では None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return rss / MB if sys.platform == "darwin" else rss / 1024
+
+
+class Profiler:
+    """工程ごとの経過時間・回数・ピークメモリ（enabled=False なら何もしない）"""
+
+    def __init__(self, name, enabled=True, trace_memory=True):
+        self.name = name
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.phases = {}  # {工程名: {"seconds", "calls", "peak_mb"}}（最初に記録した順）
+        self._own_tracing = False
+        self._started = self._clock = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+
+    def lap(self, phase):
+        """前回の lap（または開始）からの区間を phase の工程として記録する"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        entry = self.phases.setdefault(phase, {"seconds": 0.0, "calls": 0, "peak_mb": None})
+        entry["seconds"] += now - self._clock
+        entry["calls"] += 1
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / MB
+            entry["peak_mb"] = max(entry["peak_mb"] or 0.0, peak)
+            tracemalloc.reset_peak()
+        # 記録自体にかかった時間は次の工程に含めない
+        self._clock = time.perf_counter()
+
+    def report(self):
+        """レポート（JSON にそのまま書ける dict）"""
+        total = sum(entry["seconds"] for entry in self.phases.values())
+        groups = {}
+        for phase, entry in self.phases.items():
+            group = groups.setdefault(phase.split(".", 1)[0], {"seconds": 0.0, "calls": 0, "peak_mb": None})
+            group["seconds"] += entry["seconds"]
+            group["calls"] += entry["calls"]
+            if entry["peak_mb"] is not None:
+                group["peak_mb"] = max(group["peak_mb"] or 0.0, entry["peak_mb"])
+        return {
+            "script": self.name,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tracemalloc": self.trace_memory,
+            "wall_seconds": time.perf_counter() - self._started,
+            "total_seconds": total,
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": [dict(entry, phase=phase) for phase, entry in self.phases.items()],
+            "groups": [dict(entry, phase=group) for group, entry in groups.items()],
+        }
+
+    def summary(self, report=None):
+        """コンソール用の要約（行のリスト）"""
+        report = report or self.report()
+        total = report["total_seconds"] or 1.0
+        lines = [f"=== プロファイル: {report['script']} "
+                 f"（合計 {report['total_seconds']:.3f}秒"
+                 + (", tracemalloc 追跡中" if report["tracemalloc"] else "") + "）===",
+                 # 全角の見出しは表示幅が2倍なので、その分だけ詰めて揃える
+                 f"{'工程':<32s} {'秒':>8s} {'割合':>4s} {'回数':>3s} {'ピークMB':>6s}"]
+        by_group = {}
+        for entry in report["phases"]:
+            by_group.setdefault(entry["phase"].split(".", 1)[0], []).append(entry)
+        for group in report["groups"]:
+            entries = by_group[group["phase"]]
+            if len(entries) > 1 or entries[0]["phase"] != group["phase"]:
+                lines.append(self._line(group, total))
+                lines.extend(self._line(entry, total, "  ") for entry in entries)
+            else:
+                lines.append(self._line(group, total))
+        if report["peak_rss_mb"] is not None:
+            lines.append(f"最大常駐メモリ（RSS）: {report['peak_rss_mb']:.1f}MB")
+        return lines
+
+    @staticmethod
+    def _line(entry, total, indent=""):
+        peak = f"{entry['peak_mb']:9.1f}" if entry["peak_mb"] is not None else "        -"
+        return (f"{indent + entry['phase']:<34s} {entry['seconds']:9.3f} "
+                f"{entry['seconds'] / total * 100:5.1f}% {entry['calls']:5d} {peak}")
+
+    def finish(self, path):
+        """JSON レポートを保存し、要約を表示する（無効なら何もしない）"""
+        if not self.enabled:
+            return
+        report = self.report()
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print()
+        for line in self.summary(report):
+            print(line)
+        print(f"プロファイル保存: {path}")
+
+
+def default_path(script):
+    """既定のレポートのパス（カレントフォルダの <スクリプト名>-プロファイル.json）"""
+    return f"{os.path.splitext(os.path.basename(script))[0]}-プロファイル.json"
+
+
+def from_argv(script, argv=None):
+    """引数に --profile [レポート.json] があれば有効な Profiler と保存先を返す
+
+    argparse を使わないトップレベルの試行スクリプト用。戻り値: (Profiler, 保存先)
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    name = os.path.splitext(os.path.basename(script))[0]
+    if "--profile" not in argv:
+        return Profiler(name, enabled=False), None
+    i = argv.index("--profile")
+    path = argv[i + 1] if i + 1 < len(argv) and not argv[i + 1].startswith("-") else default_path(script)
+    return Profiler(name), path
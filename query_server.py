@@ -0,0 +1,330 @@
+"""
+稼働率 問い合わせサーバー（ローカル HTTP/JSON）
+==============================================
+元データを1回だけ読み込んで占有キューブ（calculate_timezone_usage と同じ索引）を作り、
+「火曜日の 9:00〜16:30、定時のみ、10番を除く稼働率は？」のような問い合わせに、
+スクリプトを書き換えたり xlsx を読み直したりせずに答えます。標準ライブラリの http.server のみを使います。
+
+問い合わせ（GET のクエリ文字列、または POST の JSON。リストはカンマ区切りでもよい）:
+    grid           時間グリッド 開始-終了/間隔/窓長[/基準]（省略時は定義シートまたは 8:00-20:00/30/30）
+    weekdays       曜日（"火" / "火曜日" など。省略時は定義シートの除外曜日以外の全曜日。日がない曜日は対象日数0）
+    categories     実施申込区分（"定時" など。省略時は全区分）
+    rooms          数える手術室（省略時は定義シートの全対象室。部屋グループは指定した構成部屋だけで数える）
+    exclude_rooms  数えない手術室
+    method         average = 窓内の1分（秒単位のグリッドは1秒）サンプリング平均（v4.0、既定）
+                   any     = 窓内に1分でも使用があれば、その部屋のウェイトを数える（HOGY の区間方式）
+    denominator    稼働率の分母: weight = 数える部屋のウェイト合計（既定）、数値 = その部屋数
+    days           1 なら日別の値（小数第4位）も返す
+
+応答の values は計算結果シートに書く値（日平均、小数第2位）と同じ。例えば既定の問い合わせは
+計算結果シートの全手術行、categories=定時 は予定手術のみ行、weekdays=火曜日 は火曜日の行と一致する。
+
+使い方:
+    python query_server.py [--input 元データ.xlsx] [--host 127.0.0.1] [--port 8765] [--engine cube|epoch]
+
+    curl "http://127.0.0.1:8765/query?grid=9:00-16:30/30/30&weekdays=火&categories=定時&exclude_rooms=10"
+    curl "http://127.0.0.1:8765/info"
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from calculate_timezone_usage import ENGINE, ENGINES, SNAPSHOT_GRID
+from occupancy import DAY_MINUTES, WEEKDAY_NAMES, CoverageIndex, DayTimeline, TimeGrid, weight_capacity
+from source_data import load_source
+
+if getattr(sys, 'frozen', False):
+    SCRIPT_DIR = os.path.dirname(sys.executable)
+else:
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(SCRIPT_DIR, "時間帯別稼働推移元データ.xlsx")
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+METHODS = ("average", "any")
+QUERY_KEYS = {"grid", "weekdays", "categories", "rooms", "exclude_rooms", "method", "denominator", "days"}
+LIST_KEYS = {"weekdays", "categories", "rooms", "exclude_rooms"}  # リストでも指定できる項目
+
+# 同じ区分・部屋の組み合わせの日別の単位別区間を覚えておく数（古いものから捨てる）
+CACHE_SIZE = 32
+
+
+class QueryService:
+    """読み込み済みの元データに対する問い合わせ（HTTP とは独立に使える）"""
+
+    def __init__(self, input_file, engine=ENGINE):
+        self.input_file = input_file
+        self.engine = engine
+        started = time.perf_counter()
+        self.definition, table = load_source(input_file)
+        records = list(table.cases())
+        self.rooms = self.definition.counted_rooms()
+        # 任意の時間グリッドに答えられるよう、0:00〜23:59 の全体で索引を作る
+        self.cube = ENGINES[engine].build(
+            ((r.date, r.weekday, r.room, r.category, r.start, r.end)
+             for r in records if r.room in self.rooms),
+            0, DAY_MINUTES - 1,
+        )
+        self.default_grid = TimeGrid.from_settings(self.definition.grid_settings, SNAPSHOT_GRID)
+        self.weekdays = list(dict.fromkeys(self.cube.day_weekday))
+        self._cache = {}
+        self.load_seconds = time.perf_counter() - started
+
+    def info(self):
+        """問い合わせに使える値の一覧"""
+        return {
+            "input": self.input_file,
+            "engine": self.engine,
+            "load_seconds": round(self.load_seconds, 3),
+            "days": len(self.cube.days),
+            "first_day": min(self.cube.days) if self.cube.days else None,
+            "last_day": max(self.cube.days) if self.cube.days else None,
+            "weekdays": self.weekdays,
+            "exclude_weekdays": sorted(self.definition.exclude_weekdays),
+            "categories": self.cube.categories,
+            "rooms": sorted(self.rooms),
+            "room_weight": self.definition.room_weight,
+            "room_groups": [group._asdict() for group in self.definition.room_groups],
+            "default_grid": self.default_grid.describe(),
+            "methods": list(METHODS),
+        }
+
+    # --- 問い合わせの解釈 ---
+
+    def _weekday(self, name):
+        """曜日名（"土曜日"・"土曜"・"土"）を元データの曜日に。データに日がない曜日でもよい（対象日数0の結果）"""
+        known = list(dict.fromkeys(self.weekdays + list(WEEKDAY_NAMES)))
+        for candidate in (name, f"{name}曜日", f"{name}日"):
+            if candidate in known:
+                return candidate
+        raise ValueError(f"曜日が不明です: {name}（{', '.join(known)}）")
+
+    def _room_selection(self, rooms, exclude_rooms):
+        """数える部屋のウェイトと部屋グループ（構成部屋を選択した部屋に絞る）"""
+        selected = set(rooms) if rooms else set(self.rooms)
+        unknown = (selected | set(exclude_rooms)) - self.rooms
+        if unknown:
+            raise ValueError(f"対象外の手術室です: {sorted(unknown)}（{', '.join(sorted(self.rooms))}）")
+        selected -= set(exclude_rooms)
+        room_weight = {room: w for room, w in self.definition.room_weight.items() if room in selected}
+        groups = []
+        for group in self.definition.room_groups:
+            members = tuple(room for room in group.members if room in selected)
+            if members:
+                groups.append(group._replace(members=members))
+        return selected, room_weight, groups
+
+    def _day_units(self, di, room_weight, categories, groups):
+        """日別の単位別区間とタイムライン（区分・部屋の組み合わせごとに覚えておく）"""
+        key = (tuple(categories) if categories else None, tuple(sorted(room_weight.items())), tuple(groups))
+        by_day = self._cache.get(key)
+        if by_day is None:
+            if len(self._cache) >= CACHE_SIZE:
+                del self._cache[next(iter(self._cache))]
+            by_day = self._cache[key] = {}
+        entry = by_day.get(di)
+        if entry is None:
+            unit_intervals, unit_weight = self.cube.unit_intervals(di, room_weight, categories, groups)
+            entry = by_day[di] = (unit_intervals, unit_weight, DayTimeline(unit_intervals, unit_weight))
+        return entry
+
+    def query(self, params):
+        """問い合わせ（{項目: 文字列 または リスト}）に答える"""
+        unknown = set(params) - QUERY_KEYS
+        if unknown:
+            raise ValueError(f"不明な項目です: {sorted(unknown)}（{', '.join(sorted(QUERY_KEYS))}）")
+        params = check_params(params)
+        grid = TimeGrid.parse(params["grid"]) if params.get("grid") else self.default_grid
+        categories = as_list(params.get("categories")) or None
+        if categories:
+            unknown = set(categories) - set(self.cube.categories)
+            if unknown:
+                raise ValueError(f"区分が不明です: {sorted(unknown)}（{', '.join(self.cube.categories)}）")
+        weekdays = [self._weekday(w) for w in as_list(params.get("weekdays"))]
+        method = params.get("method") or "average"
+        if method not in METHODS:
+            raise ValueError(f"method は {', '.join(METHODS)} のいずれかです: {method}")
+        rooms, room_weight, groups = self._room_selection(as_list(params.get("rooms")),
+                                                          as_list(params.get("exclude_rooms")))
+
+        started = time.perf_counter()
+        # 対象日・件数は数える部屋の手術で決める（選んだ部屋に手術がない日で平均を薄めない）
+        if weekdays:
+            day_indices = self.cube.select_days(categories, weekdays=set(weekdays), rooms=rooms)
+        else:
+            day_indices = self.cube.select_days(categories, exclude_weekdays=self.definition.exclude_weekdays,
+                                                rooms=rooms)
+        windows = grid.windows()
+        by_day = {}
+        for di in day_indices:
+            unit_intervals, unit_weight, timeline = self._day_units(di, room_weight, categories, groups)
+            if method == "average":
+                by_day[di] = grid.averages(timeline)
+            else:
+                by_day[di] = any_use(unit_intervals, unit_weight, windows)
+
+        num_days = len(day_indices)
+        totals = [0.0] * len(windows)
+        for values in by_day.values():
+            for si, val in enumerate(values):
+                totals[si] += val
+        raw = [t / num_days for t in totals] if num_days else totals
+        denominator = params.get("denominator") or "weight"
+        denom = weight_capacity(room_weight, groups) if denominator == "weight" else float(denominator)
+        overall = sum(raw) / len(raw) if raw else 0.0
+
+        result = {
+            "query": {
+                "grid": grid.describe(),
+                "weekdays": weekdays or [w for w in self.weekdays if w not in self.definition.exclude_weekdays],
+                "categories": categories or self.cube.categories,
+                "rooms": sorted(rooms),
+                "method": method,
+                "denominator": denominator,
+            },
+            "labels": grid.labels(),
+            "values": [round(v, 2) for v in raw],
+            "values_raw": raw,
+            "rates": [v / denom * 100 if denom else 0.0 for v in raw],
+            "overall": overall,
+            "overall_rate": overall / denom * 100 if denom else 0.0,
+            "denominator": denom,
+            "num_days": num_days,
+            "case_count": self.cube.case_count(day_indices, categories, rooms),
+        }
+        if str(params.get("days", "")).strip() in ("1", "true", "True"):
+            result["by_day"] = {self.cube.days[di]: [round(v, 4) for v in by_day[di]]
+                                for di in sorted(by_day, key=lambda i: self.cube.days[i])}
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+def any_use(unit_intervals, unit_weight, windows):
+    """窓内に1秒でも使用がある単位のウェイト合計（部屋グループの k 室目も単位ごとに数える）"""
+    values = [0.0] * len(windows)
+    for unit, intervals in unit_intervals.items():
+        weight = unit_weight.get(unit, 0.0)
+        if not weight or not intervals:
+            continue
+        coverage = CoverageIndex(intervals)
+        for i, (lo, hi) in enumerate(windows):
+            if coverage.covered_seconds(lo, hi) > 0:
+                values[i] += weight
+    return values
+
+
+def check_params(params):
+    """問い合わせの値の型を確かめ、数値は文字列にする（JSON の {"grid": 5} などは ValueError）
+
+    値は文字列（denominator・days は数値も可）、LIST_KEYS の項目は文字列のリストも可。
+    """
+    checked = {}
+    for key, value in params.items():
+        if isinstance(value, list) and key in LIST_KEYS:
+            if not all(isinstance(v, str) for v in value):
+                raise ValueError(f"{key} のリストは文字列で指定してください: {value!r}")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key in ("denominator", "days"):
+            value = str(value)
+        elif value is not None and not isinstance(value, str):
+            kind = "文字列または文字列のリスト" if key in LIST_KEYS else "文字列"
+            raise ValueError(f"{key} は{kind}で指定してください: {value!r}")
+        checked[key] = value
+    return checked
+
+
+def as_list(value):
+    """"a,b" / ["a", "b"] / None をリストにする"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+# ========== HTTP ==========
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _answer(self, path, params):
+            if path in ("/", "/info"):
+                self._send(200, service.info())
+            elif path == "/query":
+                try:
+                    result = service.query(params)
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                self._send(200, result)
+            else:
+                self._send(404, {"error": f"不明なパスです: {path}（/info, /query）"})
+
+        def do_GET(self):
+            # http.server はリクエスト行を latin-1 で読むため、URL エンコードしない日本語をそのまま送る
+            # クライアント（curl など）のために UTF-8 として読み直す
+            url = urlparse(self.path.encode("latin-1").decode("utf-8", "replace"))
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            self._answer(url.path, params)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                self._send(400, {"error": f"Content-Length が不正です: {self.headers.get('Content-Length')}"})
+                return
+            if length < 0:
+                self._send(400, {"error": f"Content-Length が不正です: {length}"})
+                return
+            try:
+                params = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send(400, {"error": f"JSON を解釈できません: {e}"})
+                return
+            if not isinstance(params, dict):
+                self._send(400, {"error": "問い合わせは JSON オブジェクトで指定してください"})
+                return
+            self._answer(url.path, params)
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="元データを1回読み込み、稼働率の問い合わせに HTTP/JSON で答えます")
+    parser.add_argument("--input", default=INPUT_FILE, help="元データブック")
+    parser.add_argument("--host", default=HOST, help=f"待ち受けるアドレス（既定: {HOST}、この PC からのみ）")
+    parser.add_argument("--port", type=int, default=PORT, help=f"ポート番号（既定: {PORT}）")
+    parser.add_argument("--engine", choices=tuple(ENGINES), default=ENGINE, help=f"集計エンジン（既定: {ENGINE}）")
+    args = parser.parse_args(argv)
+
+    print(f"入力ファイル読み込み: {args.input}")
+    service = QueryService(args.input, args.engine)
+    print(f"読み込み完了: {len(service.cube.days)}日、{service.load_seconds:.2f}秒")
+    server = HTTPServer((args.host, args.port), make_handler(service))
+    print(f"待ち受け中: http://{args.host}:{args.port}/query （終了は Ctrl+C）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
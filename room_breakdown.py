@@ -0,0 +1,111 @@
+"""
+部屋別内訳シート（部屋別内訳）と CSV
+====================================
+全手術・予定手術・区分別の各セクションについて、数える単位（部屋・部屋グループ）ごとの
+
+- 部屋 × 時刻: 対象日の日平均使用室数（スナップショット時刻ごと）
+- 部屋 × 日:   各日の時間グリッド内の平均使用室数（全スナップショットの平均）
+
+を並べます。値は合計と同じ日別・部屋別の占有タイムライン（occupancy.TimeGrid.unit_averages）
+から集約するだけなので、部屋ごとに元データを集計し直すことはしません。
+全部屋の合計は、丸めの誤差を除いて計算結果シート・検証シートの値と一致します。
+
+セルは verification_sheet と同じ (行, 列, 値, 書式名) の列・同じ書式定義で生成し、
+xlsx_patch と openpyxl のどちらでも書き込めます。
+"""
+
+import csv
+
+
+SHEET_NAME = "部屋別内訳"
+
+CSV_FIELDS = ["区分", "集計", "部屋", "時刻・日付", "平均使用室数"]
+
+
+def snapshot_table(unit_totals, num_days, units):
+    """部屋別の値の日ごとの合計をスナップショットごとに日平均する: {部屋: [val(小数第4位), ...]}
+
+    unit_totals: {部屋: [対象日の val の合計, ...]}（streaming.SectionTotals で日の順に足したもの）
+    """
+    return {unit: [round(t / num_days, 4) if num_days else 0.0 for t in unit_totals[unit]] for unit in units}
+
+
+def day_averages(unit_values, units, num_snaps):
+    """1日分の部屋別の時間グリッド内平均: {部屋: val(小数第4位)}
+
+    unit_values: {部屋: [val, ...]}（使用のない部屋は省略されていてよい）
+    """
+    return {unit: round(sum(unit_values.get(unit, ())) / num_snaps, 4) if num_snaps else 0.0 for unit in units}
+
+
+def column_widths(num_columns):
+    """列番号 → 列幅（A:部屋・日付、B:平均・合計、C以降:時刻・部屋）"""
+    widths = {1: 12, 2: 12}
+    for col in range(3, num_columns + 3):
+        widths[col] = 9
+    return widths
+
+
+def cells(sections, units, snapshot_labels):
+    """部屋別内訳シートの (行, 列, 値, 書式名) を行順・列順に返す
+
+    sections: [(セクションラベル, snapshot_table の結果, {日付: day_averages の結果}（日付順）), ...]
+    前半に全セクションの 部屋 × 時刻、後半に全セクションの 部屋 × 日 を並べる。
+    """
+    row = 1
+    yield row, 1, "部屋 × 時刻（対象日の日平均使用室数）", "label"
+    row += 2
+    for section_label, by_snapshot, _ in sections:
+        yield row, 1, section_label, "label"
+        yield row + 1, 1, "部屋", "header"
+        yield row + 1, 2, "全時刻平均", "header_dark"
+        for si, time_label in enumerate(snapshot_labels):
+            yield row + 1, 3 + si, time_label, "header"
+        row += 2
+        totals = [0.0] * len(snapshot_labels)
+        for unit in units:
+            vals = by_snapshot[unit]
+            yield row, 1, unit, "time"
+            yield row, 2, round(sum(vals) / len(vals), 4) if vals else 0.0, "average"
+            for si, val in enumerate(vals):
+                totals[si] += val
+                yield row, 3 + si, val, "value"
+            row += 1
+        yield row, 1, "合計", "header_dark"
+        yield row, 2, round(sum(totals) / len(totals), 4) if totals else 0.0, "average"
+        for si, val in enumerate(totals):
+            yield row, 3 + si, round(val, 4), "average"
+        row += 2
+
+    yield row, 1, "部屋 × 日（時間グリッド内の平均使用室数）", "label"
+    row += 2
+    for section_label, _, by_day in sections:
+        yield row, 1, section_label, "label"
+        yield row + 1, 1, "日付", "header"
+        yield row + 1, 2, "合計", "header_dark"
+        for ui, unit in enumerate(units):
+            yield row + 1, 3 + ui, unit, "header"
+        row += 2
+        for d, values in by_day.items():
+            yield row, 1, d, "time"
+            yield row, 2, round(sum(values.values()), 4), "average"
+            for ui, unit in enumerate(units):
+                yield row, 3 + ui, values[unit], "value"
+            row += 1
+        row += 1
+
+
+def write_csv(path, sections, units, snapshot_labels):
+    """同じ内訳を縦持ちの CSV（Excel で開ける UTF-8 BOM 付き）に書き出す"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for section_label, by_snapshot, by_day in sections:
+            label = section_label.strip("【】")
+            for unit in units:
+                for time_label, val in zip(snapshot_labels, by_snapshot[unit]):
+                    writer.writerow([label, "時刻別", unit, time_label, val])
+            for d, values in by_day.items():
+                for unit in units:
+                    writer.writerow([label, "日別", unit, d, values[unit]])
+
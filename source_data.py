@@ -0,0 +1,359 @@
+"""
+元データ読み込み
+================
+「定義」シートと「時間帯別稼働推移元データ」シートを読み込み、手術記録を
+列指向（struct-of-arrays）のコンパクトな整数配列に変換します。
+
+- 入室時刻・麻酔終了時刻は読み込み時に1回だけ「分」に変換して array('i') に保持
+- 日付・曜日・手術室・実施申込区分は文字列表への小さな整数コード（array('H')）で保持
+- 各スクリプトは dict＋time オブジェクトの代わりに CaseTable / Case を使う
+- load_source() は読み取り専用のストリーミング解析で読み込む（書き込み用には開かない）
+- 解析結果は元データブックの内容ハッシュをキーにキャッシュし、2回目以降は xlsx を解析しない
+- stream_source() は CaseTable を作らず、行を読むそばから Case を1件ずつ渡す（日付順の流し込み集計用）
+"""
+
+import datetime as dt
+import glob
+import hashlib
+import os
+import pickle
+import re
+from array import array
+from collections import namedtuple
+
+import openpyxl
+
+DATA_SHEET = "時間帯別稼働推移元データ"
+DEFINITION_SHEET = "定義"
+EXCLUDE_LABEL = "除外曜日"
+GRID_LABEL = "時間グリッド"
+GROUP_LABEL = "部屋グループ"
+
+# 解析キャッシュ（元データブックと同じフォルダに作る）
+CACHE_DIR_NAME = ".source_cache"
+CACHE_VERSION = 4  # Definition / CaseTable の保持形式や解析方法を変えたら上げる
+
+# 時刻が空欄の手術は「開始 > 終了」として保持し、どの時刻にも該当させない
+MISSING_INTERVAL = (0, -1)
+
+Case = namedtuple("Case", "mgmt_no date weekday room start end category")
+
+# 部屋グループ: 構成部屋の使用区間をまとめて1本のタイムラインとして数える。
+# 同時に使用中の構成部屋数を cap で頭打ちにし、ウェイト weight を掛ける（cap=1 ならどれか使用中で weight）
+RoomGroup = namedtuple("RoomGroup", "name members weight cap")
+
+
+def to_minutes(t):
+    """時刻を分に変換（time, timedelta, str対応）"""
+    if isinstance(t, dt.time):
+        return t.hour * 60 + t.minute
+    elif isinstance(t, dt.timedelta):
+        return int(t.total_seconds()) // 60
+    elif isinstance(t, str):
+        parts = t.split(":")
+        return int(parts[0]) * 60 + int(parts[1])
+    else:
+        return t.hour * 60 + t.minute
+
+
+class Definition:
+    """定義シートの設定（対象手術室・ウェイト・除外曜日・時間グリッド・部屋グループ）"""
+
+    def __init__(self, room_weight_raw, exclude_weekdays, grid_settings=None, room_groups=None):
+        self.room_weight_raw = room_weight_raw
+        self.exclude_weekdays = exclude_weekdays
+        # 時間グリッドの上書き設定 {"開始", "終了", "間隔", "窓長", "基準"}（occupancy.TimeGrid.from_settings で使う）
+        self.grid_settings = grid_settings or {}
+
+        # 01B統合ロジック: ウェイト0の部屋を、末尾アルファベット違いでウェイト>0の部屋に統合
+        self.merge_map = {}     # {統合元部屋名: 統合先部屋名}
+        self.room_weight = {}   # 実際に集計に使うウェイト（ウェイト>0の部屋のみ）
+        self.unmerged = []      # 統合先が見つからないウェイト0の部屋
+        for room_name, weight in room_weight_raw.items():
+            if weight == 0:
+                base = room_name[:-1] if room_name[-1].isalpha() else None
+                if base:
+                    for candidate, cw in room_weight_raw.items():
+                        if candidate != room_name and candidate.startswith(base) and cw > 0:
+                            self.merge_map[room_name] = candidate
+                            break
+                if room_name not in self.merge_map:
+                    self.unmerged.append(room_name)
+            else:
+                self.room_weight[room_name] = weight
+
+        # 部屋グループ: 定義シートの「部屋グループ」欄があればそれを使い、なければ
+        # 上の統合（01B → 01A）を「統合先＋統合元、統合先のウェイト、上限1」のグループとみなす
+        if room_groups:
+            self.room_groups = list(room_groups)
+        else:
+            members = {}
+            for source, target in self.merge_map.items():
+                members.setdefault(target, [target]).append(source)
+            self.room_groups = [RoomGroup(target, tuple(rooms), self.room_weight[target], 1)
+                                for target, rooms in members.items()]
+        grouped = {room for group in self.room_groups for room in group.members}
+        self.unmerged = [room for room in self.unmerged if room not in grouped]
+
+    def counted_rooms(self, room_groups=None):
+        """集計対象の部屋（ウェイト>0の部屋と、部屋グループ（省略時は定義シートの設定）の構成部屋）"""
+        rooms = set(self.room_weight)
+        for group in self.room_groups if room_groups is None else room_groups:
+            rooms.update(group.members)
+        return rooms
+
+
+def read_definition(rows):
+    """定義シートの行（values_only のタプル列）から Definition を作る
+
+    - 2行目〜「除外曜日」見出しの前のA/B列: 手術室とウェイト（数値に変換できない行で打ち切り）
+    - 「除外曜日」見出しの次の行以降のA列: 除外曜日（空欄まで）
+    - 「時間グリッド」見出しの次の行以降のA/B列: 項目名と値（空欄まで、見出しがなければ設定なし）
+    - 「部屋グループ」見出しの次の行以降のA〜D列: グループ名・構成部屋（"01A,01B" / "01A+01B"）・
+      ウェイト（省略時1）・同時使用の上限室数（省略時1）（空欄まで、見出しがなければ01B統合から作る）
+    見出しが見つからない場合は従来の固定位置（見出し14行目）とみなす。
+    """
+    rows = [tuple(row) + (None,) * 4 for row in rows]
+    label_index = next((i for i, row in enumerate(rows) if row[0] == EXCLUDE_LABEL), 13)
+
+    room_weight_raw = {}
+    for row in rows[1:label_index]:
+        if row[0] is not None and row[1] is not None:
+            try:
+                room_weight_raw[str(row[0])] = float(row[1])
+            except (ValueError, TypeError):
+                break
+
+    exclude_weekdays = set()
+    for row in rows[label_index + 1:]:
+        v = row[0]
+        if v is None or v == "":
+            break
+        exclude_weekdays.add(str(v))
+
+    grid_settings = {}
+    grid_index = next((i for i, row in enumerate(rows) if row[0] == GRID_LABEL), None)
+    if grid_index is not None:
+        for row in rows[grid_index + 1:]:
+            if row[0] is None or row[0] == "":
+                break
+            if row[1] is not None:
+                grid_settings[str(row[0]).strip()] = row[1]
+
+    room_groups = []
+    group_index = next((i for i, row in enumerate(rows) if row[0] == GROUP_LABEL), None)
+    if group_index is not None:
+        for row in rows[group_index + 1:]:
+            name, members, weight, cap = row[:4]
+            if name is None or name == "" or members is None:
+                break
+            members = tuple(m.strip() for m in str(members).replace("+", ",").split(",") if m.strip())
+            try:
+                weight = 1.0 if weight is None or weight == "" else float(weight)
+                cap = 1 if cap is None or cap == "" else int(cap)
+            except (ValueError, TypeError):
+                raise ValueError(f"定義シートの部屋グループ '{name}' のウェイト・上限が数値ではありません") from None
+            if cap < 1:
+                raise ValueError(f"定義シートの部屋グループ '{name}' の上限は1以上にしてください")
+            room_groups.append(RoomGroup(str(name).strip(), members, weight, cap))
+
+    return Definition(room_weight_raw, exclude_weekdays, grid_settings, room_groups)
+
+
+def row_fields(row):
+    """元データシートの1行（7列）を Case の項目の並び（時刻は分）にする。手術室が空欄の行は None"""
+    mgmt_no, op_date, weekday, room, start_time, end_time, category = (tuple(row) + (None,) * 7)[:7]
+    if room is None:
+        return None
+    if start_time is None or end_time is None:
+        start, end = MISSING_INTERVAL
+    else:
+        start, end = to_minutes(start_time), to_minutes(end_time)
+    return (
+        str(mgmt_no) if mgmt_no is not None else "",
+        str(op_date) if op_date else "",
+        str(weekday) if weekday else "",
+        str(room),
+        start,
+        end,
+        str(category) if category else "",
+    )
+
+
+class CaseTable:
+    """手術記録の列指向テーブル"""
+
+    CODED_COLUMNS = ("date", "weekday", "room", "category")
+
+    def __init__(self):
+        self.mgmt_no = []
+        self.date = array("H")
+        self.weekday = array("H")
+        self.room = array("H")
+        self.category = array("H")
+        self.start = array("i")
+        self.end = array("i")
+        # コード → 文字列の表と、文字列 → コードの逆引き
+        self.labels = {name: [] for name in self.CODED_COLUMNS}
+        self._codes = {name: {} for name in self.CODED_COLUMNS}
+
+    def __len__(self):
+        return len(self.start)
+
+    def code(self, column, value):
+        """文字列をコード化する（未登録なら追加）"""
+        codes = self._codes[column]
+        c = codes.get(value)
+        if c is None:
+            c = codes[value] = len(self.labels[column])
+            self.labels[column].append(value)
+        return c
+
+    def append(self, mgmt_no, date, weekday, room, start, end, category):
+        """手術1件を追加する（start, end は分）"""
+        self.mgmt_no.append(mgmt_no)
+        self.date.append(self.code("date", date))
+        self.weekday.append(self.code("weekday", weekday))
+        self.room.append(self.code("room", room))
+        self.category.append(self.code("category", category))
+        self.start.append(start)
+        self.end.append(end)
+
+    def append_row(self, row):
+        """元データシートの1行（7列）を追加する。手術室が空欄の行は読み飛ばす"""
+        fields = row_fields(row)
+        if fields is not None:
+            self.append(*fields)
+
+    def cases(self):
+        """Case（文字列＋分）を1件ずつ返す"""
+        dates, weekdays = self.labels["date"], self.labels["weekday"]
+        rooms, categories = self.labels["room"], self.labels["category"]
+        for i in range(len(self.start)):
+            yield Case(self.mgmt_no[i], dates[self.date[i]], weekdays[self.weekday[i]],
+                       rooms[self.room[i]], self.start[i], self.end[i],
+                       categories[self.category[i]])
+
+
+def read_source(wb):
+    """開いたブックから (Definition, CaseTable) を読み込む"""
+    definition = read_definition(wb[DEFINITION_SHEET].iter_rows(values_only=True))
+
+    table = CaseTable()
+    ws_data = wb[DATA_SHEET]
+    for row in ws_data.iter_rows(min_row=2, values_only=True):
+        table.append_row(row)
+    return definition, table
+
+
+def parse_source(path):
+    """元データブックを読み取り専用（ストリーミング）で開いて (Definition, CaseTable) を読み込む
+
+    read_only モードではシートのXMLを1行ずつ解析するため、全セルを展開せずに済み、
+    読み込み時のメモリは行数によらずほぼ一定になる。
+    """
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return read_source(wb)
+    finally:
+        wb.close()
+
+
+def stream_source(path):
+    """元データブックを読み取り専用で開き、(Definition, Case を1件ずつ返すイテレータ) を返す
+
+    CaseTable を作らず、行を読むそばから渡す（日付順の流し込み集計用、キャッシュは使わない）。
+    ただし openpyxl は読み取り専用でも共有文字列表（sharedStrings）を開くときに全体で読み込むため、
+    その分のメモリは行数に比例する（有界にしたいときは CSV/TSV と csv_source.stream_csv を使う）。
+    イテレータを最後まで読むか close() するとブックを閉じる。
+    """
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        definition = read_definition(wb[DEFINITION_SHEET].iter_rows(values_only=True))
+        ws_data = wb[DATA_SHEET]
+    except Exception:
+        wb.close()
+        raise
+
+    def cases():
+        try:
+            for row in ws_data.iter_rows(min_row=2, values_only=True):
+                fields = row_fields(row)
+                if fields is not None:
+                    yield Case(*fields)
+        finally:
+            wb.close()
+
+    return definition, cases()
+
+
+def file_digest(path):
+    """ファイル内容の SHA-256（16進）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(path, digest):
+    """元データブックに対応するキャッシュファイルのパス（<ファイル名>-<ハッシュ>.pickle）"""
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"{os.path.basename(path)}-{digest}.pickle")
+
+
+def _read_cache(cpath):
+    try:
+        with open(cpath, "rb") as f:
+            version, definition, table = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+        return None
+    if version != CACHE_VERSION:
+        return None
+    return definition, table
+
+
+def _write_cache(cpath, definition, table):
+    """キャッシュを書き込み、同じ元データブックの古いキャッシュを削除する（書けなければ何もしない）"""
+    try:
+        os.makedirs(os.path.dirname(cpath), exist_ok=True)
+        tmp = f"{cpath}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((CACHE_VERSION, definition, table), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cpath)
+        # "<ファイル名>-<64桁の16進>.pickle" に一致するものだけ消す（data.xlsx と data-old.xlsx を区別する）
+        cache_dir, name = os.path.split(cpath)
+        prefix = name[:name.rindex("-") + 1]
+        own = re.compile(re.escape(prefix) + r"[0-9a-f]{64}\.pickle")
+        for old in glob.glob(os.path.join(glob.escape(cache_dir), glob.escape(prefix) + "*.pickle")):
+            if old != cpath and own.fullmatch(os.path.basename(old)):
+                os.remove(old)
+    except OSError:
+        pass
+
+
+def load_source(path, use_cache=True):
+    """元データブックから (Definition, CaseTable) を読み込む
+
+    定義シートは元データと同じブックにあるため、ブック全体の内容ハッシュをキーにすれば
+    元データ・定義のどちらが変わってもキャッシュは自動的に無効になる。
+    キャッシュには元データの部屋名のまま解析結果を保存する（部屋グループ（01A+01B）は集計時に適用する）。
+    """
+    if not use_cache:
+        return parse_source(path)
+    return load_cached(path, file_digest(path), parse_source)
+
+
+def load_cached(path, digest, parse):
+    """digest をキーにキャッシュから読み込み、なければ parse(path) で解析してキャッシュに書く
+
+    元データブック以外の入力（csv_source の CSV/TSV）も同じキャッシュを使う。
+    """
+    cpath = cache_path(path, digest)
+    cached = _read_cache(cpath)
+    if cached is not None:
+        return cached
+
+    definition, table = parse(path)
+    _write_cache(cpath, definition, table)
+    return definition, table
@@ -0,0 +1,126 @@
+"""
+日別の値の畳み込みと日付順の流し込み
+====================================
+集計は「日ごとのスナップショット値を求め、日の順に足し込む」だけなので、日別の値を全期間分
+並べておく必要はありません。SectionTotals は1区分の日別の値を受け取るたびに
+
+- 除外曜日以外の日の合計と日数（全体の平均行）
+- 曜日ごとの合計と日数（曜日別の行。除外曜日の日も含む: v4.0 と同じ）
+- 検証シートに書く日別値（小数第4位に丸めた値。シートに書く分だけ）
+- 部屋別内訳の部屋別の合計と日別の平均（部屋別内訳を出すとき）
+
+に畳み込みます。足す順序は全期間の行列から平均するときと同じ（日の初出順）なので、結果は一致します。
+
+--stream（calculate_timezone_usage）では、手術実施日の昇順に並んだ元データを day_chunks で1日分ずつ受け取り、
+その日の手術だけを占有キューブに入れて日別の値を求め、SectionTotals に畳み込んだら使用区間を捨てます
+（OccupancyCube.release）。手術記録の一覧は作らないので、手術のメモリは1日分（日付をまたぐ手術は前日分も）で済み、
+全期間で残るのは日付・曜日・区分別件数と、結果ブックに書く日別の値だけです。
+xlsx の元データでは openpyxl が共有文字列表（sharedStrings）をブック全体分読み込むので、
+メモリが期間によらず有界になるのは CSV/TSV の元データ（csv_source.stream_csv）のときです。
+日付が戻る（降順など）元データは、日ごとにまとまっていても足す順序が日付順と変わり、丸めた平均が
+並べ替えた元データと1桁ずれることがあるため、day_chunks で止めます。
+"""
+
+import room_breakdown
+from occupancy import day_ordinal
+
+
+class UnsortedInputError(ValueError):
+    """元データが手術実施日の順に並んでいない（日付順の流し込み集計ができない）"""
+
+
+def day_chunks(cases):
+    """手術実施日の昇順に並んだ手術を1日分ずつ (日付, [Case, ...]) で返す
+
+    同じ日付が離れた行に再び出てきたとき、または日付が前の日より前に戻ったとき UnsortedInputError
+    （日付順でない元データは流し込めない）。日付として解釈できない値は、離れた行に出てくるかだけを確かめる。
+    """
+    finished = set()
+    day = None
+    last_ordinal = None
+    chunk = []
+    for case in cases:
+        if case.date != day:
+            if chunk:
+                yield day, chunk
+            finished.add(day)
+            previous, day = day, case.date
+            if day in finished:
+                raise UnsortedInputError(f"元データが手術実施日の順に並んでいません（{day} の手術が離れた行にあります）。"
+                                         "--stream には手術実施日の順に並べた元データが必要です")
+            try:
+                ordinal = day_ordinal(day)
+            except ValueError:
+                ordinal = None
+            if ordinal is not None:
+                if last_ordinal is not None and ordinal < last_ordinal:
+                    raise UnsortedInputError(f"元データが手術実施日の順に並んでいません（{day} が前の日 {previous} より前です）。"
+                                             "--stream には手術実施日の昇順に並べた元データが必要です")
+                last_ordinal = ordinal
+            chunk = []
+        chunk.append(case)
+    if chunk:
+        yield day, chunk
+
+
+class SectionTotals:
+    """1区分の日別のスナップショット値を日の順に畳み込む（日別の値そのものは検証シートの分だけ持つ）"""
+
+    def __init__(self, num_snaps, exclude_weekdays, units=None):
+        self.num_snaps = num_snaps
+        self.exclude_weekdays = exclude_weekdays
+        self.totals = [0.0] * num_snaps    # 除外曜日以外の日の合計
+        self.day_indices = []              # 除外曜日以外の日idx（件数の集計用）
+        self.weekday_totals = {}           # {曜日: [合計, ...]}
+        self.weekday_days = {}             # {曜日: 日数}
+        self.by_day = {}                   # {日付: [val(小数第4位), ...]}（除外曜日以外）
+        self.units = units                 # 部屋別内訳の単位のリスト（None なら部屋別は持たない）
+        self.unit_totals = {unit: [0.0] * num_snaps for unit in units or ()}
+        self.unit_by_day = {}              # {日付: {部屋: val(小数第4位)}}
+
+    def add(self, di, date, weekday, values, unit_values=None):
+        """1日分の値（丸めなし）を足し込む。unit_values は部屋別の値 {部屋: [val, ...]}"""
+        weekday_totals = self.weekday_totals.setdefault(weekday, [0.0] * self.num_snaps)
+        for si, val in enumerate(values):
+            weekday_totals[si] += val
+        self.weekday_days[weekday] = self.weekday_days.get(weekday, 0) + 1
+        if weekday in self.exclude_weekdays:
+            return
+
+        self.day_indices.append(di)
+        for si, val in enumerate(values):
+            self.totals[si] += val
+        self.by_day[date] = [round(v, 4) for v in values]
+        if self.units is not None:
+            for unit, totals in self.unit_totals.items():
+                for si, val in enumerate(unit_values.get(unit, ())):
+                    totals[si] += val
+            self.unit_by_day[date] = room_breakdown.day_averages(unit_values, self.units, self.num_snaps)
+
+    @staticmethod
+    def _mean(totals, num_days):
+        """日平均（小数第2位）"""
+        if num_days == 0:
+            return [0.0] * len(totals)
+        return [round(t / num_days, 2) for t in totals]
+
+    def mean(self):
+        """除外曜日以外の日のスナップショットごとの日平均"""
+        return self._mean(self.totals, len(self.day_indices))
+
+    def weekday_mean(self, weekday):
+        """指定曜日の日のスナップショットごとの日平均と日数"""
+        num_days = self.weekday_days.get(weekday, 0)
+        return self._mean(self.weekday_totals.get(weekday, [0.0] * self.num_snaps), num_days), num_days
+
+    def day_table(self):
+        """検証シート用の日別値を日付順に返す: {日付: [val(小数第4位), ...]}"""
+        return {d: self.by_day[d] for d in sorted(self.by_day)}
+
+    def unit_snapshot_table(self):
+        """部屋 × 時刻（対象日の日平均）"""
+        return room_breakdown.snapshot_table(self.unit_totals, len(self.day_indices), self.units)
+
+    def unit_day_table(self):
+        """部屋 × 日（日付順）"""
+        return {d: self.unit_by_day[d] for d in sorted(self.unit_by_day)}
@@ -0,0 +1,187 @@
+"""
+合成手術データ生成
+==================
+ベンチマーク・動作確認用に、元データブック（時間帯別稼働推移元データ.xlsx）と
+同じ形式の合成データを生成します。乱数シードが同じなら、同じ引数からは常に同じデータになります。
+
+- 平日: 各室で朝の入室から、手術時間（対数正規分布）と入替時間を挟んで順に手術を入れる
+- 実施申込区分: 予定枠は 定時／臨時 の比率で割り振り、緊急は予定件数に比例して任意の時刻・部屋に追加
+- 01A/01B のような対の部屋: 一部の日は 01B（ウェイト0）を使う
+- 土日: 緊急のみ（除外曜日の確認用）
+
+使い方:
+    python synthetic_data.py 出力.xlsx [--days 365] [--rooms 30] [--start 2025/04/01] [--seed 1]
+"""
+
+import argparse
+import datetime as dt
+import math
+import random
+
+import openpyxl
+
+from source_data import DATA_SHEET, DEFINITION_SHEET, EXCLUDE_LABEL
+
+WEEKDAY_NAMES = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+DATA_HEADER = ("手術実施管理番号", "手術実施日", "曜日", "実施手術室名", "入室時刻", "麻酔終了時刻", "実施申込区分")
+
+# 実施申込区分の構成比（元データ1か月分とほぼ同じ）
+CATEGORY_MIX = {"定時": 0.83, "臨時": 0.13, "緊急": 0.04}
+
+
+def room_names(num_rooms, paired_rooms=1):
+    """手術室名とウェイトの並び: [(部屋名, ウェイト), ...]
+
+    先頭の paired_rooms 室は "01A"(1) / "01B"(0) のような対の部屋にする。
+    """
+    rooms = []
+    for i in range(1, num_rooms + 1):
+        if i <= paired_rooms:
+            rooms.append((f"{i:02d}A", 1))
+            rooms.append((f"{i:02d}B", 0))
+        else:
+            rooms.append((f"{i:02d}", 1))
+    return rooms
+
+
+def _minutes_to_time(m):
+    return dt.time(m // 60, m % 60)
+
+
+def generate_rows(num_days=30, rooms=None, start_date=dt.date(2025, 4, 1), seed=1,
+                  duration_median=120, duration_sigma=0.6, duration_range=(20, 600),
+                  turnover_range=(15, 45), first_start_range=(8 * 60 + 30, 9 * 60 + 15),
+                  last_start=16 * 60 + 30, room_open_rate=0.9, paired_use_rate=0.2,
+                  category_mix=CATEGORY_MIX, weekend_emergency_rate=0.5):
+    """元データシートの行（7列のタプル）を日付順に返す
+
+    num_days: 開始日からの暦日数（土日を含む）
+    rooms: room_names() の形式。省略時は10室（01A/01B 対あり）
+    duration_*: 手術時間（分）の中央値・対数標準偏差・下限上限
+    turnover_range: 同じ部屋の次の手術までの入替時間（分）
+    first_start_range / last_start: 朝一番の入室時刻の範囲、予定手術の最終入室時刻
+    room_open_rate: 平日に各室が稼働する確率
+    paired_use_rate: 対の部屋で、その日の予定手術を B 側で行う確率
+    weekend_emergency_rate: 土日1日あたりの緊急手術件数の期待値
+    """
+    rng = random.Random(seed)
+    rooms = rooms if rooms is not None else room_names(10)
+    weighted = [name for name, weight in rooms if weight > 0]
+    # ウェイト0の部屋 → 対になるウェイト>0の部屋（"01B" → "01A"）
+    partner = {}
+    for name, weight in rooms:
+        if weight == 0 and name[-1].isalpha():
+            partner[name[:-1] + "A"] = name
+
+    sched_total = category_mix["定時"] + category_mix["臨時"]
+    urgent_rate = category_mix["臨時"] / sched_total
+    emergency_per_case = category_mix["緊急"] / sched_total
+    mu = math.log(duration_median)
+    low, high = duration_range
+
+    def duration():
+        return int(min(max(rng.lognormvariate(mu, duration_sigma), low), high))
+
+    def emergency(room_choices, day_start, day_end):
+        start = rng.randint(day_start, day_end)
+        end = min(start + duration(), 23 * 60 + 59)
+        return (rng.choice(room_choices), start, end, "緊急")
+
+    mgmt_no = 1000000000
+    for day_offset in range(num_days):
+        date = start_date + dt.timedelta(days=day_offset)
+        weekday = WEEKDAY_NAMES[date.weekday()]
+        cases = []
+        if date.weekday() < 5:
+            for room in weighted:
+                if rng.random() >= room_open_rate:
+                    continue
+                room_used = room
+                if room in partner and rng.random() < paired_use_rate:
+                    room_used = partner[room]
+                t = rng.randint(*first_start_range)
+                while t <= last_start:
+                    end = min(t + duration(), 23 * 60 + 59)
+                    category = "臨時" if rng.random() < urgent_rate else "定時"
+                    cases.append((room_used, t, end, category))
+                    t = end + rng.randint(*turnover_range)
+            num_scheduled = len(cases)
+            for _ in range(num_scheduled):
+                if rng.random() < emergency_per_case:
+                    cases.append(emergency(weighted, 8 * 60, 22 * 60))
+        else:
+            while rng.random() < weekend_emergency_rate / (1 + weekend_emergency_rate):
+                cases.append(emergency(weighted, 0, 22 * 60))
+
+        cases.sort(key=lambda c: (c[1], c[0]))
+        date_str = date.strftime("%Y/%m/%d")
+        for room, start, end, category in cases:
+            mgmt_no += 1
+            yield (str(mgmt_no), date_str, weekday, room,
+                   _minutes_to_time(start), _minutes_to_time(end), category)
+
+
+def write_workbook(path, rows, rooms, exclude_weekdays=("土曜日", "日曜日")):
+    """元データ・定義・計算結果（見出しのみ）の3シートのブックを書き出す（書き込み専用モード）"""
+    wb = openpyxl.Workbook(write_only=True)
+
+    ws_data = wb.create_sheet(DATA_SHEET)
+    ws_data.append(DATA_HEADER)
+    for row in rows:
+        ws_data.append(row)
+
+    ws_def = wb.create_sheet(DEFINITION_SHEET)
+    ws_def.append(("手術室", "ウェイト"))
+    for name, weight in rooms:
+        ws_def.append((name, weight))
+    ws_def.append(())
+    ws_def.append((EXCLUDE_LABEL,))
+    for weekday in exclude_weekdays:
+        ws_def.append((weekday,))
+
+    # 計算結果シート: 全体（1〜3行目）と曜日別（5行目から5行おき）の見出し
+    ws_result = wb.create_sheet("計算結果")
+    header = ["集計結果"] + [_minutes_to_time(8 * 60 + 30 * i) for i in range(25)]
+    ws_result.append(header)
+    ws_result.append(("全手術（緊急含む）",))
+    ws_result.append(("予定手術のみ",))
+    for weekday in WEEKDAY_NAMES[:6]:
+        ws_result.append(())
+        ws_result.append((weekday,))
+        ws_result.append(header)
+        ws_result.append(("全手術（緊急含む）",))
+        ws_result.append(("予定手術のみ",))
+
+    wb.save(path)
+
+
+def generate_workbook(path, num_days=30, num_rooms=10, start_date=dt.date(2025, 4, 1), seed=1, **options):
+    """合成データのブックを生成し、書き込んだ手術件数を返す"""
+    rooms = room_names(num_rooms)
+    count = [0]
+
+    def counted(rows):
+        for row in rows:
+            count[0] += 1
+            yield row
+
+    write_workbook(path, counted(generate_rows(num_days, rooms, start_date, seed, **options)), rooms)
+    return count[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成の手術データブックを生成します")
+    parser.add_argument("output", help="出力するxlsxのパス")
+    parser.add_argument("--days", type=int, default=30, help="暦日数（既定: 30）")
+    parser.add_argument("--rooms", type=int, default=10, help="手術室数（01A/01Bの対は1室と数える、既定: 10）")
+    parser.add_argument("--start", default="2025/04/01", help="開始日 YYYY/MM/DD（既定: 2025/04/01）")
+    parser.add_argument("--seed", type=int, default=1, help="乱数シード（既定: 1）")
+    args = parser.parse_args(argv)
+
+    start_date = dt.datetime.strptime(args.start, "%Y/%m/%d").date()
+    count = generate_workbook(args.output, args.days, args.rooms, start_date, args.seed)
+    print(f"{args.output}: {args.days}日, {args.rooms}室, {count}件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""calculate_timezone_usage の複数構成の集計（run_configs）の確認
+
+    python -m unittest test_calculate_timezone_usage
+"""
+
+import contextlib
+import datetime as dt
+import io
+import os
+import tempfile
+import unittest
+
+from calculate_timezone_usage import RunConfig, run_configs
+from synthetic_data import write_workbook
+
+ROOMS = [("01A", 1), ("01B", 0), ("02", 1)]
+
+
+def case(no, day, weekday, room, start, end, category="定時"):
+    return (no, day, weekday, room, dt.time(*start), dt.time(*end), category)
+
+
+# 4/2 は 01B（ウェイト0、部屋グループ 01A+01B の構成部屋）の手術だけの日
+ROWS = [
+    case(1, "2025/04/01", "火曜日", "01A", (9, 0), (10, 0)),
+    case(2, "2025/04/01", "火曜日", "02", (9, 0), (12, 0)),
+    case(3, "2025/04/02", "水曜日", "01B", (9, 0), (11, 0)),
+    case(4, "2025/04/03", "木曜日", "02", (13, 0), (14, 0), "緊急"),
+    case(5, "2025/04/03", "木曜日", "01B", (8, 30), (9, 30), "臨時"),
+]
+
+
+class MultiConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.tmp.name, "元データ.xlsx")
+        write_workbook(self.input_file, ROWS, ROOMS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def configs(self, suffix):
+        # grouped: 定義の部屋グループ（01A+01B）で数える、rooms: 部屋グループなし（01B は数えない）
+        return [RunConfig("grouped", os.path.join(self.tmp.name, f"grouped-{suffix}.xlsx")),
+                RunConfig("rooms", os.path.join(self.tmp.name, f"rooms-{suffix}.xlsx"), room_groups=[])]
+
+    def run_quietly(self, configs, **options):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_configs(self.input_file, configs, **options)
+
+    def test_two_configs_match_single_runs(self):
+        for options in ({}, {"engine": "epoch"}, {"stream": True}):
+            together = self.run_quietly(self.configs("multi"), **options)
+            for config in self.configs("single"):
+                alone = self.run_quietly([config], **options)[config.name]
+                self.assertEqual(together[config.name], alone, (config.name, options))
+
+    def test_days_and_counts_follow_config_rooms(self):
+        results = self.run_quietly(self.configs("multi"))
+        self.assertEqual((results["grouped"]["num_days"], results["grouped"]["case_count"]), (3, 5))
+        self.assertEqual((results["rooms"]["num_days"], results["rooms"]["case_count"]), (2, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""cross_check の全セル照合（verify）の確認
+
+    python -m unittest test_cross_check
+"""
+
+import unittest
+
+from cross_check import VerificationError, verify
+from occupancy import OccupancyCube, TimeGrid
+from source_data import Case, RoomGroup
+
+ROOM_WEIGHT = {"01A": 1.0, "02": 1.0}
+GROUPS = [RoomGroup("01A", ("01A", "01B"), 1.0, 1)]
+GRID = TimeGrid.minutes(9 * 60, 10 * 60, 30, 30)
+
+CASES = [
+    Case("1", "2025/04/01", "火曜日", "01A", 9 * 60, 9 * 60 + 29, "定時"),
+    Case("2", "2025/04/01", "火曜日", "01B", 9 * 60 + 15, 9 * 60 + 44, "定時"),
+    Case("3", "2025/04/01", "火曜日", "02", 9 * 60 + 30, 10 * 60 + 29, "緊急"),
+    Case("4", "2025/04/02", "水曜日", "02", 9 * 60, 9 * 60 + 14, "定時"),
+]
+
+
+def main_values():
+    """本計算（OccupancyCube）の日別の値 ({日idx: [値, ...]}, 日付のリスト)"""
+    cube = OccupancyCube.build(((c.date, c.weekday, c.room, c.category, c.start, c.end) for c in CASES),
+                               GRID.span_minutes()[0], GRID.span_minutes()[1])
+    matrix = {di: GRID.averages(cube.timeline(di, ROOM_WEIGHT, None, GROUPS)) for di in cube.select_days()}
+    return matrix, cube.days
+
+
+class VerifyTest(unittest.TestCase):
+    def test_matching_values(self):
+        matrix, days = main_values()
+        # 4/1 9:00 は 01A+01B（上限1室）だけ 1.0、9:30 は 01B の 9:30〜9:44 と 02 で 1.5
+        self.assertEqual(matrix[0], [1.0, 1.5, 1.0])
+        checked = verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days)
+        self.assertEqual(checked["cells"], 6)
+        self.assertEqual(checked["max"], (1.5, "2025/04/01", "9:30", "合計"))
+        self.assertEqual(checked["capacity"], 2.0)
+
+    def test_mismatch_names_room(self):
+        matrix, days = main_values()
+        # 4/2 は 02 の 9:00〜9:14 だけ（9:00 は 0.5）。本計算が 02 を落としたとする
+        self.assertEqual(matrix[1], [0.5, 0.0, 0.0])
+        matrix[1] = [0.0, 0.0, 0.0]
+        with self.assertRaises(VerificationError) as raised:
+            verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days,
+                   main_units=lambda index, di: {"01A": [0.0, 0.0, 0.0]})
+        message = str(raised.exception)
+        self.assertIn("1 件の不一致", message)
+        self.assertIn("2025/04/02 9:00 合計 部屋=02: 本計算=0.000000 照合=0.500000", message)
+
+    def test_over_capacity(self):
+        matrix, days = main_values()
+        matrix[0] = [1.0, 2.5, 1.0]
+        with self.assertRaisesRegex(VerificationError, "本計算=2.500000 照合=1.500000 上限=2.0"):
+            verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days)
+
+    def test_missing_day(self):
+        matrix, days = main_values()
+        del matrix[1]
+        with self.assertRaisesRegex(VerificationError, "2025/04/02 合計: 本計算に日がありません"):
+            verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days)
+        # 区分のフィルタに合う手術がない日・除外曜日の日はなくてよい
+        verify([("緊急", lambda c: c.category == "緊急", {0: [0.0, 1.0, 1.0]})],
+               CASES, ROOM_WEIGHT, GROUPS, GRID, days)
+        verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days,
+               exclude_weekdays={"水曜日"})
+
+    def test_overnight_spill_day(self):
+        # 土曜 23:00〜日曜 0:59 の手術だけ。日曜は前日からまたぐ分だけの日
+        cases = [Case("1", "2025/04/05", "土曜日", "02", 23 * 60, 59, "緊急")]
+        grid = TimeGrid.minutes(0, 30, 30, 30)
+        days = ["2025/04/05", "2025/04/06"]
+        sections = [("合計", lambda c: True, {0: [0.0, 0.0], 1: [1.0, 1.0]})]
+        checked = verify(sections, cases, ROOM_WEIGHT, GROUPS, grid, days, overnight=True,
+                         day_weekdays=["土曜日", "日曜日"])
+        self.assertEqual(checked["cells"], 4)
+        with self.assertRaisesRegex(VerificationError, "2025/04/06 合計: 本計算に日がありません"):
+            verify([("合計", lambda c: True, {0: [0.0, 0.0]})], cases, ROOM_WEIGHT, GROUPS, grid, days,
+                   overnight=True, day_weekdays=["土曜日", "日曜日"])
+        verify([("合計", lambda c: True, {0: [0.0, 0.0]})], cases, ROOM_WEIGHT, GROUPS, grid, days,
+               overnight=True, exclude_weekdays={"日曜日"}, day_weekdays=["土曜日", "日曜日"])
+
+    def test_only_days(self):
+        matrix, days = main_values()
+        matrix[1] = [9.0, 9.0, 9.0]
+        checked = verify([("合計", lambda c: True, matrix)], CASES, ROOM_WEIGHT, GROUPS, GRID, days,
+                         only_days={0})
+        self.assertEqual(checked["cells"], 3)
+
+    def test_reports_at_most_max_reported(self):
+        matrix, days = main_values()
+        sections = [(f"区分{i}", lambda c: True, {di: [v + 0.25 for v in values] for di, values in matrix.items()})
+                    for i in range(2)]
+        with self.assertRaisesRegex(VerificationError, "12 件の不一致(.|\n)*ほか 2 件"):
+            verify(sections, CASES, ROOM_WEIGHT, GROUPS, GRID, days)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""csv_source の CSV/TSV 取り込み（文字コード・区切り文字・列の対応）の確認
+
+    python -m unittest test_csv_source
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import csv_source
+from csv_source import CsvImport, load_csv, load_import_config, stream_csv
+
+DEFINITION = {"rooms": {"01A": 1.0, "01B": 0, "02": 1.0}, "exclude_weekdays": ["土曜日", "日曜日"],
+              "room_groups": [{"name": "01", "members": ["01A", "01B"]}]}
+
+HEADER = "手術実施管理番号,手術実施日,曜日,実施手術室名,入室時刻,麻酔終了時刻,実施申込区分\n"
+ROWS = ("1,2025/04/01,火曜日,01A,8:30,10:15,定時\n"
+        "2,2025-04-02,,02,2025/04/02 13:00,14:05:00,緊急\n"
+        "3,20250403,木曜日,,9:00,10:00,定時\n"
+        "4,2025/04/03,木曜日,02,,,臨時\n")
+
+
+class CsvSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text, encoding="utf-8"):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding=encoding, newline="") as f:
+            f.write(text)
+        return path
+
+    def cases(self, path, **options):
+        _, cases = stream_csv(path, CsvImport(None, definition=DEFINITION, **options))
+        return list(cases)
+
+    def test_rows(self):
+        cases = self.cases(self.write("a.csv", HEADER + ROWS))
+        # 手術室が空欄の行は読み飛ばす。日付は "YYYY/MM/DD" にそろえ、曜日の空欄は日付から求める
+        self.assertEqual([(c.mgmt_no, c.date, c.weekday, c.room, c.start, c.end, c.category) for c in cases], [
+            ("1", "2025/04/01", "火曜日", "01A", 510, 615, "定時"),
+            ("2", "2025/04/02", "", "02", 780, 845, "緊急"),
+            ("4", "2025/04/03", "木曜日", "02", 0, -1, "臨時"),
+        ])
+
+    def test_encodings(self):
+        expected = self.cases(self.write("utf8.csv", HEADER + ROWS))
+        for name, encoding in (("bom.csv", "utf-8-sig"), ("sjis.csv", "cp932")):
+            path = self.write(name, HEADER + ROWS, encoding)
+            self.assertEqual(csv_source.detect_encoding(path), encoding)
+            self.assertEqual(self.cases(path), expected)
+        self.assertEqual(csv_source.detect_encoding(self.write("ascii.csv", "a,b\n1,2\n")), "utf-8")
+        # 先頭のかたまりが ASCII だけでも、後ろの CP932 を判定する
+        path = self.write("late.csv", "x" * (csv_source.DETECT_CHUNK + 10) + "\n手術\n", "cp932")
+        self.assertEqual(csv_source.detect_encoding(path), "cp932")
+
+    def test_delimiters(self):
+        expected = self.cases(self.write("a.csv", HEADER + ROWS))
+        tsv = (HEADER + ROWS).replace(",", "\t")
+        self.assertEqual(self.cases(self.write("a.tsv", tsv)), expected)
+        self.assertEqual(self.cases(self.write("tab.txt", tsv)), expected)
+        self.assertEqual(self.cases(self.write("semi.txt", (HEADER + ROWS).replace(",", ";")), delimiter=";"),
+                         expected)
+
+    def test_column_mapping(self):
+        text = ("申込区分,手術室,実施日,入室,麻酔終了\n"
+                "定時,01A,2025/04/05,9:00,9:30\n")
+        columns = {"手術実施日": "実施日", "実施手術室名": 2, "入室時刻": "入室", "麻酔終了時刻": "麻酔終了",
+                   "実施申込区分": "申込区分"}
+        cases = self.cases(self.write("mapped.csv", text), columns=columns)
+        self.assertEqual([(c.mgmt_no, c.date, c.weekday, c.room, c.start, c.end, c.category) for c in cases],
+                         [("", "2025/04/05", "土曜日", "01A", 540, 570, "定時")])
+
+    def test_column_errors(self):
+        path = self.write("a.csv", HEADER + ROWS)
+        with self.assertRaisesRegex(ValueError, "'実施手術室名' の列（見出し '手術室'）がありません"):
+            self.cases(path, columns={"実施手術室名": "手術室"})
+        with self.assertRaisesRegex(ValueError, "列番号は1以上"):
+            self.cases(path, columns={"実施手術室名": 0})
+        with self.assertRaisesRegex(ValueError, "'入室時刻' の列"):
+            self.cases(self.write("b.csv", "手術実施日,実施手術室名\n2025/04/01,01A\n"))
+
+    def test_bad_time(self):
+        path = self.write("bad.csv", HEADER + "1,2025/04/01,火曜日,01A,朝,10:00,定時\n")
+        with self.assertRaisesRegex(ValueError, "bad.csv の 2行目: 時刻を解釈できません"):
+            self.cases(path)
+
+    def test_import_config(self):
+        config = os.path.join(self.tmp.name, "取り込み.json")
+        with open(config, "w", encoding="utf-8") as f:
+            json.dump({"workbook": "定義.xlsx", "encoding": "cp932", "columns": {"実施手術室名": "手術室"}}, f)
+        loaded = load_import_config(config)
+        self.assertEqual(loaded.workbook, os.path.join(self.tmp.name, "定義.xlsx"))
+        self.assertEqual((loaded.encoding, loaded.delimiter), ("cp932", "auto"))
+        for data, message in (({"encode": "cp932"}, "不明な項目"), ({"columns": {"部屋": "手術室"}}, "columns に不明な項目")):
+            with open(config, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            with self.assertRaisesRegex(ValueError, message):
+                load_import_config(config)
+
+    def test_definition_and_cache(self):
+        path = self.write("a.csv", HEADER + ROWS)
+        csv_import = CsvImport(None, definition=DEFINITION)
+        definition, table = load_csv(path, csv_import)
+        self.assertEqual(definition.room_weight_raw, {"01A": 1.0, "01B": 0.0, "02": 1.0})
+        self.assertEqual([g.members for g in definition.room_groups], [("01A", "01B")])
+        self.assertEqual(len(list(table.cases())), 3)
+        # 2回目はキャッシュから同じ内容
+        _, cached = load_csv(path, csv_import)
+        self.assertEqual(list(cached.cases()), list(table.cases()))
+        with self.assertRaisesRegex(ValueError, "rooms"):
+            load_csv(path, CsvImport(None, definition={"rooms": {}}), use_cache=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""incremental の差分再計算（DayCache）の確認
+
+    python -m unittest test_incremental
+"""
+
+import unittest
+
+from incremental import DayCache, cases_by_mgmt_no, diff_cases
+from source_data import Case, Definition
+
+DEFINITION = Definition({"01": 1.0, "02": 1.0}, {"土曜日", "日曜日"})
+
+CASES = [
+    Case("1", "2025/04/01", "火曜日", "01", 9 * 60, 10 * 60, "定時"),
+    Case("2", "2025/04/02", "水曜日", "02", 13 * 60, 14 * 60, "定時"),
+    Case("3", "2025/04/04", "金曜日", "01", 23 * 60, 60, "緊急"),
+    Case("", "2025/04/03", "木曜日", "02", 9 * 60, 9 * 60 + 30, "臨時"),
+]
+
+SECTION = ("全体", "定時")
+
+
+def replace(index, **fields):
+    cases = list(CASES)
+    cases[index] = cases[index]._replace(**fields)
+    return cases
+
+
+class DiffCasesTest(unittest.TestCase):
+    def test_added_removed_modified(self):
+        old = cases_by_mgmt_no(CASES)
+        new_case = Case("5", "2025/04/07", "月曜日", "01", 9 * 60, 10 * 60, "定時")
+        new = cases_by_mgmt_no(replace(0, end=11 * 60) + [new_case])
+        self.assertEqual(diff_cases(old, new), (1, 0, 1, {"2025/04/01", "2025/04/07"}))
+        self.assertEqual(diff_cases(old, cases_by_mgmt_no(CASES[1:])), (0, 1, 0, {"2025/04/01"}))
+
+    def test_moved_case_marks_both_dates(self):
+        old = cases_by_mgmt_no(CASES)
+        new = cases_by_mgmt_no(replace(1, date="2025/04/03", weekday="木曜日"))
+        self.assertEqual(diff_cases(old, new), (0, 0, 1, {"2025/04/02", "2025/04/03"}))
+
+    def test_blank_and_duplicate_mgmt_no(self):
+        # 管理番号が空欄の手術が1件増えても、空欄の組の変更として拾う
+        extra = Case("", "2025/04/07", "月曜日", "01", 9 * 60, 10 * 60, "定時")
+        self.assertEqual(diff_cases(cases_by_mgmt_no(CASES), cases_by_mgmt_no(CASES + [extra])),
+                         (0, 0, 1, {"2025/04/03", "2025/04/07"}))
+        # 並び順だけが違うのは変更ではない
+        self.assertEqual(diff_cases(cases_by_mgmt_no(CASES + [extra]), cases_by_mgmt_no([extra] + CASES)),
+                         (0, 0, 0, set()))
+
+
+class DayCacheTest(unittest.TestCase):
+    def test_first_update_computes_all(self):
+        cache = DayCache()
+        self.assertIsNone(cache.update(DEFINITION, CASES))
+        self.assertIsNone(cache.changed)
+        self.assertIsNone(cache.get(SECTION, "2025/04/01"))
+
+    def test_reuses_unchanged_days(self):
+        cache = DayCache()
+        cache.update(DEFINITION, CASES)
+        for date in ("2025/04/01", "2025/04/02"):
+            cache.put(SECTION, date, [1.0], {"01": [1.0]})
+        cache.put(("全体", "緊急"), "2025/04/01", [0.0])
+        self.assertEqual(cache.recomputed, 3)
+
+        self.assertEqual(cache.update(DEFINITION, replace(0, start=8 * 60)), (0, 0, 1, {"2025/04/01"}))
+        self.assertEqual(cache.changed, {"2025/04/01"})
+        self.assertEqual((cache.recomputed, cache.reused), (0, 0))
+        self.assertIsNone(cache.get(SECTION, "2025/04/01"))
+        self.assertEqual(cache.get(SECTION, "2025/04/02", with_units=True), ([1.0], {"01": [1.0]}))
+        # 覚えていない日・部屋別の値を持たない区分は計算し直す
+        self.assertIsNone(cache.get(SECTION, "2025/04/03"))
+        self.assertIsNone(cache.get(("全体", "緊急"), "2025/04/02", with_units=True))
+        self.assertEqual(cache.reused, 1)
+
+    def test_overnight_includes_next_day(self):
+        cache = DayCache()
+        cache.update(DEFINITION, CASES, overnight=True)
+        diff = cache.update(DEFINITION, replace(0, end=11 * 60), overnight=True)
+        self.assertEqual(diff[3], {"2025/04/01"})
+        self.assertEqual(cache.changed, {"2025/04/01", "2025/04/02"})
+        # 金曜 23:00〜土曜 1:00 の手術: 土曜には手術がなくても、またぐ分だけの日を計算し直す
+        cache.update(DEFINITION, CASES, overnight=True)
+        cache.update(DEFINITION, replace(2, start=22 * 60), overnight=True)
+        self.assertEqual(cache.changed, {"2025/04/04", "2025/04/05"})
+        cache.update(DEFINITION, replace(2, start=21 * 60), overnight=False)
+        self.assertEqual(cache.changed, {"2025/04/04"})
+
+    def test_definition_change_resets(self):
+        cache = DayCache()
+        cache.update(DEFINITION, CASES)
+        cache.put(SECTION, "2025/04/02", [1.0])
+        self.assertIsNone(cache.update(Definition({"01": 1.0, "02": 0.5}, {"土曜日", "日曜日"}), CASES))
+        self.assertIsNone(cache.changed)
+        self.assertEqual(cache.values, {})
+        # 定義が同じで手術も同じなら何も計算し直さない
+        cache.put(SECTION, "2025/04/02", [1.0])
+        self.assertEqual(cache.update(Definition({"01": 1.0, "02": 0.5}, {"日曜日", "土曜日"}), CASES),
+                         (0, 0, 0, set()))
+        self.assertEqual(cache.get(SECTION, "2025/04/02"), ([1.0], None))
+
+    def test_reset(self):
+        cache = DayCache()
+        cache.update(DEFINITION, CASES)
+        cache.put(SECTION, "2025/04/02", [1.0])
+        cache.reset()
+        self.assertIsNone(cache.update(DEFINITION, CASES))
+        self.assertIsNone(cache.get(SECTION, "2025/04/02"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""occupancy の時間グリッド（TimeGrid）・使用区間の索引（CoverageIndex）・日付をまたぐ手術（EpochOccupancy）の確認
+
+    python -m unittest test_occupancy
+"""
+
+import unittest
+
+from occupancy import DAY_MINUTES, CoverageIndex, DayTimeline, EpochOccupancy, OccupancyCube, TimeGrid, next_day
+
+ROOM_WEIGHT = {"01": 1.0}
+
+
+def build(engine, cases):
+    return engine.build(cases, 0, 24 * 60 - 1)
+
+
+class TimeGridTest(unittest.TestCase):
+    def test_default_snapshot_grid(self):
+        grid = TimeGrid.parse("8:00-20:00/30/30")
+        self.assertEqual(len(grid.points()), 25)
+        self.assertEqual(grid.minute_windows()[:2], [(480, 509), (510, 539)])
+        self.assertEqual(grid.span_minutes(), (480, 1229))
+        self.assertEqual(grid.labels()[-1], "20:00")
+
+    def test_end_is_upper_bound(self):
+        # 9:00-16:59 を3分おき: 最後の評価時刻は 16:57
+        grid = TimeGrid.parse("9:00-16:59/3/3")
+        self.assertEqual(len(grid.points()), 160)
+        self.assertEqual(grid.labels()[-1], "16:57")
+
+    def test_anchors(self):
+        self.assertEqual(TimeGrid.parse("9:00-9:00/30/30/center").minute_windows(), [(525, 554)])
+        # end は評価時刻で終わる窓（秒で [t-1799, t]）なので分の境界にそろわない
+        end = TimeGrid.parse("9:00-9:00/30/30/終了")
+        self.assertEqual(end.windows(), [(32400 - 1799, 32400)])
+        self.assertFalse(end.is_minute_aligned())
+        self.assertEqual(TimeGrid.parse("9:00-9:00/30/30/-14").minute_windows(), [(526, 555)])
+        self.assertEqual(TimeGrid.minutes(540, 540, 30, 30, -14).windows(), [(526 * 60, 556 * 60 - 1)])
+
+    def test_seconds_grid(self):
+        grid = TimeGrid.parse("9:00-9:01/20s/20秒")
+        self.assertEqual(grid.points(), [32400, 32420, 32440, 32460])
+        self.assertFalse(grid.is_minute_aligned())
+        with self.assertRaises(ValueError):
+            grid.minute_windows()
+        # 9:00〜9:00（1分）だけ使用中: 9:00:00〜9:00:59 の3窓は 1.0、9:01:00 の窓は 0.0
+        timeline = DayTimeline({"01": [(540, 540)]}, {"01": 1.0})
+        self.assertEqual(grid.averages(timeline), [1.0, 1.0, 1.0, 0.0])
+
+    def test_span_is_clipped_to_day(self):
+        self.assertEqual(TimeGrid.parse("0:00-23:30/30/60/center").span_minutes(), (0, DAY_MINUTES - 1))
+
+    def test_invalid(self):
+        for spec in ("8:00-20:00/30", "8:00/30/30", "20:00-8:00/30/30", "8:00-20:00/0/30",
+                     "8:00-20:00/30/30/middle", "8:00-20:00/x/30", "8:00:00:00-9:00/30/30"):
+            with self.assertRaises(ValueError, msg=spec):
+                TimeGrid.parse(spec)
+
+    def test_from_settings(self):
+        default = TimeGrid.minutes(480, 1200, 30, 30)
+        self.assertIs(TimeGrid.from_settings({}, default), default)
+        grid = TimeGrid.from_settings({"開始": "9:00", "間隔": 15, "基準": "中央"}, default)
+        self.assertEqual((grid.start, grid.end, grid.step, grid.window, grid.anchor),
+                         (32400, 72000, 900, 1800, "center"))
+        with self.assertRaisesRegex(ValueError, "定義シートの時間グリッド設定が不正です"):
+            TimeGrid.from_settings({"間隔": "abc"}, default)
+
+
+class CoverageIndexTest(unittest.TestCase):
+    def test_union_of_overlapping_and_touching(self):
+        # 重なる手術・入替で同じ1分を共有する前後の手術・開始 > 終了 の区間
+        index = CoverageIndex([(540, 599), (570, 629), (629, 659), (700, 690)])
+        self.assertEqual((index.starts, index.ends), ([540], [659]))
+        self.assertEqual(index.covered_minutes(0, DAY_MINUTES - 1), 120)
+
+    def test_partial_windows(self):
+        index = CoverageIndex([(540, 549), (560, 569)])
+        self.assertEqual(index.covered_minutes(545, 564), 10)
+        self.assertEqual(index.covered_minutes(550, 559), 0)
+        self.assertEqual(index.covered_minutes(569, 540), 0)
+        self.assertEqual(index.covered_until(539), 0)
+        self.assertEqual(index.covered_until(10_000), 20)
+
+    def test_seconds(self):
+        index = CoverageIndex([(540, 540)])
+        self.assertEqual(index.covered_seconds(540 * 60, 541 * 60 - 1), 60)
+        self.assertEqual(index.covered_seconds(540 * 60 + 30, 541 * 60 + 29), 30)
+        self.assertEqual(index.covered_seconds(539 * 60 + 50, 540 * 60 + 9), 10)
+        self.assertEqual(index.covered_seconds(100, 99), 0)
+
+    def test_empty(self):
+        index = CoverageIndex([])
+        self.assertEqual(index.covered_minutes(0, DAY_MINUTES - 1), 0)
+        self.assertEqual(index.covered_seconds(0, 59), 0)
+
+
+class NextDayTest(unittest.TestCase):
+    def test_keeps_format(self):
+        self.assertEqual(next_day("2025/09/06"), "2025/09/07")
+        self.assertEqual(next_day("2025/9/30"), "2025/10/1")
+        self.assertEqual(next_day("2025-12-31 00:00:00"), "2026-01-01 00:00:00")
+
+
+class SpillDayTest(unittest.TestCase):
+    # 土曜 23:10〜日曜 1:30 の緊急手術だけがあり、日曜には手術がない
+    CASES = [
+        ("2025/09/05", "金曜日", "01", "定時", 9 * 60, 12 * 60),
+        ("2025/09/06", "土曜日", "01", "緊急", 23 * 60 + 10, 90),
+    ]
+
+    def test_spill_only_day_is_selected(self):
+        cube = build(EpochOccupancy, self.CASES)
+        self.assertEqual(cube.days, ["2025/09/05", "2025/09/06", "2025/09/07"])
+        self.assertEqual(cube.day_weekday[2], "日曜日")
+        self.assertEqual(cube.select_days(), [0, 1, 2])
+        self.assertEqual(cube.select_days(["緊急"]), [1, 2])
+        self.assertEqual(cube.select_days(["定時"]), [0])
+        self.assertEqual(cube.select_days(exclude_weekdays={"日曜日"}), [0, 1])
+        # 件数は入室日に数え、またいだ翌日には数えない
+        self.assertEqual(cube.case_count([2]), 0)
+
+    def test_spill_only_day_intervals(self):
+        cube = build(EpochOccupancy, self.CASES)
+        intervals, _ = cube.unit_intervals(2, ROOM_WEIGHT)
+        self.assertEqual(intervals, {"01": [(0, 90)]})
+        self.assertAlmostEqual(cube.timeline(2, ROOM_WEIGHT).window_average(0, 59), 1.0)
+
+    def test_later_cases_on_spill_day(self):
+        cases = self.CASES + [("2025/09/07", "日曜日", "01", "臨時", 10 * 60, 11 * 60)]
+        cube = build(EpochOccupancy, cases)
+        self.assertEqual(len(cube.days), 3)
+        self.assertEqual(cube.case_count([2]), 1)
+        intervals, _ = cube.unit_intervals(2, ROOM_WEIGHT)
+        self.assertEqual(intervals, {"01": [(0, 90), (600, 660)]})
+
+    def test_cube_ignores_spill(self):
+        cube = build(OccupancyCube, self.CASES)
+        self.assertEqual(cube.days, ["2025/09/05", "2025/09/06"])
+
+
+if __name__ == "__main__":
+    unittest.main()
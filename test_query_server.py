@@ -0,0 +1,136 @@
+"""query_server の問い合わせ（QueryService）と HTTP 応答の確認
+
+    python -m unittest test_query_server
+"""
+
+import datetime as dt
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer
+
+from query_server import QueryService, make_handler
+from synthetic_data import write_workbook
+
+ROOMS = [("01A", 1), ("01B", 0), ("02", 1), ("03", 1)]
+
+
+def case(no, day, weekday, room, start, end, category="定時"):
+    return (no, day, weekday, room, dt.time(*start), dt.time(*end), category)
+
+
+ROWS = [
+    case(1, "2025/04/01", "火曜日", "01A", (9, 0), (10, 0)),
+    case(2, "2025/04/01", "火曜日", "02", (9, 0), (12, 0)),
+    case(3, "2025/04/02", "水曜日", "01A", (9, 0), (11, 0)),
+    case(4, "2025/04/03", "木曜日", "02", (13, 0), (14, 0), "緊急"),
+    case(5, "2025/04/05", "土曜日", "03", (10, 0), (11, 0), "緊急"),
+]
+
+
+class QueryServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "元データ.xlsx")
+        write_workbook(path, ROWS, ROOMS)
+        cls.service = QueryService(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_default_counts(self):
+        result = self.service.query({})
+        self.assertEqual(result["num_days"], 3)
+        self.assertEqual(result["case_count"], 4)
+
+    def test_single_room_counts_own_days(self):
+        for method in ("average", "any"):
+            result = self.service.query({"rooms": "02", "method": method})
+            self.assertEqual(result["num_days"], 2)
+            self.assertEqual(result["case_count"], 2)
+        result = self.service.query({"exclude_rooms": ["02"], "days": "1"})
+        self.assertEqual(result["num_days"], 2)
+        self.assertEqual(sorted(result["by_day"]), ["2025/04/01", "2025/04/02"])
+
+    def test_single_room_average(self):
+        # 02 は 4/1 の 9:00〜12:00 と 4/3 の 13:00〜14:00 だけ。9:00〜9:29 の窓は2日の平均で 0.5
+        result = self.service.query({"rooms": "02", "grid": "9:00-9:00/30/30"})
+        self.assertEqual(result["values"], [0.5])
+
+    def test_weekday_without_days(self):
+        result = self.service.query({"weekdays": "日"})
+        self.assertEqual(result["num_days"], 0)
+        self.assertEqual(result["values"], [0.0] * len(result["labels"]))
+
+    def test_invalid_parameters(self):
+        for params in ({"weekdays": "祝日"}, {"rooms": "99"}, {"categories": "予約"}, {"method": "max"},
+                       {"grid": "9:00-8:00/30/30"}, {"unknown": "1"}):
+            with self.assertRaises(ValueError, msg=params):
+                self.service.query(params)
+
+    def test_parameter_types(self):
+        for params in ({"grid": 5}, {"method": ["any"]}, {"rooms": [2]}, {"weekdays": {"火": 1}},
+                       {"days": True}):
+            with self.assertRaises(ValueError, msg=params):
+                self.service.query(params)
+        result = self.service.query({"rooms": ["01A", "02"], "denominator": 2, "days": 1})
+        self.assertEqual(result["denominator"], 2.0)
+        self.assertIn("by_day", result)
+
+
+class HandlerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "元データ.xlsx")
+        write_workbook(path, ROWS, ROOMS)
+        handler = make_handler(QueryService(path))
+        handler.log_message = lambda *args: None
+        cls.server = HTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmp.cleanup()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        try:
+            conn.putrequest(method, path)
+            for key, value in (headers or {}).items():
+                conn.putheader(key, value)
+            if body is not None and "Content-Length" not in (headers or {}):
+                conn.putheader("Content-Length", str(len(body)))
+            conn.endheaders(body)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_post_query(self):
+        status, body = self.request("POST", "/query", json.dumps({"rooms": "02"}).encode())
+        self.assertEqual(status, 200)
+        self.assertEqual(body["case_count"], 2)
+
+    def test_bad_requests(self):
+        for body in (b'{"grid": 5}', b"[1]", b"{", b'{"rooms": [null]}', b"\xff"):
+            status, answer = self.request("POST", "/query", body)
+            self.assertEqual(status, 400, body)
+            self.assertIn("error", answer)
+        status, answer = self.request("POST", "/query", b"{}", {"Content-Length": "abc"})
+        self.assertEqual(status, 400)
+        status, answer = self.request("GET", "/query?weekdays=%E7%A5%9D")
+        self.assertEqual(status, 400)
+        status, answer = self.request("GET", "/nothing")
+        self.assertEqual(status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
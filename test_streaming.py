@@ -0,0 +1,42 @@
+"""streaming の日付順の流し込み（day_chunks）の確認
+
+    python -m unittest test_streaming
+"""
+
+import unittest
+
+from source_data import Case
+from streaming import UnsortedInputError, day_chunks
+
+
+def cases(*dates):
+    return [Case(str(i), date, "", "01", 540, 600, "定時") for i, date in enumerate(dates)]
+
+
+class DayChunksTest(unittest.TestCase):
+    def test_sorted_days(self):
+        chunks = list(day_chunks(cases("2025/04/01", "2025/04/01", "2025/04/02", "2025/04/05")))
+        self.assertEqual([(day, len(chunk)) for day, chunk in chunks],
+                         [("2025/04/01", 2), ("2025/04/02", 1), ("2025/04/05", 1)])
+
+    def test_repeated_day(self):
+        with self.assertRaisesRegex(UnsortedInputError, "離れた行"):
+            list(day_chunks(cases("2025/04/01", "2025/04/02", "2025/04/01")))
+
+    def test_descending_days(self):
+        # 日ごとにまとまっていても、日付が戻れば止める
+        with self.assertRaisesRegex(UnsortedInputError, "2025/04/01 が前の日 2025/04/02 より前"):
+            list(day_chunks(cases("2025/04/02", "2025/04/02", "2025/04/01")))
+
+    def test_unparsable_days(self):
+        chunks = list(day_chunks(cases("不明", "2025/04/01", "")))
+        self.assertEqual([day for day, _ in chunks], ["不明", "2025/04/01", ""])
+        with self.assertRaises(UnsortedInputError):
+            list(day_chunks(cases("不明", "2025/04/01", "不明")))
+
+    def test_is_value_error(self):
+        self.assertTrue(issubclass(UnsortedInputError, ValueError))
+
+
+if __name__ == "__main__":
+    unittest.main()
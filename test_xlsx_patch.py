@@ -0,0 +1,83 @@
+"""xlsx_patch の直接書き換え（patch_workbook）の確認
+
+    python -m unittest test_xlsx_patch
+"""
+
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+import openpyxl
+from openpyxl.chart import BarChart, Reference
+
+import xlsx_patch
+from verification_sheet import STYLES
+
+
+def chart_workbook(path):
+    """計算結果シートの値とグラフ表示シートの棒グラフを持つブック"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "計算結果"
+    ws.append(["時刻", "8:00", "8:30", "9:00"])
+    ws.append(["全手術", 1.0, 2.0, 3.0])
+    chart = BarChart()
+    chart.add_data(Reference(ws, min_col=2, max_col=4, min_row=2), from_rows=True)
+    wb.create_sheet("グラフ表示").add_chart(chart, "A1")
+    wb.save(path)
+
+
+class PatchWorkbookTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "元.xlsx")
+        self.dst = os.path.join(self.tmp.name, "結果.xlsx")
+        chart_workbook(self.src)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def patch(self):
+        xlsx_patch.patch_workbook(
+            self.src, self.dst,
+            cell_values={"計算結果": {(2, 2): 9.5, (3, 6): 4.25}},
+            new_sheets={"検証": ([(1, 1, "時間帯", "header"), (2, 1, 0.5, "value")], {1: 10}, STYLES)},
+        )
+
+    def check_output(self):
+        with zipfile.ZipFile(self.src) as zin, zipfile.ZipFile(self.dst) as zout:
+            self.assertIsNone(zout.testzip())
+            charts = [name for name in zin.namelist() if name.startswith("xl/charts/")]
+            self.assertTrue(charts)
+            for name in charts + ["xl/drawings/drawing1.xml"]:
+                self.assertEqual(zout.read(name), zin.read(name), name)
+                self.assertEqual(zout.getinfo(name).compress_type, zin.getinfo(name).compress_type)
+        wb = openpyxl.load_workbook(self.dst)
+        ws = wb["計算結果"]
+        self.assertEqual([ws.cell(2, c).value for c in range(2, 5)], [9.5, 2.0, 3.0])
+        self.assertEqual(ws.cell(3, 6).value, 4.25)
+        self.assertEqual(ws.calculate_dimension(), "A1:F3")
+        self.assertEqual(wb["検証"].cell(2, 1).value, 0.5)
+        self.assertEqual(wb.sheetnames, ["計算結果", "グラフ表示", "検証"])
+
+    def test_round_trip_with_chart(self):
+        self.patch()
+        self.check_output()
+
+    def test_public_api_fallback(self):
+        # zipfile の内部が使えないときは ZipFile.read / writestr で同じ圧縮方式のまま書き直す
+        with mock.patch.object(xlsx_patch, "_can_copy_raw", return_value=False), \
+                mock.patch.object(xlsx_patch, "_copy_raw", side_effect=AssertionError("raw copy")):
+            self.patch()
+        self.check_output()
+
+    def test_extend_dimension(self):
+        xml = '<worksheet><dimension ref="B2:C3"/><sheetData/></worksheet>'
+        self.assertIn('ref="A1:E3"', xlsx_patch._extend_dimension(xml, 1, 1, 2, 5))
+        self.assertIn('ref="bad"', xlsx_patch._extend_dimension(xml.replace("B2:C3", "bad"), 1, 1, 2, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
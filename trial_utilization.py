@@ -8,10 +8,14 @@ HOGY社計算: 67.9%
 各試行で異なる条件の稼働率を算出し、67.9%に最も近い組み合わせを探索する。
 """
 
-import openpyxl
-import datetime as dt
 import os
 import sys
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+import profiling
+from occupancy import TimeGrid, merge_intervals
+from source_data import load_source
 
 if getattr(sys, 'frozen', False):
     SCRIPT_DIR = os.path.dirname(sys.executable)
@@ -20,226 +24,135 @@ else:
 INPUT_FILE = os.path.join(SCRIPT_DIR, "時間帯別稼働推移元データ.xlsx")
 
 
-def to_minutes(t):
-    if isinstance(t, dt.time):
-        return t.hour * 60 + t.minute
-    elif isinstance(t, dt.timedelta):
-        return int(t.total_seconds()) // 60
-    elif isinstance(t, str):
-        parts = t.split(":")
-        return int(parts[0]) * 60 + int(parts[1])
-    else:
-        return t.hour * 60 + t.minute
-
-
-def make_slots(start_h, start_m, end_h, end_m):
-    """指定範囲の30分刻みスロットを生成"""
-    slots = []
-    m = start_h * 60 + start_m
-    end = end_h * 60 + end_m
-    while m <= end:
-        slots.append(dt.time(m // 60, m % 60))
-        m += 30
-    return slots
-
-
-def main():
+# ========== 稼働率カーネル ==========
+
+def build_room_index(records):
+    """日付・部屋ごとの手術区間: {日付: {部屋: [(入室分, 麻酔終了分), ...]}}"""
+    index = {}
+    for r in records:
+        index.setdefault(r.date, {}).setdefault(r.room, []).append((r.start, r.end))
+    return index
+
+
+def counted_range(start, end, window, rule):
+    """手術1件が数えられるスナップショット時刻（分）の閉区間 (最初, 最後)。空なら 最初 > 最後
+
+    "overlap":  [snap+a, snap+b] と [入室, 麻酔終了] が重なる
+                ⇔ 入室 ≤ snap+b かつ snap+a ≤ 麻酔終了 ⇔ 入室-b ≤ snap ≤ 麻酔終了-a
+    "snapshot": 入室 ≤ snap+a < 麻酔終了 ⇔ 入室-a ≤ snap ≤ 麻酔終了-1-a
+    """
+    offset_a, offset_b = window
+    if rule == "overlap":
+        return start - offset_b, end - offset_a
+    return start - offset_a, end - 1 - offset_a
+
+
+def utilization(index, dates, grid, weights, denominator_rooms, window=(0, 0), rule="overlap", groups=()):
+    """稼働率(%) = Σ(日・スロットごとの該当ウェイト) / (分母部屋数 × 日数 × スロット数)
+
+    index: build_room_index() の結果
+    grid: スロット（スナップショット時刻）の並び（occupancy.TimeGrid、分単位の評価時刻）
+    weights: {部屋: ウェイト}。ここにない部屋は数えない（該当手術1件ごとにウェイトを加算）
+    denominator_rooms: 分母の部屋数（ウェイト合計、または固定部屋数）
+    window: スナップショット時刻からの判定区間オフセット (a, b)
+    rule: "overlap"（区間重なり）または "snapshot"（点判定）
+    groups: まとめて数える部屋の組。組内のいずれかが使用中なら1室（1.0）と数える
+
+    各手術を「数えられるスナップショット時刻の区間」に変換すると、スロット時刻 t の分子は
+    （最初 ≤ t の区間のウェイト合計）−（最後 < t の区間のウェイト合計）になる。
+    スロット時刻は全日共通なので全日分をまとめて並べ、スロットごとに二分探索2回で求める。
+    組は日ごとに区間の和集合をとってから1.0として加える。
+    """
+    grouped = {room for group in groups for room in group}
+    firsts = []
+    lasts = []
+    for d in dates:
+        rooms = index.get(d, {})
+        for room, intervals in rooms.items():
+            if room in grouped or room not in weights:
+                continue
+            weight = weights[room]
+            for start, end in intervals:
+                first, last = counted_range(start, end, window, rule)
+                if first <= last:
+                    firsts.append((first, weight))
+                    lasts.append((last, weight))
+        for group in groups:
+            ranges = [counted_range(start, end, window, rule)
+                      for room in group for start, end in rooms.get(room, ())]
+            for first, last in merge_intervals(ranges):
+                firsts.append((first, 1.0))
+                lasts.append((last, 1.0))
+
+    firsts.sort()
+    lasts.sort()
+    first_keys = [t for t, _ in firsts]
+    last_keys = [t for t, _ in lasts]
+    first_cum = list(accumulate((w for _, w in firsts), initial=0.0))
+    last_cum = list(accumulate((w for _, w in lasts), initial=0.0))
+
+    if grid.start % 60 or grid.step % 60:
+        raise ValueError(f"スロットは分単位の時刻にしてください: {grid.describe()}")
+    slots = [t // 60 for t in grid.points()]
+    numerator = 0.0
+    for t in slots:
+        numerator += first_cum[bisect_right(first_keys, t)] - last_cum[bisect_left(last_keys, t)]
+    denominator = denominator_rooms * len(dates) * len(slots)
+    return (numerator / denominator * 100) if denominator > 0 else 0.0
+
+
+def main(profiler=None):
+    """profiler: profiling.Profiler（省略時は計測しない）"""
+    profiler = profiler or profiling.Profiler(__file__, enabled=False)
     print(f"入力ファイル: {INPUT_FILE}")
-    wb = openpyxl.load_workbook(INPUT_FILE)
-
-    # --- 定義シートから設定読み込み ---
-    ws_def = wb["定義"]
-    room_weight = {}
-    for row in ws_def.iter_rows(min_row=2, max_row=20, min_col=1, max_col=2, values_only=True):
-        if row[0] is not None and row[1] is not None:
-            try:
-                room_weight[str(row[0])] = float(row[1])
-            except (ValueError, TypeError):
-                break
+
+    # --- 定義シート・元データ読み込み（時刻は分に変換済み）---
+    definition, table = load_source(INPUT_FILE)
+    room_weight = definition.room_weight_raw
     print(f"対象手術室: {room_weight}")
     weight_total = sum(room_weight.values())
     print(f"ウェイト合計: {weight_total}")
 
-    exclude_weekdays = set()
-    r = 14
-    while True:
-        r += 1
-        v = ws_def.cell(row=r, column=1).value
-        if v is None or v == "":
-            break
-        exclude_weekdays.add(str(v))
-
-    # --- 元データ読み込み ---
-    ws_data = wb["時間帯別稼働推移元データ"]
-    records = []
-    for row in ws_data.iter_rows(min_row=2, max_row=ws_data.max_row, values_only=True):
-        mgmt_no, op_date, weekday, room, start_time, end_time, category = row
-        if room is not None:
-            records.append({
-                "date": str(op_date) if op_date else "",
-                "weekday": str(weekday) if weekday else "",
-                "room": str(room),
-                "start": start_time,
-                "end": end_time,
-                "category": str(category) if category else "",
-            })
-    wb.close()
-
-    records_filtered = [r for r in records if r["weekday"] not in exclude_weekdays]
-    all_dates = sorted(set(r["date"] for r in records_filtered))
+    exclude_weekdays = definition.exclude_weekdays
+    records = list(table.cases())
+
+    records_filtered = [r for r in records if r.weekday not in exclude_weekdays]
+    all_dates = sorted(set(r.date for r in records_filtered))
     num_days = len(all_dates)
     print(f"対象レコード数: {len(records_filtered)}, 対象日数: {num_days}")
 
     cat_counts = {}
     for r in records_filtered:
-        cat_counts[r["category"]] = cat_counts.get(r["category"], 0) + 1
+        cat_counts[r.category] = cat_counts.get(r.category, 0) + 1
     print(f"区分別件数: {cat_counts}")
 
     num_rooms = len(room_weight)
 
-    # --- スロット定義 ---
-    slots_16 = make_slots(9, 0, 16, 30)       # 9:00〜16:30 = 16区間
-    slots_14 = make_slots(9, 0, 15, 30)       # 9:00〜15:30 = 14区間 (〜16:00)
-    slots_18_early = make_slots(8, 30, 17, 0)  # 8:30〜17:00 = 18区間
-    slots_18_late = make_slots(9, 0, 17, 30)   # 9:00〜17:30 = 18区間
-    print(f"スロット: 16区間={len(slots_16)}, 14区間={len(slots_14)}, "
-          f"18区間(8:30-)={len(slots_18_early)}, 18区間(9:00-)={len(slots_18_late)}")
+    profiler.lap("load")
+
+    # --- スロット定義（30分刻み、本体の計算と同じ TimeGrid）---
+    slots_16 = TimeGrid.minutes(9 * 60, 16 * 60 + 30, 30, 30)        # 9:00〜16:30 = 16区間
+    slots_14 = TimeGrid.minutes(9 * 60, 15 * 60 + 30, 30, 30)        # 9:00〜15:30 = 14区間 (〜16:00)
+    slots_18_early = TimeGrid.minutes(8 * 60 + 30, 17 * 60, 30, 30)  # 8:30〜17:00 = 18区間
+    slots_18_late = TimeGrid.minutes(9 * 60, 17 * 60 + 30, 30, 30)   # 9:00〜17:30 = 18区間
+    print(f"スロット: 16区間={len(slots_16.points())}, 14区間={len(slots_14.points())}, "
+          f"18区間(8:30-)={len(slots_18_early.points())}, 18区間(9:00-)={len(slots_18_late.points())}")
 
     # --- データセット ---
-    all_surgery = [r for r in records_filtered if r["room"] in room_weight]
-    scheduled_only = [r for r in all_surgery if r["category"] == "定時"]
+    all_surgery = [r for r in records_filtered if r.room in room_weight]
+    scheduled_only = [r for r in all_surgery if r.category == "定時"]
     room_weight_flat = {room: 1.0 for room in room_weight}
     weight_total_flat = sum(room_weight_flat.values())
     room_weight_no_angio = {k: v for k, v in room_weight.items() if k != "ｱﾝｷﾞｵ"}
     weight_no_angio = sum(room_weight_no_angio.values())
-    scheduled_no_angio = [r for r in scheduled_only if r["room"] in room_weight_no_angio]
-
-    # ========== 汎用計算関数 ==========
-    def calc_overlap(data, slots, weights, weight_sum, offset_a, offset_b):
-        """区間重なり方式: [snap+offset_a, snap+offset_b] と手術時間の重なり判定"""
-        numerator = 0.0
-        denominator = weight_sum * num_days * len(slots)
-        for d in all_dates:
-            day_recs = [r for r in data if r["date"] == d]
-            for snap in slots:
-                snap_min = to_minutes(snap)
-                ia = snap_min + offset_a
-                ib = snap_min + offset_b
-                count = 0.0
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in weights:
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if ia <= e and s <= ib:
-                        count += weights[room]
-                numerator += count
-        return (numerator / denominator * 100) if denominator > 0 else 0.0
-
-    def calc_overlap_fixed_denom(data, slots, weights, denom_rooms, offset_a, offset_b):
-        """区間重なり方式 + 分母=固定部屋数"""
-        numerator = 0.0
-        denominator = denom_rooms * num_days * len(slots)
-        for d in all_dates:
-            day_recs = [r for r in data if r["date"] == d]
-            for snap in slots:
-                snap_min = to_minutes(snap)
-                ia = snap_min + offset_a
-                ib = snap_min + offset_b
-                count = 0.0
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in weights:
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if ia <= e and s <= ib:
-                        count += weights[room]
-                numerator += count
-        return (numerator / denominator * 100) if denominator > 0 else 0.0
-
-    def calc_snapshot(data, slots, weights, weight_sum):
-        """スナップショット方式: start ≤ snap < end"""
-        numerator = 0.0
-        denominator = weight_sum * num_days * len(slots)
-        for d in all_dates:
-            day_recs = [r for r in data if r["date"] == d]
-            for snap in slots:
-                snap_min = to_minutes(snap)
-                count = 0.0
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in weights:
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if s <= snap_min < e:
-                        count += weights[room]
-                numerator += count
-        return (numerator / denominator * 100) if denominator > 0 else 0.0
-
-    def calc_snapshot_fixed_denom(data, slots, weights, denom_rooms):
-        """スナップショット方式 + 分母=固定部屋数"""
-        numerator = 0.0
-        denominator = denom_rooms * num_days * len(slots)
-        for d in all_dates:
-            day_recs = [r for r in data if r["date"] == d]
-            for snap in slots:
-                snap_min = to_minutes(snap)
-                count = 0.0
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in weights:
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if s <= snap_min < e:
-                        count += weights[room]
-                numerator += count
-        return (numerator / denominator * 100) if denominator > 0 else 0.0
-
-    def calc_overlap_merged_1ab(data, slots, denom_rooms, offset_a, offset_b,
-                                room_1a="01A", room_1b="01B"):
-        """区間重なり方式 + 1A/1B統合カウント
-        1A or 1Bが使用中 → 1室、両方使用中 → やはり1室（上限1）
-        他の部屋は各1室。分母=denom_rooms。
-        """
-        target_rooms = set(room_weight.keys())
-        other_rooms = target_rooms - {room_1a, room_1b}
-        numerator = 0.0
-        denominator = denom_rooms * num_days * len(slots)
-        for d in all_dates:
-            day_recs = [r for r in data if r["date"] == d]
-            for snap in slots:
-                snap_min = to_minutes(snap)
-                ia = snap_min + offset_a
-                ib = snap_min + offset_b
-                count = 0.0
-                # 他の部屋: 各1室
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in other_rooms:
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if ia <= e and s <= ib:
-                        count += 1.0
-                # 1A/1B統合: どちらか使用=1, 両方=1
-                ab_used = False
-                for r in day_recs:
-                    room = r["room"]
-                    if room not in (room_1a, room_1b):
-                        continue
-                    s = to_minutes(r["start"])
-                    e = to_minutes(r["end"])
-                    if ia <= e and s <= ib:
-                        ab_used = True
-                        break
-                if ab_used:
-                    count += 1.0
-                numerator += count
-        return (numerator / denominator * 100) if denominator > 0 else 0.0
+    scheduled_no_angio = [r for r in scheduled_only if r.room in room_weight_no_angio]
+
+    # 日付・部屋ごとの区間配列（データセットごとに1回だけ作る）
+    index_all = build_room_index(all_surgery)
+    index_sched = build_room_index(scheduled_only)
+    index_sched_no_angio = build_room_index(scheduled_no_angio)
+    # 01A+01B のような1室扱いの組（定義シートの部屋グループ、なければ 01B → 01A 統合）
+    merged_1ab = [group.members for group in definition.room_groups]
 
     # ========== 全30試行 ==========
     target = 67.9
@@ -247,36 +160,39 @@ def main():
     # trials: (名前, 区間方式, ウェイト, 対象手術, 時間帯, 稼働率)
     trials = []
 
+    profiler.lap("datasets")
+
     # --- 試行1〜14 (既存) ---
-    r1 = calc_overlap(all_surgery, slots_16, room_weight, weight_total, -14, +15)
+    r1 = utilization(index_all, all_dates, slots_16, room_weight, weight_total, (-14, +15))
     trials.append(("試行1", "弊社(-14/+15)", "定義準拠", "全手術", "9:00-16:30", r1))
 
-    r2 = calc_snapshot(all_surgery, slots_16, room_weight, weight_total)
+    r2 = utilization(index_all, all_dates, slots_16, room_weight, weight_total, rule="snapshot")
     trials.append(("試行2", "SS(点判定)", "定義準拠", "全手術", "9:00-16:30", r2))
 
-    r3 = calc_snapshot(scheduled_only, slots_16, room_weight, weight_total)
+    r3 = utilization(index_sched, all_dates, slots_16, room_weight, weight_total, rule="snapshot")
     trials.append(("試行3", "SS(点判定)", "定義準拠", "定時のみ", "9:00-16:30", r3))
 
-    r4 = calc_snapshot(scheduled_only, slots_16, room_weight_flat, weight_total_flat)
+    r4 = utilization(index_sched, all_dates, slots_16, room_weight_flat, weight_total_flat, rule="snapshot")
     trials.append(("試行4", "SS(点判定)", "W1.0固定", "定時のみ", "9:00-16:30", r4))
 
-    r5 = calc_snapshot(scheduled_no_angio, slots_16, room_weight_no_angio, weight_no_angio)
+    r5 = utilization(index_sched_no_angio, all_dates, slots_16, room_weight_no_angio, weight_no_angio,
+                     rule="snapshot")
     trials.append(("試行5", "SS(点判定)", "定義準拠", "定時ｱﾝｷﾞｵ除", "9:00-16:30", r5))
 
-    r6 = calc_overlap(scheduled_only, slots_16, room_weight, weight_total, -14, +15)
+    r6 = utilization(index_sched, all_dates, slots_16, room_weight, weight_total, (-14, +15))
     trials.append(("試行6", "弊社(-14/+15)", "定義準拠", "定時のみ", "9:00-16:30", r6))
 
     r7 = r2  # = 試行2
     trials.append(("試行7", "SS(点判定)", "定義準拠", "全手術", "9:00-16:30", r7))
 
     # 試行8: SS + 分母=実部屋数
-    r8 = calc_snapshot_fixed_denom(all_surgery, slots_16, room_weight, num_rooms)
+    r8 = utilization(index_all, all_dates, slots_16, room_weight, num_rooms, rule="snapshot")
     trials.append(("試行8", "SS(点判定)", "分母=実部屋数", "全手術", "9:00-16:30", r8))
 
-    r9 = calc_overlap(scheduled_only, slots_16, room_weight, weight_total, 0, +29)
+    r9 = utilization(index_sched, all_dates, slots_16, room_weight, weight_total, (0, +29))
     trials.append(("試行9", "HOGY(0/+29)", "定義準拠", "定時のみ", "9:00-16:30", r9))
 
-    r10 = calc_overlap(all_surgery, slots_16, room_weight, weight_total, 0, +29)
+    r10 = utilization(index_all, all_dates, slots_16, room_weight, weight_total, (0, +29))
     trials.append(("試行10", "HOGY(0/+29)", "定義準拠", "全手術", "9:00-16:30", r10))
 
     r11 = r9  # = 試行9
@@ -291,6 +207,8 @@ def main():
     r14 = r1  # = 試行1
     trials.append(("試行14", "弊社(-14/+15)", "定義準拠", "全手術", "9:00-16:30", r14))
 
+    profiler.lap("trials.1-14")
+
     # --- 試行15〜26 (新規: HOGY区間固定・全手術で67.9%近似探索) ---
 
     # 試行15: HOGY区間 + 全手術 + 定義シートウェイト（= 試行10、ベースライン再確認）
@@ -298,68 +216,72 @@ def main():
     trials.append(("試行15", "HOGY(0/+29)", "定義準拠", "全手術", "9:00-16:30", r15))
 
     # 試行16: HOGY区間 + 全手術 + ウェイト1.0固定
-    r16 = calc_overlap(all_surgery, slots_16, room_weight_flat, weight_total_flat, 0, +29)
+    r16 = utilization(index_all, all_dates, slots_16, room_weight_flat, weight_total_flat, (0, +29))
     trials.append(("試行16", "HOGY(0/+29)", "W1.0固定", "全手術", "9:00-16:30", r16))
 
     # 試行17: HOGY区間 + 全手術 + 分母=固定部屋数（実部屋数、ウェイト無視）
-    r17 = calc_overlap_fixed_denom(all_surgery, slots_16, room_weight, num_rooms, 0, +29)
+    r17 = utilization(index_all, all_dates, slots_16, room_weight, num_rooms, (0, +29))
     trials.append(("試行17", "HOGY(0/+29)", "分母=実部屋数", "全手術", "9:00-16:30", r17))
 
     # 試行18: HOGY区間 + 全手術 + 9:00-16:00（14区間）
-    r18 = calc_overlap(all_surgery, slots_14, room_weight, weight_total, 0, +29)
+    r18 = utilization(index_all, all_dates, slots_14, room_weight, weight_total, (0, +29))
     trials.append(("試行18", "HOGY(0/+29)", "定義準拠", "全手術", "9:00-16:00", r18))
 
     # 試行19: HOGY区間 + 全手術 + 8:30-17:00（18区間）
-    r19 = calc_overlap(all_surgery, slots_18_early, room_weight, weight_total, 0, +29)
+    r19 = utilization(index_all, all_dates, slots_18_early, room_weight, weight_total, (0, +29))
     trials.append(("試行19", "HOGY(0/+29)", "定義準拠", "全手術", "8:30-17:00", r19))
 
     # 試行20: HOGY区間 + 全手術 + 9:00-17:30（18区間）
-    r20 = calc_overlap(all_surgery, slots_18_late, room_weight, weight_total, 0, +29)
+    r20 = utilization(index_all, all_dates, slots_18_late, room_weight, weight_total, (0, +29))
     trials.append(("試行20", "HOGY(0/+29)", "定義準拠", "全手術", "9:00-17:30", r20))
 
     # 試行21: スナップショット + 全手術 + ウェイト1.0固定
-    r21 = calc_snapshot(all_surgery, slots_16, room_weight_flat, weight_total_flat)
+    r21 = utilization(index_all, all_dates, slots_16, room_weight_flat, weight_total_flat, rule="snapshot")
     trials.append(("試行21", "SS(点判定)", "W1.0固定", "全手術", "9:00-16:30", r21))
 
     # 試行22: スナップショット + 全手術 + 分母=固定部屋数
-    r22 = calc_snapshot_fixed_denom(all_surgery, slots_16, room_weight, num_rooms)
+    r22 = utilization(index_all, all_dates, slots_16, room_weight, num_rooms, rule="snapshot")
     trials.append(("試行22", "SS(点判定)", "分母=実部屋数", "全手術", "9:00-16:30", r22))
 
     # 試行23: スナップショット + 全手術 + 9:00-16:00（14区間）
-    r23 = calc_snapshot(all_surgery, slots_14, room_weight, weight_total)
+    r23 = utilization(index_all, all_dates, slots_14, room_weight, weight_total, rule="snapshot")
     trials.append(("試行23", "SS(点判定)", "定義準拠", "全手術", "9:00-16:00", r23))
 
     # 試行24: HOGY区間 + 全手術 + ウェイト1.0 + 分母=固定部屋数
-    r24 = calc_overlap_fixed_denom(all_surgery, slots_16, room_weight_flat, num_rooms, 0, +29)
+    r24 = utilization(index_all, all_dates, slots_16, room_weight_flat, num_rooms, (0, +29))
     trials.append(("試行24", "HOGY(0/+29)", "W1.0+分母固定", "全手術", "9:00-16:30", r24))
 
     # 試行25: HOGY区間 + 全手術 + 部屋数を10室に変更（分母調整）
-    r25 = calc_overlap_fixed_denom(all_surgery, slots_16, room_weight, 10, 0, +29)
+    r25 = utilization(index_all, all_dates, slots_16, room_weight, 10, (0, +29))
     trials.append(("試行25", "HOGY(0/+29)", "分母=10室", "全手術", "9:00-16:30", r25))
 
     # 試行26: HOGY区間 + 全手術 + 部屋数を12室に変更（分母調整）
-    r26 = calc_overlap_fixed_denom(all_surgery, slots_16, room_weight, 12, 0, +29)
+    r26 = utilization(index_all, all_dates, slots_16, room_weight, 12, (0, +29))
     trials.append(("試行26", "HOGY(0/+29)", "分母=12室", "全手術", "9:00-16:30", r26))
 
+    profiler.lap("trials.15-26")
+
     # --- 試行27〜30 (1A/1B統合方式) ---
 
     # 試行27: HOGY区間 + 全手術 + 1A/1B統合(使用=1,分母=10) + 9:00-16:30
-    r27 = calc_overlap_merged_1ab(all_surgery, slots_16, 10, 0, +29)
+    r27 = utilization(index_all, all_dates, slots_16, room_weight_flat, 10, (0, +29), groups=merged_1ab)
     trials.append(("試行27", "HOGY(0/+29)", "1AB統合,分母10", "全手術", "9:00-16:30", r27))
 
     # 試行28: HOGY区間 + 全手術 + 1A/1B統合(使用=1,分母=9) + 9:00-16:30
     # ※分母9 = 1A/1Bで1室 + 残り8室
-    r28 = calc_overlap_merged_1ab(all_surgery, slots_16, 9, 0, +29)
+    r28 = utilization(index_all, all_dates, slots_16, room_weight_flat, 9, (0, +29), groups=merged_1ab)
     trials.append(("試行28", "HOGY(0/+29)", "1AB統合,分母9", "全手術", "9:00-16:30", r28))
 
     # 試行29: HOGY区間 + 定時のみ + 1A/1B統合(使用=1,分母=10) + 9:00-16:30
-    r29 = calc_overlap_merged_1ab(scheduled_only, slots_16, 10, 0, +29)
+    r29 = utilization(index_sched, all_dates, slots_16, room_weight_flat, 10, (0, +29), groups=merged_1ab)
     trials.append(("試行29", "HOGY(0/+29)", "1AB統合,分母10", "定時のみ", "9:00-16:30", r29))
 
     # 試行30: HOGY区間 + 定時のみ + 1A/1B統合(使用=1,分母=9) + 9:00-16:30
-    r30 = calc_overlap_merged_1ab(scheduled_only, slots_16, 9, 0, +29)
+    r30 = utilization(index_sched, all_dates, slots_16, room_weight_flat, 9, (0, +29), groups=merged_1ab)
     trials.append(("試行30", "HOGY(0/+29)", "1AB統合,分母9", "定時のみ", "9:00-16:30", r30))
 
+    profiler.lap("trials.27-30")
+
     # ========== 全試行を67.9%に近い順でソート ==========
     print(f"\n{'='*110}")
     print(f"=== 全試行結果（67.9%に近い順） ===")
@@ -409,7 +331,10 @@ def main():
     for i, (name, method, weight, surgery, slots_desc, rate) in enumerate(sorted_trials[:3], 1):
         diff = rate - target
         print(f"  {i}. {name}: {rate:.1f}% (差{diff:+.1f}pt) - {method} + {weight} + {surgery} + {slots_desc}")
+    profiler.lap("report")
 
 
 if __name__ == "__main__":
-    main()
+    profiler, profile_path = profiling.from_argv(__file__)
+    main(profiler)
+    profiler.finish(profile_path)
@@ -0,0 +1,144 @@
+"""
+検証シート（検証_定時臨時緊急別）のレイアウト
+============================================
+定時のみ・臨時のみ・緊急のみ・合計の4セクションについて、
+日別×スナップショット時刻の稼働室数を並べます。
+
+セルは (行, 列, 値, 書式名) の列として cells() で生成し、
+openpyxl での書き込み（write_to_worksheet）と xlsx の直接書き換え（xlsx_patch）の
+どちらも同じレイアウト・同じ書式定義（STYLES）を使います。
+"""
+
+SHEET_NAME = "検証_定時臨時緊急別"
+
+_FONT = "Meiryo UI"
+
+# openpyxl で書く場合の名前付きスタイル名の接頭辞
+NAMED_STYLE_PREFIX = "検証_"
+
+# 書式名 → フォント・塗りつぶし・罫線（細線4辺）・配置・表示形式
+STYLES = {
+    "label": {"font": {"name": _FONT, "size": 10, "bold": True}},
+    "header": {
+        "font": {"name": _FONT, "size": 9, "bold": True, "color": "FFFFFF"},
+        "fill": "2980B9", "border": True, "horizontal": "center",
+    },
+    "header_dark": {
+        "font": {"name": _FONT, "size": 9, "bold": True, "color": "FFFFFF"},
+        "fill": "1A5276", "border": True, "horizontal": "center",
+    },
+    "time": {"font": {"name": _FONT, "size": 9}, "border": True, "horizontal": "center"},
+    "total": {"font": {"name": _FONT, "size": 9, "bold": True}, "border": True, "number_format": "0.0"},
+    "average": {"font": {"name": _FONT, "size": 9, "bold": True}, "border": True, "number_format": "0.00"},
+    "value": {"font": {"name": _FONT, "size": 9}, "border": True, "number_format": "0.00"},
+}
+
+
+def column_widths(num_dates):
+    """列番号 → 列幅（A:時間帯、B:合計、C:平均、D以降:日付）"""
+    widths = {1: 10, 2: 14, 3: 14}
+    for di in range(num_dates):
+        widths[4 + di] = 12
+    return widths
+
+
+def cells(sections, dates, snapshot_labels):
+    """検証シートの (行, 列, 値, 書式名) を行順・列順に返す
+
+    sections: [(セクションラベル, {date: [val, ...]}), ...]
+    dates: 日付列の並び（全セクション共通）
+    """
+    num_weekdays = len(dates)  # 平日日数
+    zeros = [0.0] * len(snapshot_labels)
+    start_row = 1
+    for section_label, by_day_data in sections:
+        # セクションラベル
+        yield start_row, 1, section_label, "label"
+
+        # ヘッダ行（B列: 全平日合計、C列: 全平日平均、D列以降: 日付）
+        hr = start_row + 1
+        yield hr, 1, "時間帯", "header"
+        yield hr, 2, "全平日合計", "header_dark"
+        yield hr, 3, "全平日平均", "header_dark"
+        for di, d in enumerate(dates):
+            yield hr, 4 + di, d, "header"
+
+        # データ行
+        day_rows = [by_day_data.get(d, zeros) for d in dates]
+        for si, time_label in enumerate(snapshot_labels):
+            r = hr + 1 + si
+            yield r, 1, time_label, "time"
+
+            vals = [v[si] if si < len(v) else 0.0 for v in day_rows]
+            day_total = 0.0
+            for val in vals:
+                day_total += val
+            avg = round(day_total / num_weekdays, 2) if num_weekdays > 0 else 0.0
+            yield r, 2, day_total, "total"
+            yield r, 3, avg, "average"
+
+            for di, val in enumerate(vals):
+                yield r, 4 + di, val, "value"
+
+        start_row = hr + 1 + len(snapshot_labels) + 1  # 次セクション開始行（1行空け）
+
+
+def register_styles(wb):
+    """STYLES をブックの名前付きスタイル（NamedStyle）として1回だけ登録し、書式名 → スタイル名を返す"""
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+
+    thin = Side(style="thin")
+    names = {}
+    for name, spec in STYLES.items():
+        style_name = f"{NAMED_STYLE_PREFIX}{name}"
+        names[name] = style_name
+        if style_name in wb.named_styles:
+            continue
+        style = NamedStyle(name=style_name, font=Font(**spec["font"]))
+        if "fill" in spec:
+            style.fill = PatternFill("solid", fgColor=spec["fill"])
+        if spec.get("border"):
+            style.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        if "horizontal" in spec:
+            style.alignment = Alignment(horizontal=spec["horizontal"])
+        if "number_format" in spec:
+            style.number_format = spec["number_format"]
+        wb.add_named_style(style)
+    return names
+
+
+def write_to_worksheet(ws, cell_iter, widths):
+    """openpyxl のワークシートに行単位で追記する
+
+    書式は register_styles() の名前付きスタイルを参照させるだけなので、セルごとに
+    Font / Border などを作ったり書式表を引いたりしない。通常のシートのほか、
+    openpyxl.Workbook(write_only=True) の書き込み専用シートにもそのまま使える
+    （書き込み専用シートは行をXMLに直接ストリームする）。
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    style_names = register_styles(ws.parent)
+    for col, width in widths.items():
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    def make_cell(value, style_name):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style_names[style_name]
+        return cell
+
+    # cells() は行順・列順に返すので、行が変わるたびに1行分をまとめて追記する
+    current_row = 0
+    row_cells = []
+    for row, col, value, style_name in cell_iter:
+        if row != current_row:
+            if current_row:
+                ws.append(row_cells)
+            for _ in range(current_row + 1, row):
+                ws.append([])
+            current_row = row
+            row_cells = []
+        row_cells.extend([None] * (col - 1 - len(row_cells)))
+        row_cells.append(make_cell(value, style_name))
+    if current_row:
+        ws.append(row_cells)
@@ -0,0 +1,453 @@
+"""
+xlsx 直接書き換え（zip パート単位）
+==================================
+openpyxl でブック全体を読み込み・保存し直す代わりに、xlsx（zip）の中の
+必要なパートだけを書き換えます。
+
+- 既存シートのセル値: 該当ワークシートXMLの <c> 要素だけを差し替え（書式 s 属性は維持）
+- 新規シート: ワークシートXMLを生成して追加（同名シートがあればそのパートを置き換え）
+- 書式: styles.xml の末尾にフォント・塗り・罫線・表示形式・xf を追記
+- その他のパート（元データシート、グラフ表示シートのグラフ・描画など）は圧縮済みのバイト列をそのままコピー
+  （展開・再圧縮しない）。zipfile の内部の前提が合わないとき（Python の版の違い・暗号化・ZIP64 など）は
+  公開API（ZipFile.read / writestr）で展開し、元と同じ圧縮方式で書き直す
+
+openpyxl が扱えないオブジェクトも失われず、保存時間は変更した量にほぼ比例します。
+"""
+
+import copy
+import posixpath
+import re
+import struct
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+WORKSHEET_REL_TYPE = NS_REL + "/worksheet"
+WORKSHEET_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+_ROW_RE = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+_CELL_RE = re.compile(r"<c\b[^>]*?(?:/>|>.*?</c>)", re.S)
+_ATTR_RE = r'\b{}="([^"]*)"'
+
+
+def column_letter(col):
+    """列番号（1始まり）→ 列記号"""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def split_ref(ref):
+    """セル参照 "B12" → (12, 2)"""
+    m = re.match(r"([A-Z]+)(\d+)$", ref)
+    col = 0
+    for ch in m.group(1):
+        col = col * 26 + ord(ch) - 64
+    return int(m.group(2)), col
+
+
+def _attr(tag, name):
+    m = re.search(_ATTR_RE.format(name), tag)
+    return m.group(1) if m else None
+
+
+def _number(value):
+    """数値の書式（openpyxl と同じ有効数字16桁）"""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return "%.16g" % value
+
+
+def _cell_xml(row, col, value, style_id):
+    ref = f"{column_letter(col)}{row}"
+    s = f' s="{style_id}"' if style_id else ""
+    if value is None:
+        return f'<c r="{ref}"{s}/>'
+    if isinstance(value, str):
+        return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    return f'<c r="{ref}"{s}><v>{_number(value)}</v></c>'
+
+
+# ========== 既存シートのセル差し替え ==========
+def patch_cells(sheet_xml, values):
+    """ワークシートXML（str）の指定セルの値を差し替える: values = {(行, 列): 値}
+
+    既存セルは書式（s属性）を維持して値だけを置き換え、無いセル・行は順序を保って挿入する。
+    """
+    by_row = {}
+    for (row, col), value in values.items():
+        by_row.setdefault(row, {})[col] = value
+    if not by_row:
+        return sheet_xml
+
+    m = re.search(r"<sheetData\s*/>", sheet_xml)
+    if m:
+        sheet_xml = sheet_xml[:m.start()] + "<sheetData></sheetData>" + sheet_xml[m.end():]
+    start = sheet_xml.index("<sheetData>") + len("<sheetData>")
+    end = sheet_xml.index("</sheetData>")
+
+    pending = sorted(by_row)
+    out = []
+    for m in _ROW_RE.finditer(sheet_xml, start, end):
+        row_xml = m.group(0)
+        r = int(_attr(row_xml[:row_xml.index(">") + 1], "r"))
+        while pending and pending[0] < r:
+            row_no = pending.pop(0)
+            out.append(_patch_row(f'<row r="{row_no}"/>', row_no, by_row[row_no]))
+        if pending and pending[0] == r:
+            pending.pop(0)
+            row_xml = _patch_row(row_xml, r, by_row[r])
+        out.append(row_xml)
+    for row_no in pending:
+        out.append(_patch_row(f'<row r="{row_no}"/>', row_no, by_row[row_no]))
+
+    sheet_xml = sheet_xml[:start] + "".join(out) + sheet_xml[end:]
+    cols = [col for col_values in by_row.values() for col in col_values]
+    return _extend_dimension(sheet_xml, min(by_row), min(cols), max(by_row), max(cols))
+
+
+def _extend_dimension(sheet_xml, min_row, min_col, max_row, max_col):
+    """<dimension ref> を書き込んだセルの範囲（min_row〜max_row 行・min_col〜max_col 列）を含むように広げる"""
+    m = re.search(r'<dimension\b[^>]*?\bref="([^"]*)"', sheet_xml)
+    if m is None:
+        return sheet_xml
+    first, _, last = m.group(1).partition(":")
+    last = last or first
+    if not all(re.match(r"[A-Z]+\d+$", ref) for ref in (first, last)):
+        return sheet_xml  # 解釈できない参照はそのまま
+    first_row, first_col = split_ref(first)
+    last_row, last_col = split_ref(last)
+    if first_row <= min_row and first_col <= min_col and max_row <= last_row and max_col <= last_col:
+        return sheet_xml
+    ref = (f"{column_letter(min(first_col, min_col))}{min(first_row, min_row)}:"
+           f"{column_letter(max(last_col, max_col))}{max(last_row, max_row)}")
+    return sheet_xml[:m.start(1)] + ref + sheet_xml[m.end(1):]
+
+
+def _patch_row(row_xml, row_no, col_values):
+    open_end = row_xml.index(">") + 1
+    open_tag = row_xml[:open_end]
+    if open_tag.endswith("/>"):
+        open_tag = open_tag[:-2].rstrip() + ">"
+        body = ""
+    else:
+        body = row_xml[open_end:-len("</row>")]
+    # spans は最適化用のヒントのため、列が増える可能性がある行では外す
+    open_tag = re.sub(r'\s+spans="[^"]*"', "", open_tag)
+
+    pending = sorted(col_values)
+    out = []
+    for m in _CELL_RE.finditer(body):
+        cell_xml = m.group(0)
+        cell_tag = cell_xml[:cell_xml.index(">") + 1]
+        _, c = split_ref(_attr(cell_tag, "r"))
+        while pending and pending[0] < c:
+            col = pending.pop(0)
+            out.append(_cell_xml(row_no, col, col_values[col], None))
+        if pending and pending[0] == c:
+            pending.pop(0)
+            cell_xml = _cell_xml(row_no, c, col_values[c], _attr(cell_tag, "s"))
+        out.append(cell_xml)
+    for col in pending:
+        out.append(_cell_xml(row_no, col, col_values[col], None))
+    return open_tag + "".join(out) + "</row>"
+
+
+# ========== 書式（styles.xml）への追記 ==========
+def _font_xml(font):
+    parts = []
+    if font.get("bold"):
+        parts.append("<b/>")
+    parts.append(f'<sz val="{font.get("size", 11)}"/>')
+    if font.get("color"):
+        parts.append(f'<color rgb="FF{font["color"]}"/>')
+    parts.append(f'<name val={quoteattr(font["name"])}/>')
+    return "<font>" + "".join(parts) + "</font>"
+
+
+def _fill_xml(rgb):
+    return f'<fill><patternFill patternType="solid"><fgColor rgb="FF{rgb}"/></patternFill></fill>'
+
+
+_THIN_BORDER_XML = ('<border><left style="thin"/><right style="thin"/>'
+                    '<top style="thin"/><bottom style="thin"/><diagonal/></border>')
+
+# 組み込み表示形式（numFmtId）
+_BUILTIN_NUM_FMTS = {"General": 0, "0": 1, "0.00": 2}
+
+
+def _append_to_list(styles_xml, tag, item_tag, items):
+    """<tag count="n">...</tag> の末尾に items を追記し、(新XML, 先頭の追加インデックス) を返す"""
+    m = re.search(rf"<{tag}\b[^>]*?(/?)>", styles_xml)
+    if m is None:
+        raise ValueError(f"styles.xml に <{tag}> がありません")
+    if m.group(1):
+        count = 0
+        new = f'<{tag} count="{len(items)}">' + "".join(items) + f"</{tag}>"
+        return styles_xml[:m.start()] + new + styles_xml[m.end():], count
+    count_str = _attr(m.group(0), "count")
+    close = styles_xml.index(f"</{tag}>", m.end())
+    count = int(count_str) if count_str is not None else len(re.findall(rf"<{item_tag}\b", styles_xml[m.end():close]))
+    open_tag = re.sub(r'\bcount="\d+"', f'count="{count + len(items)}"', m.group(0))
+    if count_str is None:
+        open_tag = open_tag[:-1] + f' count="{count + len(items)}">'
+    styles_xml = (styles_xml[:m.start()] + open_tag + styles_xml[m.end():close]
+                  + "".join(items) + styles_xml[close:])
+    return styles_xml, count
+
+
+def add_styles(styles_xml, styles):
+    """STYLES 形式の書式定義を styles.xml に追記し、(新XML, {書式名: xf番号}) を返す"""
+    # 表示形式（組み込み以外は numFmtId 164 以降に追加）
+    num_fmt_ids = {}
+    custom = []
+    used_ids = [int(x) for x in re.findall(r'<numFmt\b[^>]*\bnumFmtId="(\d+)"', styles_xml)]
+    next_id = max(used_ids + [163]) + 1
+    for spec in styles.values():
+        code = spec.get("number_format")
+        if code is None or code in num_fmt_ids:
+            continue
+        if code in _BUILTIN_NUM_FMTS:
+            num_fmt_ids[code] = _BUILTIN_NUM_FMTS[code]
+        else:
+            num_fmt_ids[code] = next_id
+            custom.append(f'<numFmt numFmtId="{next_id}" formatCode={quoteattr(code)}/>')
+            next_id += 1
+    if custom:
+        if re.search(r"<numFmts\b", styles_xml):
+            styles_xml, _ = _append_to_list(styles_xml, "numFmts", "numFmt", custom)
+        else:
+            # numFmts は styleSheet の最初の子要素
+            m = re.search(r"<styleSheet\b[^>]*>", styles_xml)
+            new = f'<numFmts count="{len(custom)}">' + "".join(custom) + "</numFmts>"
+            styles_xml = styles_xml[:m.end()] + new + styles_xml[m.end():]
+
+    names = list(styles)
+    fonts = [_font_xml(styles[n]["font"]) for n in names]
+    styles_xml, font_base = _append_to_list(styles_xml, "fonts", "font", fonts)
+
+    fill_names = [n for n in names if "fill" in styles[n]]
+    styles_xml, fill_base = _append_to_list(styles_xml, "fills", "fill", [_fill_xml(styles[n]["fill"]) for n in fill_names])
+
+    styles_xml, border_id = _append_to_list(styles_xml, "borders", "border", [_THIN_BORDER_XML])
+
+    xfs = []
+    for i, name in enumerate(names):
+        spec = styles[name]
+        fill_id = fill_base + fill_names.index(name) if name in fill_names else 0
+        num_fmt_id = num_fmt_ids.get(spec.get("number_format"), 0)
+        attrs = (f'numFmtId="{num_fmt_id}" fontId="{font_base + i}" fillId="{fill_id}" '
+                 f'borderId="{border_id if spec.get("border") else 0}" xfId="0" applyFont="1"')
+        if num_fmt_id:
+            attrs += ' applyNumberFormat="1"'
+        if fill_id:
+            attrs += ' applyFill="1"'
+        if spec.get("border"):
+            attrs += ' applyBorder="1"'
+        if "horizontal" in spec:
+            xfs.append(f'<xf {attrs} applyAlignment="1"><alignment horizontal="{spec["horizontal"]}"/></xf>')
+        else:
+            xfs.append(f"<xf {attrs}/>")
+    styles_xml, xf_base = _append_to_list(styles_xml, "cellXfs", "xf", xfs)
+
+    return styles_xml, {name: xf_base + i for i, name in enumerate(names)}
+
+
+# ========== 新規ワークシートXML ==========
+def worksheet_xml(cell_iter, widths, style_ids):
+    """(行, 列, 値, 書式名) の列（行順・列順）からワークシートXMLを生成する"""
+    rows = []
+    current = None
+    cells = []
+    max_row = max_col = 1
+    for row, col, value, style_name in cell_iter:
+        if row != current:
+            if current is not None:
+                rows.append(f'<row r="{current}">' + "".join(cells) + "</row>")
+            current, cells = row, []
+        cells.append(_cell_xml(row, col, value, style_ids.get(style_name)))
+        max_row, max_col = max(max_row, row), max(max_col, col)
+    if current is not None:
+        rows.append(f'<row r="{current}">' + "".join(cells) + "</row>")
+
+    cols = "".join(
+        f'<col min="{c}" max="{c}" width="{w}" customWidth="1"/>' for c, w in sorted(widths.items())
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+        f'<dimension ref="A1:{column_letter(max_col)}{max_row}"/>'
+        '<sheetViews><sheetView workbookViewId="0"/></sheetViews>'
+        '<sheetFormatPr defaultRowHeight="15"/>'
+        + (f"<cols>{cols}</cols>" if cols else "")
+        + "<sheetData>" + "".join(rows) + "</sheetData>"
+        '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+        "</worksheet>"
+    )
+
+
+# ========== ブック構成 ==========
+def _sheet_parts(zin):
+    """{シート名: パス} と、次に使える sheetId・rId 番号を返す"""
+    wb_root = ET.fromstring(zin.read(WORKBOOK_PART))
+    rels_root = ET.fromstring(zin.read(WORKBOOK_RELS_PART))
+    targets = {}
+    rid_numbers = [0]
+    for rel in rels_root.iter(f"{{{NS_PKG_REL}}}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            path = target[1:]
+        else:
+            path = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = path
+        m = re.match(r"rId(\d+)$", rel.get("Id"))
+        if m:
+            rid_numbers.append(int(m.group(1)))
+    parts = {}
+    sheet_ids = [0]
+    for sheet in wb_root.iter(f"{{{NS_MAIN}}}sheet"):
+        parts[sheet.get("name")] = targets[sheet.get(f"{{{NS_REL}}}id")]
+        sheet_ids.append(int(sheet.get("sheetId")))
+    return parts, max(sheet_ids) + 1, max(rid_numbers) + 1
+
+
+def _can_copy_raw(zin, zout, info):
+    """_copy_raw が使えるか（_copy_raw が頼る zipfile の内部の属性があり、暗号化・ZIP64 でないパート）"""
+    if not hasattr(zin, "fp"):
+        return False
+    if not all(hasattr(zout, name) for name in ("fp", "filelist", "NameToInfo", "start_dir")):
+        return False
+    if not (isinstance(zout.filelist, list) and isinstance(zout.NameToInfo, dict)):
+        return False
+    if zin.fp is None or zout.fp is None or not zout.fp.seekable():
+        return False
+    if info.flag_bits & 0x01:  # 暗号化
+        return False
+    limit = zipfile.ZIP64_LIMIT
+    return info.compress_size < limit and info.file_size < limit and info.header_offset < limit
+
+
+def _copy_part(zin, zout, info):
+    """変更のないパートを zout に写す。圧縮済みのまま写せなければ展開して元と同じ圧縮方式で書き直す"""
+    if _can_copy_raw(zin, zout, info):
+        _copy_raw(zin, zout, info)
+        return
+    out = zipfile.ZipInfo(info.filename, info.date_time)
+    out.external_attr = info.external_attr
+    out.create_system = info.create_system
+    out.comment = info.comment
+    zout.writestr(out, zin.read(info), compress_type=info.compress_type)
+
+
+def _copy_raw(zin, zout, info):
+    """zin のパートを圧縮済みのバイト列のまま zout に写す（展開・再圧縮しない）
+
+    zipfile には圧縮データをそのまま書く公開APIがないため、ローカルヘッダを書き直して
+    データ部を写し、中央ディレクトリ用の ZipInfo を zout に登録する（_can_copy_raw で確かめてから使う）。
+    元のデータ記述子（フラグ 0x08）はヘッダにサイズ・CRCを書くので使わない。
+    """
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"ローカルヘッダが不正です: {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    zin.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+
+    out = copy.copy(info)
+    out.flag_bits &= ~0x08
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(remaining, 1 << 20))
+        if not chunk:
+            raise zipfile.BadZipFile(f"圧縮データが途中で終わっています: {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = zout.fp.tell()
+
+
+def _insert_before(xml, closing_tag, text):
+    pos = xml.rindex(closing_tag)
+    return xml[:pos] + text + xml[pos:]
+
+
+def patch_workbook(src_path, dst_path, cell_values=None, new_sheets=None):
+    """src_path のブックを書き換えて dst_path に保存する
+
+    cell_values: {シート名: {(行, 列): 値}}  既存シートのセル値差し替え
+    new_sheets: {シート名: (セル列, 列幅, 書式定義)}  追加（同名があれば置き換え）するシート
+        セル列は (行, 列, 値, 書式名) の行順・列順の列、書式定義は STYLES 形式
+    """
+    cell_values = cell_values or {}
+    new_sheets = new_sheets or {}
+
+    with zipfile.ZipFile(src_path) as zin:
+        names = set(zin.namelist())
+        parts, next_sheet_id, next_rid = _sheet_parts(zin)
+        replaced = {}  # パス → 新しい内容(bytes)
+
+        for sheet_name, values in cell_values.items():
+            path = parts[sheet_name]
+            xml = zin.read(path).decode("utf-8")
+            replaced[path] = patch_cells(xml, values).encode("utf-8")
+
+        if new_sheets:
+            styles_path = "xl/styles.xml"
+            styles_xml = zin.read(styles_path).decode("utf-8")
+            workbook_xml = zin.read(WORKBOOK_PART).decode("utf-8")
+            rels_xml = zin.read(WORKBOOK_RELS_PART).decode("utf-8")
+            types_xml = zin.read(CONTENT_TYPES_PART).decode("utf-8")
+
+            for sheet_name, (cell_iter, widths, styles) in new_sheets.items():
+                styles_xml, style_ids = add_styles(styles_xml, styles)
+                sheet_xml = worksheet_xml(cell_iter, widths, style_ids).encode("utf-8")
+                if sheet_name in parts:
+                    replaced[parts[sheet_name]] = sheet_xml
+                    continue
+
+                n = 1
+                while f"xl/worksheets/sheet{n}.xml" in names:
+                    n += 1
+                path = f"xl/worksheets/sheet{n}.xml"
+                names.add(path)
+                rid = f"rId{next_rid}"
+                workbook_xml = _insert_before(
+                    workbook_xml, "</sheets>",
+                    f'<sheet name={quoteattr(sheet_name)} sheetId="{next_sheet_id}" r:id="{rid}"/>')
+                rels_xml = _insert_before(
+                    rels_xml, "</Relationships>",
+                    f'<Relationship Id="{rid}" Type="{WORKSHEET_REL_TYPE}" Target="worksheets/sheet{n}.xml"/>')
+                types_xml = _insert_before(
+                    types_xml, "</Types>",
+                    f'<Override PartName="/{path}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>')
+                replaced[path] = sheet_xml
+                parts[sheet_name] = path
+                next_sheet_id += 1
+                next_rid += 1
+
+            replaced[styles_path] = styles_xml.encode("utf-8")
+            replaced[WORKBOOK_PART] = workbook_xml.encode("utf-8")
+            replaced[WORKBOOK_RELS_PART] = rels_xml.encode("utf-8")
+            replaced[CONTENT_TYPES_PART] = types_xml.encode("utf-8")
+
+        with zipfile.ZipFile(dst_path, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                if info.filename in replaced:
+                    zout.writestr(info, replaced.pop(info.filename), compress_type=zipfile.ZIP_DEFLATED)
+                else:
+                    # 変更のないパートは圧縮済みのままコピー（保存時間は変更したパートの量に比例）
+                    _copy_part(zin, zout, info)
+            for path, data in replaced.items():
+                zout.writestr(path, data, compress_type=zipfile.ZIP_DEFLATED)